@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 import os
 from dotenv import load_dotenv
@@ -12,6 +13,17 @@ class Settings(BaseSettings):
     LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "openai")  # "openai" o "anthropic"
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
+    LLM_FALLBACK_PROVIDER: str = os.getenv("LLM_FALLBACK_PROVIDER", "")  # Vacío: el otro proveedor si tiene API key
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", 30.0))  # Segundos por intento (máximo)
+    LLM_MIN_TIMEOUT: float = float(os.getenv("LLM_MIN_TIMEOUT", 5.0))  # Mínimo del timeout adaptativo
+    LLM_TIMEOUT_P99_FACTOR: float = float(os.getenv("LLM_TIMEOUT_P99_FACTOR", 2.0))  # Timeout = p99 observado x factor
+    LLM_HEDGING: bool = os.getenv("LLM_HEDGING", "true").lower() == "true"
+    LLM_HEDGE_DELAY: float = float(os.getenv("LLM_HEDGE_DELAY", 10.0))  # Espera antes de cubrir, sin p95 observado
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", 5))  # Fallos seguidos que abren el circuito
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30.0))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 0))  # Reintentos (solo errores de conexión y 429 con Retry-After)
+    LLM_PROMPT_TOKEN_BUDGET: int = int(os.getenv("LLM_PROMPT_TOKEN_BUDGET", 3000))  # Tokens estimados por prompt
+    LLM_MAX_PARALLEL_PARTS: int = int(os.getenv("LLM_MAX_PARALLEL_PARTS", 4))  # Sub-generaciones simultáneas
     
     # Templates disponibles
     AD_TEMPLATES: dict = {
@@ -27,12 +39,87 @@ class Settings(BaseSettings):
     DB_USER: str = os.getenv("DB_USER", "postgres")
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "postgres")
     
-    # URL de conexión a la base de datos
-    DATABASE_URL: str = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # URL de conexión a la base de datos (si no se define, se construye con los campos DB_*)
+    DATABASE_URL: str = ""
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    
+    # Registro de consultas lentas (umbral negativo para desactivarlo)
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200.0))
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1))  # Fracción con EXPLAIN
+    SLOW_QUERY_EXPLAIN_TIMEOUT_MS: int = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", 5000))
+    SLOW_QUERY_BUFFER_SIZE: int = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 200))  # Consultas expuestas en /api/admin/slow-queries
+    SLOW_QUERY_LOG_FILE: str = os.getenv("SLOW_QUERY_LOG_FILE", "")  # Vacío: solo el log de la aplicación
+    SLOW_QUERY_LOG_MAX_BYTES: int = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS: int = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", 5))
+    
+    # Token de las rutas de administración (cabecera X-Admin-Token); vacío las desactiva
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    
+    # Réplicas de lectura (URLs separadas por comas); vacío para leer del primario
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
+    # Segundos que un cliente lee del primario después de escribir (read-your-writes)
+    READ_YOUR_WRITES_SECONDS: float = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5.0))
+    # Segundos que una réplica caída queda fuera de la rotación
+    REPLICA_RETRY_SECONDS: float = float(os.getenv("REPLICA_RETRY_SECONDS", 30.0))
+    
+    # Feed de cambios de productos
+    CHANGE_FEED_CHANNEL: str = os.getenv("CHANGE_FEED_CHANNEL", "product_changes")
+    CHANGE_FEED_POLL_SECONDS: float = float(os.getenv("CHANGE_FEED_POLL_SECONDS", 2.0))  # Sondeo de respaldo
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", 15.0))
+    CHANGE_FEED_QUEUE_SIZE: int = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", 1000))  # Eventos pendientes por suscriptor
+    CHANGE_FEED_RETENTION_HOURS: float = float(os.getenv("CHANGE_FEED_RETENTION_HOURS", 24.0))
+    
+    # Claves de idempotencia (cabecera Idempotency-Key)
+    IDEMPOTENCY_TTL_HOURS: float = float(os.getenv("IDEMPOTENCY_TTL_HOURS", 24.0))  # Vigencia de la respuesta guardada
+    IDEMPOTENCY_LOCK_SECONDS: float = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 120.0))  # Reserva de una clave en curso; se renueva mientras la petición sigue viva
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 60.0))  # Espera máxima de un duplicado concurrente
+    
+    # Compresión de respuestas (gzip siempre; br y zstd si están instalados brotli y zstandard)
+    COMPRESSION_ENCODINGS: str = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")  # Orden de preferencia
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # Bytes; por debajo no compensa
+    
+    # Caché de respuestas GET del catálogo por worker (cuerpo y variantes comprimidas)
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL_SECONDS: float = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30.0))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 256))
+    RESPONSE_CACHE_MAX_BODY: int = int(os.getenv("RESPONSE_CACHE_MAX_BODY", 2 * 1024 * 1024))  # Bytes por respuesta
+    
+    # Bus de invalidación de cachés entre workers: "postgres" (LISTEN/NOTIFY) o "local" (solo este worker)
+    CACHE_BUS_BACKEND: str = os.getenv("CACHE_BUS_BACKEND", "postgres")
+    CACHE_BUS_CHANNEL: str = os.getenv("CACHE_BUS_CHANNEL", "cache_invalidation")
+    CACHE_BUS_POLL_SECONDS: float = float(os.getenv("CACHE_BUS_POLL_SECONDS", 5.0))  # Espera máxima entre comprobaciones de parada
+    
+    # Control de admisión por grupo de rutas: grupo=concurrencia/cola/espera máxima (s)
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_LIMITS: str = os.getenv(
+        "ADMISSION_LIMITS", "reads=64/256/2,writes=16/64/5,uploads=4/16/10,generation=2/8/30"
+    )
     
     # Directorio de uploads
     UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
     
+    # Almacenamiento de imágenes: "local" (UPLOAD_DIR) o "s3" (S3 o compatible, p. ej. MinIO)
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "local")
+    STORAGE_PUBLIC_URL: str = os.getenv("STORAGE_PUBLIC_URL", "")  # Base de las URLs públicas (CDN); vacío: la del backend
+    STORAGE_SIGNING_SECRET: str = os.getenv("STORAGE_SIGNING_SECRET", "")  # Firma de las URLs de subida locales (igual en todos los workers)
+    STORAGE_PRESIGN_EXPIRES_SECONDS: int = int(os.getenv("STORAGE_PRESIGN_EXPIRES_SECONDS", 900))
+    S3_BUCKET: str = os.getenv("S3_BUCKET", "")
+    S3_ENDPOINT_URL: str = os.getenv("S3_ENDPOINT_URL", "")  # Vacío para AWS; p. ej. http://localhost:9000 para MinIO
+    S3_REGION: str = os.getenv("S3_REGION", "us-east-1")
+    S3_ACCESS_KEY_ID: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
+    
+    # Miniaturas (se generan en segundo plano tras confirmar la subida)
+    THUMBNAIL_SIZE: int = int(os.getenv("THUMBNAIL_SIZE", 320))  # Lado mayor en píxeles
+    THUMBNAIL_WORKERS: int = int(os.getenv("THUMBNAIL_WORKERS", 2))
+    
+    # Limpieza de archivos subidos que ningún producto referencia
+    UPLOAD_GC_ENABLED: bool = os.getenv("UPLOAD_GC_ENABLED", "true").lower() == "true"
+    UPLOAD_GC_INTERVAL_SECONDS: float = float(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", 3600.0))
+    UPLOAD_GC_GRACE_SECONDS: float = float(os.getenv("UPLOAD_GC_GRACE_SECONDS", 3600.0))  # Margen tras caducar el ticket antes de borrar
+    UPLOAD_GC_BATCH_SIZE: int = int(os.getenv("UPLOAD_GC_BATCH_SIZE", 500))
+    
     # Tamaño máximo de imágenes
     MAX_IMAGE_SIZE: int = 5 * 1024 * 1024  # 5MB
     
@@ -46,6 +133,13 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+    
+    @model_validator(mode="after")
+    def build_database_url(self):
+        """Construir DATABASE_URL después de leer el entorno y el .env"""
+        if not self.DATABASE_URL:
+            self.DATABASE_URL = f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        return self
 
 
 # Instanciar configuración
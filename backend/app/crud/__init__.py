@@ -1,3 +1,5 @@
 # app/crud/__init__.py
 from app.crud import product
-from app.crud import ad_sheet
\ No newline at end of file
+from app.crud import ad_sheet
+from app.crud import product_event
+from app.crud import idempotency
\ No newline at end of file
@@ -1,17 +1,22 @@
 # app/crud/ad_sheet.py
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 import datetime
 
-from app.models.ad_sheet import AdSheet
+from app.models.ad_sheet import AdSheet, ad_sheet_product
 from app.models.product import Product
 from app.schemas.ad_sheet import AdSheetCreate, AdSheetUpdate
 from app.utils.llm_generator import generate_ad_sheet_content
+from app.utils.cache_bus import invalidate, AD_SHEETS, ad_sheet_tag
+from app.utils.ad_renderers import render_ad_sheet
 
-def get_ad_sheet(db: Session, ad_sheet_id: UUID):
-    """Obtener una ficha publicitaria por su ID"""
-    return db.query(AdSheet).filter(AdSheet.id == ad_sheet_id).first()
+def get_ad_sheet(db: Session, ad_sheet_id: UUID, with_renders: bool = False):
+    """Obtener una ficha publicitaria por su ID (con sus representaciones si se piden)"""
+    query = db.query(AdSheet)
+    if with_renders:
+        query = query.options(undefer(AdSheet.renders))
+    return query.filter(AdSheet.id == ad_sheet_id).first()
 
 def get_ad_sheets(db: Session, platform: Optional[str] = None) -> List[AdSheet]:
     """Obtener todas las fichas publicitarias, opcionalmente filtradas por plataforma"""
@@ -22,7 +27,29 @@ def get_ad_sheets(db: Session, platform: Optional[str] = None) -> List[AdSheet]:
         
     return query.all()
 
-def create_ad_sheet(db: Session, ad_sheet: AdSheetCreate) -> AdSheet:
+def get_ad_sheets_for_product(db: Session, product_id: UUID, platform: Optional[str] = None) -> List[AdSheet]:
+    """Obtener las fichas que incluyen un producto, de la más reciente a la más antigua"""
+    query = (
+        db.query(AdSheet)
+        .join(ad_sheet_product, ad_sheet_product.c.ad_sheet_id == AdSheet.id)
+        .filter(ad_sheet_product.c.product_id == product_id)
+    )
+    
+    if platform:
+        query = query.filter(AdSheet.platform == platform)
+        
+    return query.order_by(AdSheet.created_at.desc()).all()
+
+def get_ad_sheets_fields(db: Session, fields: List[str], platform: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Obtener solo las columnas indicadas de las fichas, sin cargar el resto (p.ej. content)"""
+    query = db.query(*[getattr(AdSheet, field) for field in fields])
+    
+    if platform:
+        query = query.filter(AdSheet.platform == platform)
+        
+    return [dict(row._mapping) for row in query.all()]
+
+async def create_ad_sheet(db: Session, ad_sheet: AdSheetCreate) -> AdSheet:
     """Crear una nueva ficha publicitaria"""
     # Obtener los productos relacionados
     products = db.query(Product).filter(Product.id.in_(ad_sheet.product_ids)).all()
@@ -31,7 +58,7 @@ def create_ad_sheet(db: Session, ad_sheet: AdSheetCreate) -> AdSheet:
         raise ValueError("No se encontraron productos con los IDs proporcionados")
     
     # Generar el contenido de la ficha usando el generador LLM
-    content = generate_ad_sheet_content(products, ad_sheet.platform, ad_sheet.template)
+    content = await generate_ad_sheet_content(products, ad_sheet.platform, ad_sheet.template)
     
     # Crear la ficha publicitaria
     db_ad_sheet = AdSheet(
@@ -39,17 +66,20 @@ def create_ad_sheet(db: Session, ad_sheet: AdSheetCreate) -> AdSheet:
     platform=ad_sheet.platform,
     template=ad_sheet.template,
     content=content,
+    renders=render_ad_sheet(content, ad_sheet.platform),
     meta_info=ad_sheet.meta_info,
     products=products
 )
     
     db.add(db_ad_sheet)
+    db.flush()
+    invalidate(db, [AD_SHEETS, ad_sheet_tag(db_ad_sheet.id)])
     db.commit()
     db.refresh(db_ad_sheet)
     
     return db_ad_sheet
 
-def update_ad_sheet(db: Session, ad_sheet_id: UUID, ad_sheet: AdSheetUpdate) -> Optional[AdSheet]:
+async def update_ad_sheet(db: Session, ad_sheet_id: UUID, ad_sheet: AdSheetUpdate) -> Optional[AdSheet]:
     """Actualizar una ficha publicitaria existente"""
     db_ad_sheet = get_ad_sheet(db, ad_sheet_id)
     
@@ -79,13 +109,29 @@ def update_ad_sheet(db: Session, ad_sheet_id: UUID, ad_sheet: AdSheetUpdate) ->
         db_ad_sheet.products = products
         
         # Regenerar el contenido de la ficha
-        db_ad_sheet.content = generate_ad_sheet_content(products, db_ad_sheet.platform, db_ad_sheet.template)
+        db_ad_sheet.content = await generate_ad_sheet_content(products, db_ad_sheet.platform, db_ad_sheet.template)
     
+    # Volver a convertir el contenido (la plataforma también influye en la conversión)
+    db_ad_sheet.renders = render_ad_sheet(db_ad_sheet.content, db_ad_sheet.platform)
+    
+    invalidate(db, [AD_SHEETS, ad_sheet_tag(db_ad_sheet.id)])
     db.commit()
     db.refresh(db_ad_sheet)
     
     return db_ad_sheet
 
+def save_ad_sheet_renders(db: Session, ad_sheet_id: UUID, content: str, platform: str, renders: Dict[str, Any]) -> bool:
+    """
+    Guardar las representaciones calculadas en una lectura. Solo se escriben si
+    el contenido y la plataforma siguen siendo los convertidos (una
+    regeneración concurrente ya guardó las suyas)
+    """
+    updated = db.query(AdSheet).filter(
+        AdSheet.id == ad_sheet_id, AdSheet.content == content, AdSheet.platform == platform
+    ).update({"renders": renders}, synchronize_session=False)
+    db.commit()
+    return updated > 0
+
 def delete_ad_sheet(db: Session, ad_sheet_id: UUID) -> bool:
     """Eliminar una ficha publicitaria"""
     db_ad_sheet = get_ad_sheet(db, ad_sheet_id)
@@ -93,6 +139,7 @@ def delete_ad_sheet(db: Session, ad_sheet_id: UUID) -> bool:
     if not db_ad_sheet:
         return False
     
+    invalidate(db, [AD_SHEETS, ad_sheet_tag(db_ad_sheet.id)])
     db.delete(db_ad_sheet)
     db.commit()
     
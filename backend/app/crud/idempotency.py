@@ -0,0 +1,77 @@
+# app/crud/idempotency.py
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Optional, Dict
+import datetime
+
+from app.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+def claim_idempotency_key(db: Session, key: str, fingerprint: str) -> Optional[IdempotencyKey]:
+    """
+    Reservar la clave para procesar la petición. Devuelve None si se reservó;
+    si otra petición ya la tiene (en curso o terminada), devuelve su registro.
+    Mientras está en curso, expires_at es el fin de la reserva (la renueva
+    `renew_idempotency_key`); al completarse pasa a ser el fin del TTL.
+    """
+    now = datetime.datetime.utcnow()
+    existing = db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+    
+    try:
+        if existing is not None:
+            if existing.expires_at > now:
+                return existing
+            
+            # Clave caducada o abandonada por un worker caído: se vuelve a reservar
+            db.delete(existing)
+            db.flush()
+        
+        db.add(IdempotencyKey(
+            key=key,
+            fingerprint=fingerprint,
+            status="in_progress",
+            created_at=now,
+            expires_at=now + datetime.timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        ))
+        db.commit()
+    except (IntegrityError, StaleDataError):
+        # Otra petición concurrente la reservó primero
+        db.rollback()
+        return db.query(IdempotencyKey).filter(IdempotencyKey.key == key).first()
+    return None
+
+def complete_idempotency_key(db: Session, key: str, status: int, headers: Dict[str, str], body: bytes) -> None:
+    """Guardar la respuesta de la petición original para las repeticiones"""
+    db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update({
+        "status": "completed",
+        "expires_at": datetime.datetime.utcnow() + datetime.timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+        "response_status": status,
+        "response_headers": headers,
+        "response_body": body
+    }, synchronize_session=False)
+    db.commit()
+
+def renew_idempotency_key(db: Session, key: str) -> None:
+    """Prolongar la reserva de una clave en curso"""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key, IdempotencyKey.status == "in_progress"
+    ).update({
+        "expires_at": datetime.datetime.utcnow() + datetime.timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+
+def release_idempotency_key(db: Session, key: str) -> None:
+    """Liberar la clave (la petición falló y se puede reintentar)"""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key, IdempotencyKey.status == "in_progress"
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def purge_expired_idempotency_keys(db: Session) -> int:
+    """Eliminar las claves caducadas"""
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at <= datetime.datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -1,8 +1,10 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Set, Iterable
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductUpdate, ProductAvailability
-from app.utils.file_handlers import delete_file
+from app.crud.product_event import record_product_event
+from app.utils.cache_bus import invalidate, PRODUCTS, product_tag
+from app.utils.file_handlers import get_storage, thumbnail_key
 import uuid
 
 def get_product(db: Session, product_id: uuid.UUID):
@@ -14,10 +16,23 @@ def get_products(db: Session, disponible: Optional[bool] = None) -> List[Product
     query = db.query(Product)
     
     if disponible is not None:
-        query = query.filter(Product.disponible == disponible)
+        # Sin parámetro (NOT disponible / disponible = 0 en SQLite), para que
+        # coincida con el predicado del índice parcial
+        query = query.filter(Product.disponible if disponible else ~Product.disponible)
         
     return query.all()
 
+def get_products_fields(db: Session, fields: List[str], disponible: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Obtener solo las columnas indicadas de los productos, sin cargar el resto"""
+    query = db.query(*[getattr(Product, field) for field in fields])
+    
+    if disponible is not None:
+        # Sin parámetro (NOT disponible / disponible = 0 en SQLite), para que
+        # coincida con el predicado del índice parcial
+        query = query.filter(Product.disponible if disponible else ~Product.disponible)
+        
+    return [dict(row._mapping) for row in query.all()]
+
 def create_product(db: Session, product: ProductCreate, foto: Optional[str] = None) -> Product:
     """Crear un nuevo producto"""
     # Convertir a diccionario y añadir foto si existe
@@ -27,7 +42,11 @@ def create_product(db: Session, product: ProductCreate, foto: Optional[str] = No
     )
     
     db.add(db_product)
+    db.flush()
+    record_product_event(db, "create", db_product)
+    invalidate(db, [PRODUCTS, product_tag(db_product.id)])
     db.commit()
+    _attach_existing_thumbnail(db, db_product)
     db.refresh(db_product)
     
     return db_product
@@ -48,23 +67,54 @@ def update_product(
     # Actualizar campos
     update_data = product.dict(exclude_unset=True) if hasattr(product, 'dict') else product
     
-    # Si hay nueva foto, eliminar la anterior
-    if foto and db_product.foto:
-        delete_file(db_product.foto)
-    
-    # Actualizar solo si hay nueva foto
+    # Actualizar solo si hay nueva foto (la anterior la elimina la limpieza de uploads huérfanos)
     if foto:
         update_data["foto"] = foto
+        update_data["thumbnail"] = None
     
     # Aplicar actualizaciones
     for key, value in update_data.items():
         setattr(db_product, key, value)
     
+    # Registrar el cambio en el feed
+    event_type = "availability" if set(update_data) == {"disponible"} else "update"
+    record_product_event(db, event_type, db_product)
+    invalidate(db, [PRODUCTS, product_tag(db_product.id)])
+    
     db.commit()
+    if foto:
+        _attach_existing_thumbnail(db, db_product)
     db.refresh(db_product)
     
     return db_product
 
+def set_thumbnail(db: Session, foto: str, thumbnail: str) -> int:
+    """Anotar la miniatura en los productos con esa foto; devuelve cuántos cambian"""
+    ids = [
+        row.id for row in
+        db.query(Product.id).filter(Product.foto == foto, Product.thumbnail.is_(None)).all()
+    ]
+    if not ids:
+        db.rollback()
+        return 0
+    db.query(Product).filter(Product.id.in_(ids)).update(
+        {"thumbnail": thumbnail}, synchronize_session=False
+    )
+    invalidate(db, [PRODUCTS] + [product_tag(product_id) for product_id in ids])
+    db.commit()
+    return len(ids)
+
+def _attach_existing_thumbnail(db: Session, db_product: Product) -> None:
+    """
+    La miniatura se genera en segundo plano y puede terminar antes de que se
+    confirme el producto (set_thumbnail no lo vería): se comprueba después del
+    commit
+    """
+    if db_product.foto and db_product.thumbnail is None:
+        key = thumbnail_key(db_product.foto)
+        if get_storage().stat(key) is not None:
+            set_thumbnail(db, db_product.foto, key)
+
 def update_product_availability(
     db: Session, 
     product_id: uuid.UUID, 
@@ -80,11 +130,18 @@ def delete_product(db: Session, product_id: uuid.UUID) -> bool:
     if not db_product:
         return False
     
-    # Eliminar la foto si existe
-    if db_product.foto:
-        delete_file(db_product.foto)
-    
+    # La foto queda huérfana y la elimina la limpieza de uploads, fuera de la petición
+    record_product_event(db, "delete", db_product)
+    invalidate(db, [PRODUCTS, product_tag(db_product.id)])
     db.delete(db_product)
     db.commit()
     
-    return True
\ No newline at end of file
+    return True
+
+def get_referenced_photos(db: Session, filenames: Iterable[str]) -> Set[str]:
+    """Obtener cuáles de los archivos indicados están referenciados por algún producto"""
+    filenames = list(filenames)
+    if not filenames:
+        return set()
+    rows = db.query(Product.foto).filter(Product.foto.in_(filenames)).all()
+    return {row.foto for row in rows}
\ No newline at end of file
@@ -0,0 +1,86 @@
+# app/crud/product_event.py
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+from typing import List, Optional, Dict, Any
+import datetime
+
+from app.config import settings
+from app.models.product import Product
+from app.models.product_event import ProductEvent
+
+# Clave de la sesión con los eventos pendientes de la transacción en curso
+_PENDING_KEY = "product_events"
+
+def record_product_event(db: Session, event_type: str, product: Product) -> ProductEvent:
+    """
+    Registrar un cambio de producto en el feed. El evento se inserta justo
+    antes del commit (ver `_insert_pending_events`); en PostgreSQL también se
+    emite un NOTIFY, que se entrega al hacer commit.
+    """
+    db_event = ProductEvent(
+        product_id=product.id,
+        event_type=event_type,
+        disponible=product.disponible
+    )
+    db.info.setdefault(_PENDING_KEY, []).append(db_event)
+    return db_event
+
+@event.listens_for(Session, "before_commit")
+def _insert_pending_events(session: Session) -> None:
+    events = session.info.pop(_PENDING_KEY, None)
+    if not events:
+        return
+    
+    postgres = session.get_bind().dialect.name == "postgresql"
+    if postgres:
+        # Escribir antes el resto de la transacción: el bloqueo solo cubre la
+        # inserción de los eventos y el commit. Serializa a los escritores en
+        # ese tramo final para que el orden de las secuencias coincida con el
+        # de los commits y ningún lector se salte eventos.
+        session.flush()
+        session.execute(text("SELECT pg_advisory_xact_lock(hashtext(:channel))"), {"channel": settings.CHANGE_FEED_CHANNEL})
+    
+    session.add_all(events)
+    session.flush()
+    
+    if postgres:
+        for db_event in events:
+            session.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": settings.CHANGE_FEED_CHANNEL, "payload": db_event.event_type}
+            )
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+def get_product_events(db: Session, since: int, limit: int = 500) -> List[ProductEvent]:
+    """Obtener los eventos con número de secuencia mayor que `since`, en orden"""
+    return (
+        db.query(ProductEvent)
+        .filter(ProductEvent.seq > since)
+        .order_by(ProductEvent.seq)
+        .limit(limit)
+        .all()
+    )
+
+def get_sequence_bounds(db: Session) -> Dict[str, Optional[int]]:
+    """Obtener el primer y el último número de secuencia conservados"""
+    oldest, latest = db.query(func.min(ProductEvent.seq), func.max(ProductEvent.seq)).one()
+    return {"oldest": oldest, "latest": latest}
+
+def prune_product_events(db: Session, older_than: datetime.datetime) -> int:
+    """Eliminar los eventos anteriores a la fecha indicada"""
+    deleted = db.query(ProductEvent).filter(ProductEvent.created_at < older_than).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def serialize_event(event: ProductEvent) -> Dict[str, Any]:
+    """Representación JSON de un evento para el feed de cambios"""
+    return {
+        "seq": event.seq,
+        "type": event.event_type,
+        "product_id": str(event.product_id),
+        "disponible": event.disponible,
+        "created_at": event.created_at.isoformat()
+    }
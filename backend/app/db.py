@@ -1,21 +1,158 @@
+import itertools
+import threading
+import time
+from typing import List, Optional
+from fastapi import Request, Response
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.utils.metrics import instrument_engine, DB_READ_ROUTING
+from app.utils.slow_queries import instrument_slow_queries
 
-# Crear motor de SQLAlchemy
-engine = create_engine(settings.DATABASE_URL)
+# Cookie que fija al cliente en el primario después de una escritura
+PRIMARY_PIN_COOKIE = "db_primary_until"
+
+# Cabecera para forzar lecturas del primario (X-Read-Consistency: strong)
+READ_CONSISTENCY_HEADER = "x-read-consistency"
+
+# Clave del scope ASGI que marca las peticiones leídas de una réplica (la caché de
+# respuestas no las guarda: la réplica puede ir por detrás de una invalidación)
+REPLICA_READ_SCOPE_KEY = "db.replica_read"
+
+# Motor de SQLAlchemy; se crea en el arranque de la aplicación (lifespan) o en el primer uso
+_engine: Optional[Engine] = None
+
+# Motores de las réplicas de lectura y rotación entre ellas
+_replica_engines: Optional[List[Engine]] = None
+_replica_cycle = None
+_replica_down_until = {}
+_replica_lock = threading.Lock()
 
 # Clase base para los modelos
 Base = declarative_base()
 
-# Clase de sesión para las operaciones de base de datos
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Clase de sesión para las operaciones de base de datos (se enlaza al motor al crearlo)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+def _create_engine(url: str) -> Engine:
+    options = {"pool_pre_ping": True}
+    if not url.startswith("sqlite"):
+        options.update(pool_size=settings.DB_POOL_SIZE, max_overflow=settings.DB_MAX_OVERFLOW)
+    engine = create_engine(url, **options)
+
+    # Contar consultas y tiempo de base de datos por petición y registrar las lentas
+    instrument_engine(engine)
+    instrument_slow_queries(engine)
+    return engine
+
+def get_engine() -> Engine:
+    """Devuelve el motor de SQLAlchemy, creándolo si todavía no existe"""
+    global _engine
+    if _engine is None:
+        _engine = _create_engine(settings.DATABASE_URL)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+def get_replica_engines() -> List[Engine]:
+    """Devuelve los motores de las réplicas configuradas (lista vacía si no hay)"""
+    global _replica_engines, _replica_cycle
+    with _replica_lock:
+        if _replica_engines is None:
+            urls = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+            _replica_engines = [_create_engine(url) for url in urls]
+            _replica_cycle = itertools.cycle(_replica_engines)
+    return _replica_engines
+
+def dispose_engine() -> None:
+    """Cierra las conexiones de los pools y descarta los motores"""
+    global _engine, _replica_engines, _replica_cycle
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+    with _replica_lock:
+        for replica in _replica_engines or []:
+            replica.dispose()
+        _replica_engines = None
+        _replica_cycle = None
+        _replica_down_until.clear()
+
+def _connect_replica():
+    """
+    Abre una conexión con la siguiente réplica disponible; las réplicas que
+    fallan quedan fuera de la rotación durante REPLICA_RETRY_SECONDS
+    """
+    replicas = get_replica_engines()
+    now = time.monotonic()
+    for _ in range(len(replicas)):
+        with _replica_lock:
+            replica = next(_replica_cycle)
+            if _replica_down_until.get(replica, 0) > now:
+                continue
+        try:
+            return replica.connect()
+        except Exception:
+            with _replica_lock:
+                _replica_down_until[replica] = now + settings.REPLICA_RETRY_SECONDS
+    return None
+
+def _pinned_to_primary(request: Request) -> bool:
+    if request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "strong":
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
 
 # Función para obtener una sesión de base de datos
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def get_read_db(request: Request):
+    """
+    Sesión para rutas de solo lectura: usa una réplica si hay alguna disponible
+    y el cliente no ha escrito recientemente; si no, el primario
+    """
+    get_engine()
+    connection = None
+    if not _pinned_to_primary(request):
+        connection = _connect_replica() if get_replica_engines() else None
+
+    if connection is None:
+        DB_READ_ROUTING.inc(target="primary")
+        db = SessionLocal()
+    else:
+        DB_READ_ROUTING.inc(target="replica")
+        request.scope[REPLICA_READ_SCOPE_KEY] = True
+        db = SessionLocal(bind=connection)
+    try:
+        yield db
+    finally:
+        db.close()
+        if connection is not None:
+            connection.close()
+
+def pin_to_primary(response: Response) -> None:
+    """
+    Fija al cliente en el primario durante READ_YOUR_WRITES_SECONDS para que
+    lea sus propias escrituras (solo si hay réplicas)
+    """
+    if settings.DATABASE_REPLICA_URLS and settings.READ_YOUR_WRITES_SECONDS > 0:
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE,
+            str(time.time() + settings.READ_YOUR_WRITES_SECONDS),
+            max_age=int(settings.READ_YOUR_WRITES_SECONDS) + 1,
+            httponly=True,
+            samesite="lax",
+        )
+
+def get_write_db(response: Response):
+    """Sesión del primario para rutas que escriben (con read-your-writes)"""
+    pin_to_primary(response)
+    yield from get_db()
@@ -1,3 +1,5 @@
 # app/models/__init__.py
 from app.models.product import Product
-from app.models.ad_sheet import AdSheet
\ No newline at end of file
+from app.models.ad_sheet import AdSheet
+from app.models.product_event import ProductEvent
+from app.models.idempotency_key import IdempotencyKey
\ No newline at end of file
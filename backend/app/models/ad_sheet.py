@@ -1,16 +1,20 @@
 # app/models/ad_sheet.py
-from sqlalchemy import Column, String, JSON, ForeignKey, Table, Integer
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, JSON, ForeignKey, Table, Integer, DateTime, Index
+from sqlalchemy.orm import backref
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
+import datetime
 from app.db import Base
 
 # Tabla de asociación para la relación muchos a muchos entre fichas y productos
+# (las filas se borran en cascada al eliminar la ficha o el producto)
 ad_sheet_product = Table(
     'ad_sheet_product',
     Base.metadata,
-    Column('ad_sheet_id', UUID(as_uuid=True), ForeignKey('ad_sheets.id')),
-    Column('product_id', UUID(as_uuid=True), ForeignKey('products.id'))
+    Column('ad_sheet_id', UUID(as_uuid=True), ForeignKey('ad_sheets.id', name='fk_ad_sheet_product_ad_sheet_id', ondelete='CASCADE'), primary_key=True),
+    Column('product_id', UUID(as_uuid=True), ForeignKey('products.id', name='fk_ad_sheet_product_product_id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_ad_sheet_product_product_id', 'product_id')
 )
 
 class AdSheet(Base):
@@ -18,10 +22,20 @@ class AdSheet(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     title = Column(String, nullable=False)
-    platform = Column(String, nullable=False)  # "facebook", "whatsapp", "revolico", etc.
+    platform = Column(String, nullable=False, index=True)  # "facebook", "whatsapp", "revolico", etc.
     template = Column(String, nullable=False)  # Nombre del template utilizado
     content = Column(String, nullable=False)  # Contenido en markdown
     meta_info = Column(JSON, nullable=True, default={}) # Metadatos adicionales
+    # Contenido convertido para cada plataforma (ver app/utils/ad_renderers.py);
+    # diferido para que los listados no lo lean
+    renders = deferred(Column(JSON, nullable=True))
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
     
-    # Relación muchos a muchos con productos
-    products = relationship("Product", secondary=ad_sheet_product, backref="ad_sheets")
\ No newline at end of file
+    # Relación muchos a muchos con productos; la base de datos borra las filas de
+    # asociación en cascada, así que no hace falta cargar la colección al eliminar
+    products = relationship(
+        "Product",
+        secondary=ad_sheet_product,
+        passive_deletes=True,
+        backref=backref("ad_sheets", passive_deletes=True)
+    )
\ No newline at end of file
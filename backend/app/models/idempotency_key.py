@@ -0,0 +1,16 @@
+# app/models/idempotency_key.py
+from sqlalchemy import Column, String, Integer, DateTime, JSON, LargeBinary
+import datetime
+from app.db import Base
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)  # Valor de la cabecera Idempotency-Key
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 de método, ruta y cuerpo normalizado
+    status = Column(String, nullable=False, default="in_progress")  # "in_progress" o "completed"
+    response_status = Column(Integer, nullable=True)
+    response_headers = Column(JSON, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)  # Fin de la reserva (en curso) o del TTL (completada)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Numeric, Boolean, JSON
+from sqlalchemy import Column, String, Numeric, Boolean, JSON, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from app.db import Base
@@ -8,9 +8,21 @@ class Product(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     nombre = Column(String, nullable=False)
-    precio = Column(Numeric(10, 2), nullable=False)
+    precio = Column(Numeric(10, 2), nullable=False, index=True)
     color = Column(String, nullable=True)
     talla = Column(String, nullable=True)
     caracteristicas = Column(JSON, nullable=True, default={})
     foto = Column(String, nullable=True)
-    disponible = Column(Boolean, nullable=False, default=True)
\ No newline at end of file
+    thumbnail = Column(String, nullable=True)  # Clave de la miniatura; None mientras no exista
+    disponible = Column(Boolean, nullable=False, default=True)
+    
+    __table_args__ = (
+        # Índice parcial estrecho de los productos no disponibles (la minoría del
+        # catálogo): el filtro disponible=false lo usa en lugar de recorrer la
+        # tabla. Los disponibles son la mayoría y se leen con un recorrido
+        # secuencial, así que no tienen índice propio.
+        Index(
+            "ix_products_no_disponible_precio", "precio",
+            postgresql_where=text("NOT disponible"), sqlite_where=text("disponible = 0")
+        ),
+    )
@@ -0,0 +1,15 @@
+# app/models/product_event.py
+from sqlalchemy import Column, String, Boolean, DateTime, BigInteger, Integer
+from sqlalchemy.dialects.postgresql import UUID
+import datetime
+from app.db import Base
+
+class ProductEvent(Base):
+    __tablename__ = "product_events"
+    
+    # Número de secuencia del feed de cambios (BIGSERIAL en PostgreSQL)
+    seq = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    product_id = Column(UUID(as_uuid=True), nullable=False)
+    event_type = Column(String, nullable=False)  # "create", "update", "availability", "delete"
+    disponible = Column(Boolean, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
@@ -1,3 +1,6 @@
 # app/routes/__init__.py
 from app.routes import product_router
-from app.routes import ad_sheet_router
\ No newline at end of file
+from app.routes import ad_sheet_router
+from app.routes import change_feed_router
+from app.routes import upload_router
+from app.routes import admin_router
\ No newline at end of file
@@ -1,37 +1,104 @@
 # app/routes/ad_sheet_router.py
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from typing import List, Optional
+import logging
+from typing import List, Optional, Union
 from uuid import UUID
 
-from app.db import get_db
-from app.schemas.ad_sheet import AdSheetResponse, AdSheetCreate, AdSheetUpdate
+from app.db import get_db, get_read_db, get_write_db
+from app.schemas.ad_sheet import (
+    AdSheetResponse, AdSheetCreate, AdSheetUpdate, AdSheetPartial, AdSheetRender,
+    AD_SHEET_FIELDS, AD_SHEET_SUMMARY_FIELDS
+)
 from app.crud import ad_sheet as ad_sheet_crud
+from app.crud import product as product_crud
 from app.config import settings
+from app.utils.projection import resolve_fields
+from app.utils.ad_renderers import RENDER_FORMATS, get_render, refresh_renders
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["ad_sheets"])
 
-@router.get("/ad-sheets", response_model=List[AdSheetResponse])
+@router.get("/ad-sheets", response_model=List[Union[AdSheetResponse, AdSheetPartial]])
 async def get_ad_sheets(
     platform: Optional[str] = Query(None, description="Filtrar por plataforma"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por comas"),
+    view: Optional[str] = Query(None, description="Vista del listado: 'full' o 'summary'"),
+    db: Session = Depends(get_read_db)
 ):
     """Obtener todas las fichas publicitarias, opcionalmente filtradas por plataforma"""
-    ad_sheets = ad_sheet_crud.get_ad_sheets(db, platform)
-    return ad_sheets
+    try:
+        selected = resolve_fields(fields, view, AD_SHEET_FIELDS, AD_SHEET_SUMMARY_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if selected is None:
+        return ad_sheet_crud.get_ad_sheets(db, platform)
+    
+    # Proyección: solo se leen y serializan las columnas pedidas, sin el markdown
+    # de content (AdSheetPartial)
+    rows = ad_sheet_crud.get_ad_sheets_fields(db, selected, platform)
+    return JSONResponse([
+        AdSheetPartial(**row).model_dump(mode="json", exclude_unset=True) for row in rows
+    ])
 
-@router.get("/ad-sheets/{ad_sheet_id}", response_model=AdSheetResponse)
-async def get_ad_sheet(ad_sheet_id: UUID, db: Session = Depends(get_db)):
-    """Obtener una ficha publicitaria por su ID"""
-    db_ad_sheet = ad_sheet_crud.get_ad_sheet(db, ad_sheet_id)
+@router.get("/ad-sheets/{ad_sheet_id}", response_model=Union[AdSheetResponse, AdSheetRender])
+async def get_ad_sheet(
+    ad_sheet_id: UUID,
+    format: Optional[str] = Query(None, description="Formato del contenido: 'markdown', 'whatsapp', 'html' o 'text'"),
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db)
+):
+    """
+    Obtener una ficha publicitaria por su ID (AdSheetResponse) o, con ?format=,
+    solo su contenido en ese formato (AdSheetRender)
+    """
+    db_ad_sheet = ad_sheet_crud.get_ad_sheet(
+        db, ad_sheet_id, with_renders=format is not None and format != "markdown"
+    )
     if db_ad_sheet is None:
         raise HTTPException(status_code=404, detail="Ficha publicitaria no encontrada")
-    return db_ad_sheet
+    if format is None:
+        return db_ad_sheet
+    
+    # Representaciones que faltan o de otra versión: se guardan en el primario
+    # (la lectura puede venir de una réplica) para no convertir en cada lectura
+    renders = refresh_renders(db_ad_sheet) if format in RENDER_FORMATS else None
+    if renders is not None:
+        try:
+            ad_sheet_crud.save_ad_sheet_renders(
+                primary_db, db_ad_sheet.id, db_ad_sheet.content, db_ad_sheet.platform, renders
+            )
+        except SQLAlchemyError:
+            primary_db.rollback()
+            logger.warning("No se pudieron guardar las representaciones de la ficha %s", db_ad_sheet.id, exc_info=True)
+    
+    try:
+        render = get_render(db_ad_sheet, format, renders)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(AdSheetRender(
+        id=db_ad_sheet.id, platform=db_ad_sheet.platform, format=format, **render
+    ).model_dump(mode="json"))
+
+@router.get("/products/{product_id}/ad-sheets", response_model=List[AdSheetResponse])
+async def get_product_ad_sheets(
+    product_id: UUID,
+    platform: Optional[str] = Query(None, description="Filtrar por plataforma"),
+    db: Session = Depends(get_read_db)
+):
+    """Obtener las fichas publicitarias que incluyen un producto"""
+    if product_crud.get_product(db, product_id) is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return ad_sheet_crud.get_ad_sheets_for_product(db, product_id, platform)
 
 @router.post("/ad-sheets", response_model=AdSheetResponse, status_code=201)
 async def create_ad_sheet(
     ad_sheet: AdSheetCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Crear una nueva ficha publicitaria"""
     try:
@@ -58,7 +125,7 @@ async def create_ad_sheet(
 async def update_ad_sheet(
     ad_sheet_id: UUID,
     ad_sheet: AdSheetUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Actualizar una ficha publicitaria existente"""
     try:
@@ -88,7 +155,7 @@ async def update_ad_sheet(
         raise HTTPException(status_code=500, detail=f"Error al actualizar la ficha publicitaria: {str(e)}")
 
 @router.delete("/ad-sheets/{ad_sheet_id}", status_code=200)
-async def delete_ad_sheet(ad_sheet_id: UUID, db: Session = Depends(get_db)):
+async def delete_ad_sheet(ad_sheet_id: UUID, db: Session = Depends(get_write_db)):
     """Eliminar una ficha publicitaria"""
     deleted = ad_sheet_crud.delete_ad_sheet(db, ad_sheet_id)
     
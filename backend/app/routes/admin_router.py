@@ -0,0 +1,36 @@
+# app/routes/admin_router.py
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
+import hmac
+
+from app.config import settings
+from app.utils.slow_queries import slow_query_log
+
+router = APIRouter(tags=["admin"])
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Las rutas de administración solo existen si se define ADMIN_TOKEN"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administración no válido")
+
+@router.get("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def get_slow_queries(
+    limit: Optional[int] = Query(None, ge=1, description="Número máximo de consultas a devolver"),
+    route: Optional[str] = Query(None, description="Filtrar por ruta (p. ej. /api/products)")
+):
+    """Consultas lentas recientes de este worker, con su plan si se muestreó"""
+    records = slow_query_log.records()
+    if route:
+        records = [record for record in records if record["route"] == route]
+    return {
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "queries": records[:limit] if limit else records,
+    }
+
+@router.delete("/admin/slow-queries", dependencies=[Depends(require_admin)])
+async def clear_slow_queries():
+    """Vaciar el registro de consultas lentas de este worker"""
+    slow_query_log.clear()
+    return {"message": "Registro de consultas lentas vaciado"}
@@ -0,0 +1,60 @@
+# app/routes/change_feed_router.py
+from fastapi import APIRouter, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import json
+
+from app.utils.change_feed import iter_changes
+
+router = APIRouter(tags=["products"])
+
+def _resume_point(since: Optional[int], last_event_id: Optional[str]) -> Optional[int]:
+    """El parámetro `since` tiene prioridad sobre la cabecera Last-Event-ID de SSE"""
+    if since is not None:
+        return since
+    if last_event_id and last_event_id.isdigit():
+        return int(last_event_id)
+    return None
+
+@router.get("/products/changes")
+async def stream_product_changes(
+    request: Request,
+    since: Optional[int] = Query(None, description="Reanudar después de este número de secuencia"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Feed de cambios de productos en tiempo real (Server-Sent Events)"""
+    async def event_stream():
+        async for event in iter_changes(_resume_point(since, last_event_id)):
+            if event is None:
+                # Heartbeat para mantener viva la conexión y detectar desconexiones
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            
+            if event["type"] == "reset":
+                yield f"event: reset\ndata: {json.dumps(event)}\n\n"
+                return
+            
+            yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/products/changes/ws")
+async def websocket_product_changes(websocket: WebSocket, since: Optional[int] = None):
+    """Feed de cambios de productos en tiempo real (WebSocket)"""
+    await websocket.accept()
+    try:
+        async for event in iter_changes(since):
+            if event is None:
+                continue
+            await websocket.send_json(event)
+            if event["type"] == "reset":
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
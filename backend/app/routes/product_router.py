@@ -1,28 +1,58 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+import asyncio
 import json
 from uuid import UUID
 
-from app.db import get_db
+from app.db import get_read_db, get_write_db
 from app.models.product import Product
-from app.schemas.product import ProductResponse, ProductCreate, ProductUpdate, ProductAvailability
+from app.schemas.product import (
+    ProductResponse, ProductCreate, ProductUpdate, ProductAvailability, ProductPartial,
+    PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS, PRODUCT_COMPUTED_FIELDS
+)
 from app.crud import product as product_crud
-from app.utils.file_handlers import save_upload_file
+from app.utils.file_handlers import save_upload_file, confirm_upload
+from app.utils.projection import resolve_fields, column_fields
 
 router = APIRouter(tags=["products"])
 
-@router.get("/products", response_model=List[ProductResponse])
+async def _store_foto(foto: Optional[UploadFile], foto_key: Optional[str]) -> Optional[str]:
+    """Guarda la foto recibida o confirma la subida directa indicada en foto_key"""
+    if foto and foto_key:
+        raise HTTPException(status_code=400, detail="Envía la foto o foto_key, no ambos")
+    if foto:
+        return await save_upload_file(foto)
+    if foto_key:
+        await asyncio.to_thread(confirm_upload, foto_key)
+        return foto_key
+    return None
+
+@router.get("/products", response_model=List[Union[ProductResponse, ProductPartial]])
 async def get_products(
     disponible: Optional[bool] = Query(None, description="Filtrar por disponibilidad"),
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por comas"),
+    view: Optional[str] = Query(None, description="Vista del listado: 'full' o 'summary'"),
+    db: Session = Depends(get_read_db)
 ):
     """Obtener todos los productos, opcionalmente filtrados por disponibilidad"""
-    products = product_crud.get_products(db, disponible)
-    return products
+    try:
+        selected = resolve_fields(fields, view, PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if selected is None:
+        return product_crud.get_products(db, disponible)
+    
+    # Proyección: solo se leen y serializan las columnas pedidas (ProductPartial)
+    rows = product_crud.get_products_fields(db, column_fields(selected, PRODUCT_COMPUTED_FIELDS), disponible)
+    return JSONResponse([
+        ProductPartial.from_row(row, selected).model_dump(mode="json", exclude_unset=True) for row in rows
+    ])
 
 @router.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: UUID, db: Session = Depends(get_db)):
+async def get_product(product_id: UUID, db: Session = Depends(get_read_db)):
     """Obtener un producto por su ID"""
     db_product = product_crud.get_product(db, product_id)
     if db_product is None:
@@ -38,7 +68,8 @@ async def create_product(
     caracteristicas: str = Form("{}"),
     disponible: bool = Form(True),
     foto: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    foto_key: Optional[str] = Form(None, description="Clave de una imagen subida con /api/uploads"),
+    db: Session = Depends(get_write_db)
 ):
     """Crear un nuevo producto"""
     # Procesar JSON de características
@@ -58,9 +89,7 @@ async def create_product(
     )
     
     # Guardar imagen si existe
-    foto_filename = None
-    if foto:
-        foto_filename = await save_upload_file(foto)
+    foto_filename = await _store_foto(foto, foto_key)
     
     # Crear producto en la base de datos
     return product_crud.create_product(db, product_data, foto_filename)
@@ -75,7 +104,8 @@ async def update_product(
     caracteristicas: Optional[str] = Form(None),
     disponible: Optional[bool] = Form(None),
     foto: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    foto_key: Optional[str] = Form(None, description="Clave de una imagen subida con /api/uploads"),
+    db: Session = Depends(get_write_db)
 ):
     """Actualizar un producto existente"""
     # Verificar si el producto existe
@@ -108,9 +138,7 @@ async def update_product(
         update_data["disponible"] = disponible
     
     # Guardar imagen si existe
-    foto_filename = None
-    if foto:
-        foto_filename = await save_upload_file(foto)
+    foto_filename = await _store_foto(foto, foto_key)
     
     # Actualizar producto
     updated_product = product_crud.update_product(db, product_id, update_data, foto_filename)
@@ -124,7 +152,7 @@ async def update_product(
 async def update_product_availability(
     product_id: UUID,
     availability: ProductAvailability,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_write_db)
 ):
     """Actualizar solo la disponibilidad de un producto"""
     # Verificar si el producto existe
@@ -141,7 +169,7 @@ async def update_product_availability(
     return updated_product
 
 @router.delete("/products/{product_id}", status_code=200)
-async def delete_product(product_id: UUID, db: Session = Depends(get_db)):
+async def delete_product(product_id: UUID, db: Session = Depends(get_write_db)):
     """Eliminar un producto"""
     # Verificar si el producto existe
     db_product = product_crud.get_product(db, product_id)
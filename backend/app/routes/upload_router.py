@@ -0,0 +1,46 @@
+# app/routes/upload_router.py
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+import asyncio
+
+from app.config import settings
+from app.schemas.upload import UploadRequest, UploadTicket, UploadConfirmation
+from app.utils.file_handlers import create_upload_ticket, confirm_upload, check_local_upload, spool_body
+
+router = APIRouter(tags=["uploads"])
+
+@router.post("/uploads", response_model=UploadTicket, status_code=201)
+async def create_upload(upload: UploadRequest):
+    """
+    Obtener una URL para subir una imagen directamente al almacenamiento.
+    Tras subirla hay que confirmarla (o enviarla como foto_key de un producto).
+    """
+    return await asyncio.to_thread(create_upload_ticket, upload.filename, upload.content_type)
+
+@router.put("/uploads/{key}", status_code=200)
+async def put_upload(
+    key: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...)
+):
+    """Destino de las URLs de subida firmadas del almacenamiento local"""
+    storage = check_local_upload(key, expires, signature)
+    
+    body = spool_body(settings.MAX_IMAGE_SIZE)
+    try:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.MAX_IMAGE_SIZE:
+                raise HTTPException(status_code=413, detail="La imagen supera el tamaño máximo permitido")
+            body.write(chunk)
+        body.seek(0)
+        await asyncio.to_thread(storage.save, key, body)
+    finally:
+        body.close()
+    return Response(status_code=200)
+
+@router.post("/uploads/{key}/confirm", response_model=UploadConfirmation)
+async def confirm(key: str):
+    """Confirmar una subida directa: valida la imagen y genera la miniatura en segundo plano"""
+    return await asyncio.to_thread(confirm_upload, key)
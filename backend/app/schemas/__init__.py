@@ -1,3 +1,4 @@
 # app/schemas/__init__.py
 from app.schemas.product import ProductBase, ProductCreate, ProductUpdate, ProductInDB, ProductResponse, ProductAvailability
-from app.schemas.ad_sheet import AdSheetBase, AdSheetCreate, AdSheetUpdate, AdSheetInDB, AdSheetResponse
\ No newline at end of file
+from app.schemas.ad_sheet import AdSheetBase, AdSheetCreate, AdSheetUpdate, AdSheetInDB, AdSheetResponse
+from app.schemas.upload import UploadRequest, UploadTicket, UploadConfirmation
@@ -29,4 +29,26 @@ class AdSheetInDB(AdSheetBase):
         orm_mode = True
 
 class AdSheetResponse(AdSheetInDB):
-    pass
\ No newline at end of file
+    pass
+
+# Campos que se pueden pedir con ?fields= y los de la vista resumida
+AD_SHEET_FIELDS = ["id", "title", "platform", "template", "content", "meta_info", "created_at"]
+AD_SHEET_SUMMARY_FIELDS = ["id", "title", "platform", "template", "created_at"]
+
+class AdSheetPartial(BaseModel):
+    """Ficha con solo los campos solicitados; los no pedidos se omiten al serializar"""
+    id: Optional[UUID] = None
+    title: Optional[str] = None
+    platform: Optional[str] = None
+    template: Optional[str] = None
+    content: Optional[str] = None
+    meta_info: Optional[Dict[str, Any]] = None
+    created_at: Optional[datetime] = None
+
+class AdSheetRender(BaseModel):
+    """Contenido de una ficha convertido a un formato (?format=)"""
+    id: UUID
+    platform: str
+    format: str
+    content: str
+    characters: int
\ No newline at end of file
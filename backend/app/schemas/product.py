@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
-from typing import Dict, Optional, Union
+from pydantic import BaseModel, Field, computed_field
+from typing import Dict, Optional, Union, List
 from uuid import UUID
 from decimal import Decimal
+from app.utils.file_handlers import file_url, thumbnail_url
 
 class ProductBase(BaseModel):
     nombre: str
@@ -25,12 +26,55 @@ class ProductUpdate(BaseModel):
 class ProductInDB(ProductBase):
     id: UUID
     foto: Optional[str] = None
+    thumbnail: Optional[str] = Field(None, exclude=True)  # Solo para thumbnail_url
     
     class Config:
         orm_mode = True
 
 class ProductResponse(ProductInDB):
-    pass
+    @computed_field
+    @property
+    def foto_url(self) -> Optional[str]:
+        """URL pública de la foto en el almacenamiento configurado"""
+        return file_url(self.foto)
+    
+    @computed_field
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        """URL de la miniatura; None hasta que se genera (o si la foto es anterior a las miniaturas)"""
+        return thumbnail_url(self.thumbnail)
 
 class ProductAvailability(BaseModel):
-    disponible: bool
\ No newline at end of file
+    disponible: bool
+
+# Campos que se pueden pedir con ?fields= y los de la vista resumida
+PRODUCT_FIELDS = [
+    "id", "nombre", "precio", "color", "talla", "caracteristicas", "foto", "foto_url", "thumbnail_url", "disponible"
+]
+PRODUCT_SUMMARY_FIELDS = ["id", "nombre", "precio", "foto", "foto_url", "thumbnail_url", "disponible"]
+
+# Campos calculados a partir de una columna (no se leen de la base de datos)
+PRODUCT_COMPUTED_FIELDS = {"foto_url": "foto", "thumbnail_url": "thumbnail"}
+
+class ProductPartial(BaseModel):
+    """Producto con solo los campos solicitados; los no pedidos se omiten al serializar"""
+    id: Optional[UUID] = None
+    nombre: Optional[str] = None
+    precio: Optional[Decimal] = None
+    color: Optional[str] = None
+    talla: Optional[str] = None
+    caracteristicas: Optional[Dict] = None
+    foto: Optional[str] = None
+    foto_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    disponible: Optional[bool] = None
+    
+    @classmethod
+    def from_row(cls, row: Dict, fields: List[str]) -> "ProductPartial":
+        """Construye el producto con los campos pedidos a partir de las columnas leídas"""
+        values = {field: row[field] for field in fields if field in row}
+        if "foto_url" in fields:
+            values["foto_url"] = file_url(row["foto"])
+        if "thumbnail_url" in fields:
+            values["thumbnail_url"] = thumbnail_url(row["thumbnail"])
+        return cls(**values)
\ No newline at end of file
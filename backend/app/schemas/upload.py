@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Dict, Optional
+
+class UploadRequest(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+
+class UploadTicket(BaseModel):
+    """URL para subir la imagen directamente al almacenamiento"""
+    key: str
+    method: str
+    upload_url: str
+    headers: Dict[str, str]
+    expires_in: int
+    max_size: int
+
+class UploadConfirmation(BaseModel):
+    key: str
+    size: int
+    url: str
+    thumbnail_url: str
@@ -0,0 +1,328 @@
+# app/utils/ad_renderers.py
+"""
+Representaciones de las fichas listas para cada plataforma.
+
+El contenido de una ficha se guarda en markdown; al generarla o regenerarla se
+convierte una sola vez a:
+
+- "whatsapp": texto con el formato de WhatsApp (*negrita*, _cursiva_, ~tachado~)
+- "html": HTML seguro (todo el texto se escapa y solo se emiten etiquetas propias)
+- "text": texto plano sin marcas
+
+Cada representación se guarda con su número de caracteres en AdSheet.renders,
+así las lecturas con ?format= no vuelven a convertir el markdown. Las fichas
+sin representaciones guardadas (o de otra versión) se convierten en la primera
+lectura y se guardan en el primario para las siguientes.
+
+Las marcas de énfasis solo cuentan si no van pegadas a letras o números
+(`2*3*4` se queda igual) y las URL de los enlaces admiten paréntesis
+equilibrados.
+"""
+import html
+import re
+from typing import Any, Dict, List, Optional
+
+# Sube al cambiar las conversiones: las fichas con otra versión se reconvierten en su primera lectura
+RENDER_VERSION = 2
+
+RENDER_FORMATS = ("whatsapp", "html", "text")
+
+# Esquemas permitidos en enlaces e imágenes del HTML
+_SAFE_URL = re.compile(r"^(https?://|mailto:)", re.IGNORECASE)
+
+# URL de enlaces e imágenes: sin espacios, con paréntesis equilibrados de un nivel
+_URL = r"(?:[^()\s]|\([^()\s]*\))+"
+
+_INLINE = re.compile(
+    r"`(?P<code>[^`]+)`"
+    r"|!\[(?P<alt>[^\]]*)\]\((?P<src>" + _URL + r")\)"
+    r"|\[(?P<label>[^\]]+)\]\((?P<href>" + _URL + r")\)"
+    r"|(?<![\w*])\*\*(?=\S)(?P<strong>.+?)(?<=\S)\*\*(?![\w*])"
+    r"|(?<![\w_])__(?=\S)(?P<strong_u>.+?)(?<=\S)__(?![\w_])"
+    r"|(?<![\w~])~~(?=\S)(?P<strike>.+?)(?<=\S)~~(?![\w~])"
+    r"|(?<![\w*])\*(?=[^\s*])(?P<em>.+?)(?<=[^\s*])\*(?![\w*])"
+    r"|(?<![\w_])_(?=[^\s_])(?P<em_u>.+?)(?<=[^\s_])_(?![\w_])"
+)
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*(\d+)[.)]\s+(.*)$")
+_QUOTE = re.compile(r"^\s*>\s?(.*)$")
+_FENCE = re.compile(r"^\s*```")
+
+
+class _Inline:
+    """Conversión de los elementos en línea; cada formato redefine lo que necesita"""
+
+    def __init__(self, emphasis_is_strong: bool = False):
+        # En las plantillas de WhatsApp "*texto*" significa negrita, no cursiva
+        self.emphasis_is_strong = emphasis_is_strong
+
+    def render(self, text: str) -> str:
+        parts: List[str] = []
+        position = 0
+        for match in _INLINE.finditer(text):
+            parts.append(self.text(text[position:match.start()]))
+            parts.append(self._element(match))
+            position = match.end()
+        parts.append(self.text(text[position:]))
+        return "".join(parts)
+
+    def _element(self, match: re.Match) -> str:
+        groups = match.groupdict()
+        if groups["code"] is not None:
+            return self.code(groups["code"])
+        if groups["src"] is not None:
+            return self.image(groups["alt"], groups["src"])
+        if groups["href"] is not None:
+            return self.link(self.render(groups["label"]), groups["href"])
+        strong = groups["strong"] or groups["strong_u"]
+        if strong is not None:
+            return self.render_strong(strong)
+        if groups["strike"] is not None:
+            return self.strike(self.render(groups["strike"]))
+        if groups["em"] is not None and self.emphasis_is_strong:
+            return self.render_strong(groups["em"])
+        return self.em(self.render(groups["em"] or groups["em_u"]))
+
+    def render_strong(self, text: str) -> str:
+        """Convierte el markdown de `text` y lo marca como negrita"""
+        return self.strong(self.render(text))
+
+    def text(self, text: str) -> str:
+        return text
+
+    def code(self, text: str) -> str:
+        return text
+
+    def image(self, alt: str, url: str) -> str:
+        return f"{alt}: {url}" if alt else url
+
+    def link(self, label: str, url: str) -> str:
+        return label if label == url else f"{label} ({url})"
+
+    def strong(self, text: str) -> str:
+        return text
+
+    def strike(self, text: str) -> str:
+        return text
+
+    def em(self, text: str) -> str:
+        return text
+
+
+class _WhatsAppInline(_Inline):
+    def __init__(self, emphasis_is_strong: bool = False):
+        super().__init__(emphasis_is_strong)
+        self._strong_depth = 0
+
+    def render_strong(self, text: str) -> str:
+        # WhatsApp no anida negritas: dentro de una solo se quitan las marcas
+        self._strong_depth += 1
+        try:
+            inner = self.render(text)
+        finally:
+            self._strong_depth -= 1
+        return inner if self._strong_depth else self.strong(inner)
+
+    def code(self, text: str) -> str:
+        return f"```{text}```"
+
+    def strong(self, text: str) -> str:
+        return f"*{text}*"
+
+    def strike(self, text: str) -> str:
+        return f"~{text}~"
+
+    def em(self, text: str) -> str:
+        return f"_{text}_"
+
+
+class _HtmlInline(_Inline):
+    def text(self, text: str) -> str:
+        return html.escape(text)
+
+    def code(self, text: str) -> str:
+        return f"<code>{html.escape(text)}</code>"
+
+    def image(self, alt: str, url: str) -> str:
+        if not _SAFE_URL.match(url):
+            return html.escape(alt)
+        return f'<img src="{html.escape(url)}" alt="{html.escape(alt)}">'
+
+    def link(self, label: str, url: str) -> str:
+        # `label` ya viene convertido (y escapado)
+        if not _SAFE_URL.match(url):
+            return label
+        return f'<a href="{html.escape(url)}" rel="nofollow noopener noreferrer">{label}</a>'
+
+    def strong(self, text: str) -> str:
+        return f"<strong>{text}</strong>"
+
+    def strike(self, text: str) -> str:
+        return f"<del>{text}</del>"
+
+    def em(self, text: str) -> str:
+        return f"<em>{text}</em>"
+
+
+def _join_lines(lines: List[str]) -> str:
+    """Une las líneas sin dejar más de una línea en blanco seguida"""
+    result: List[str] = []
+    for line in lines:
+        line = line.rstrip()
+        if not line and (not result or not result[-1]):
+            continue
+        result.append(line)
+    while result and not result[-1]:
+        result.pop()
+    return "\n".join(result)
+
+
+def _render_lines(markdown: str, inline: _Inline, whatsapp: bool) -> str:
+    """Texto de WhatsApp o texto plano, línea a línea"""
+    lines: List[str] = []
+    in_code = False
+    for line in markdown.strip().splitlines():
+        if _FENCE.match(line):
+            in_code = not in_code
+            if whatsapp:
+                lines.append("```")
+            continue
+        if in_code:
+            lines.append(line)
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            lines.append(inline.render_strong(heading.group(2)) if whatsapp else inline.render(heading.group(2)))
+        elif _RULE.match(line):
+            lines.append("")
+        elif _BULLET.match(line):
+            lines.append("• " + inline.render(_BULLET.match(line).group(1)))
+        elif _NUMBERED.match(line):
+            number, text = _NUMBERED.match(line).groups()
+            lines.append(f"{number}. {inline.render(text)}")
+        elif _QUOTE.match(line):
+            text = inline.render(_QUOTE.match(line).group(1))
+            lines.append(f"> {text}" if whatsapp else text)
+        else:
+            lines.append(inline.render(line.strip()))
+    return _join_lines(lines)
+
+
+def _render_html(markdown: str, inline: _HtmlInline) -> str:
+    blocks: List[str] = []
+    paragraph: List[str] = []
+    items: List[str] = []
+    list_tag: Optional[str] = None
+    quote: List[str] = []
+    code: Optional[List[str]] = None
+
+    def flush() -> None:
+        nonlocal list_tag
+        if paragraph:
+            blocks.append("<p>" + "<br>\n".join(paragraph) + "</p>")
+            paragraph.clear()
+        if items:
+            blocks.append(f"<{list_tag}>\n" + "\n".join(f"<li>{item}</li>" for item in items) + f"\n</{list_tag}>")
+            items.clear()
+            list_tag = None
+        if quote:
+            blocks.append("<blockquote><p>" + "<br>\n".join(quote) + "</p></blockquote>")
+            quote.clear()
+
+    for line in markdown.strip().splitlines():
+        if _FENCE.match(line):
+            if code is None:
+                flush()
+                code = []
+            else:
+                blocks.append("<pre><code>" + html.escape("\n".join(code)) + "</code></pre>")
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+
+        heading = _HEADING.match(line)
+        bullet = _BULLET.match(line)
+        numbered = _NUMBERED.match(line)
+        quoted = _QUOTE.match(line)
+        if not line.strip():
+            flush()
+        elif heading:
+            flush()
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{inline.render(heading.group(2))}</h{level}>")
+        elif _RULE.match(line):
+            flush()
+            blocks.append("<hr>")
+        elif bullet or numbered:
+            tag = "ul" if bullet else "ol"
+            if list_tag != tag:
+                flush()
+                list_tag = tag
+            items.append(inline.render(bullet.group(1) if bullet else numbered.group(2)))
+        elif quoted:
+            if not quote:
+                flush()
+            quote.append(inline.render(quoted.group(1)))
+        else:
+            if items or quote:
+                flush()
+            paragraph.append(inline.render(line.strip()))
+
+    if code is not None:
+        blocks.append("<pre><code>" + html.escape("\n".join(code)) + "</code></pre>")
+    flush()
+    return "\n".join(blocks)
+
+
+def render(markdown: str, fmt: str, platform: Optional[str] = None) -> str:
+    """Convierte el markdown de una ficha al formato indicado"""
+    emphasis_is_strong = platform == "whatsapp"
+    if fmt == "whatsapp":
+        return _render_lines(markdown, _WhatsAppInline(emphasis_is_strong), whatsapp=True)
+    if fmt == "html":
+        return _render_html(markdown, _HtmlInline(emphasis_is_strong))
+    if fmt == "text":
+        return _render_lines(markdown, _Inline(emphasis_is_strong), whatsapp=False)
+    raise ValueError(f"Formato no válido. Opciones disponibles: {['markdown', *RENDER_FORMATS]}")
+
+
+def render_ad_sheet(content: str, platform: str) -> Dict[str, Any]:
+    """Todas las representaciones de una ficha, tal como se guardan en AdSheet.renders"""
+    renders: Dict[str, Any] = {"version": RENDER_VERSION}
+    for fmt in RENDER_FORMATS:
+        rendered = render(content, fmt, platform)
+        renders[fmt] = {"content": rendered, "characters": len(rendered)}
+    return renders
+
+
+def refresh_renders(ad_sheet) -> Optional[Dict[str, Any]]:
+    """
+    Todas las representaciones recalculadas si las guardadas faltan o son de
+    otra versión del conversor; None si están al día
+    """
+    if (ad_sheet.renders or {}).get("version") == RENDER_VERSION:
+        return None
+    return render_ad_sheet(ad_sheet.content, ad_sheet.platform)
+
+
+def get_render(ad_sheet, fmt: str, renders: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Representación de la ficha en `fmt`, de `renders` (recién calculadas con
+    refresh_renders) o de las guardadas; si faltan o son de otra versión del
+    conversor se calcula en el momento. "markdown" es el contenido tal cual.
+    """
+    if fmt == "markdown":
+        return {"content": ad_sheet.content, "characters": len(ad_sheet.content)}
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Formato no válido. Opciones disponibles: {['markdown', *RENDER_FORMATS]}")
+    renders = renders or ad_sheet.renders or {}
+    if renders.get("version") == RENDER_VERSION and fmt in renders:
+        return renders[fmt]
+    rendered = render(ad_sheet.content, fmt, ad_sheet.platform)
+    return {"content": rendered, "characters": len(rendered)}
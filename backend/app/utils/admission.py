@@ -0,0 +1,191 @@
+# app/utils/admission.py
+"""
+Control de admisión por grupo de rutas.
+
+Cada grupo (lecturas, escrituras, subidas de imágenes y generación de fichas)
+tiene un límite de peticiones simultáneas por worker y una cola FIFO acotada
+con espera máxima. Si la cola está llena o la espera vence, la petición se
+rechaza enseguida con 503 y Retry-After, de modo que las escrituras pesadas
+retroceden sin degradar la latencia de las lecturas de productos.
+
+Los límites se configuran en ADMISSION_LIMITS con el formato
+"grupo=concurrencia/cola/espera_máxima,..." (p. ej. "generation=2/8/30").
+"""
+import asyncio
+import json
+import math
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.config import settings
+from app.utils.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT
+
+# Grupos en orden de prioridad de coincidencia: (grupo, métodos, ruta, Content-Type
+# exigido). Solo cuentan como subidas las peticiones que llevan la imagen: el
+# PUT firmado del almacenamiento local y los productos enviados como multipart;
+# los tickets, las confirmaciones y los cambios sin foto van con las escrituras.
+ROUTE_GROUPS = [
+    ("generation", {"POST", "PUT"}, re.compile(r"^/api/ad-sheets(/[^/]+)?$"), None),
+    ("uploads", {"PUT"}, re.compile(r"^/api/uploads/[^/]+$"), None),
+    ("uploads", {"POST", "PUT"}, re.compile(r"^/api/products(/[^/]+)?$"), "multipart/form-data"),
+    ("writes", {"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"^/api/"), None),
+    ("reads", {"GET"}, re.compile(r"^/api/"), None),
+]
+
+# Conexiones de larga duración que no deben ocupar plazas de admisión
+EXEMPT_PATHS = {"/api/products/changes"}
+
+# Peso de la última muestra en la media del tiempo de servicio
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """La petición no se puede admitir; `reason` es "queue_full" o "deadline" """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteGroupLimiter:
+    """Semáforo con cola FIFO acotada y espera máxima para un grupo de rutas"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._service_time = 0.0
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que se libere hueco, según el tiempo medio de servicio"""
+        pending = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_time * pending / max(self.limit, 1)))
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self._admit()
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.set(len(self._waiters), group=self.name)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # El hueco llegó justo al vencer la espera: se aprovecha
+                return
+            waiter.cancel()
+            raise Overloaded("deadline", self.retry_after())
+        except asyncio.CancelledError:
+            # Cliente desconectado: ceder el hueco si ya se había concedido
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            ADMISSION_QUEUED.set(len(self._waiters), group=self.name)
+            ADMISSION_WAIT.observe(time.perf_counter() - start, group=self.name)
+
+    def _admit(self) -> None:
+        self.active += 1
+        ADMISSION_IN_FLIGHT.set(self.active, group=self.name)
+
+    def release(self, elapsed: float) -> None:
+        if elapsed:
+            self._service_time += SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+        self.active -= 1
+        # Pasar el hueco al primer waiter que siga esperando
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+                break
+        ADMISSION_IN_FLIGHT.set(self.active, group=self.name)
+        ADMISSION_QUEUED.set(len(self._waiters), group=self.name)
+
+
+def parse_limits(spec: str) -> Dict[str, RouteGroupLimiter]:
+    """Interpreta ADMISSION_LIMITS ("grupo=concurrencia/cola/espera,...")"""
+    groups = sorted({group for group, _, _, _ in ROUTE_GROUPS})
+    limiters = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        try:
+            name, values = item.split("=", 1)
+            limit, max_queue, max_wait = values.split("/")
+            limiters[name.strip()] = RouteGroupLimiter(name.strip(), int(limit), int(max_queue), float(max_wait))
+        except ValueError:
+            raise ValueError(f"ADMISSION_LIMITS no válido en '{item}': se espera grupo=concurrencia/cola/espera")
+    unknown = sorted(set(limiters) - set(groups))
+    if unknown:
+        raise ValueError(f"ADMISSION_LIMITS con grupos desconocidos: {unknown}. Opciones disponibles: {groups}")
+    return limiters
+
+
+def route_group(method: str, path: str, content_type: str = "") -> Optional[str]:
+    if path in EXEMPT_PATHS:
+        return None
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    for name, methods, pattern, required_type in ROUTE_GROUPS:
+        if method in methods and pattern.match(path) and required_type in (None, media_type):
+            return name
+    return None
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI que aplica los límites de ADMISSION_LIMITS a cada grupo de rutas"""
+
+    def __init__(self, app):
+        self.app = app
+        self.limiters = parse_limits(settings.ADMISSION_LIMITS) if settings.ADMISSION_ENABLED else {}
+
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            content_type = dict(scope["headers"]).get(b"content-type", b"").decode("latin-1")
+            limiter = self.limiters.get(route_group(scope["method"], scope["path"], content_type))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except Overloaded as e:
+            ADMISSION_REJECTED.inc(group=limiter.name, reason=e.reason)
+            await self._reject(send, e.retry_after)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _reject(send, retry_after: int) -> None:
+        body = json.dumps({"detail": "Servidor sobrecargado, inténtalo de nuevo más tarde"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
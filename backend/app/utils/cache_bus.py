@@ -0,0 +1,172 @@
+# app/utils/cache_bus.py
+"""
+Bus de invalidación de las cachés en proceso entre workers.
+
+Las escrituras del CRUD marcan etiquetas ("products", "product:<id>",
+"ad_sheets", "ad_sheet:<id>") en la sesión. En PostgreSQL se emite además un
+NOTIFY dentro de la transacción, que solo se entrega si hace commit; cada
+worker mantiene un listener (un hilo con conexión dedicada) que aplica esas
+etiquetas a sus cachés locales. El worker que escribe las aplica él mismo al
+confirmar la transacción, sin esperar al NOTIFY. Con otras bases de datos el
+bus es solo local y las demás cachés dependen de su TTL.
+
+Si el listener pierde la conexión, al recuperarla se vacían las cachés por
+completo, porque las notificaciones de ese intervalo se han perdido.
+"""
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, List, Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import get_engine
+from app.utils.metrics import CACHE_BUS_MESSAGES, CACHE_BUS_LAG
+
+logger = logging.getLogger(__name__)
+
+# Etiquetas de las colecciones
+PRODUCTS = "products"
+AD_SHEETS = "ad_sheets"
+
+# Identificador de este worker, para ignorar sus propias notificaciones
+WORKER_ID = uuid.uuid4().hex
+
+# Clave de la sesión con las etiquetas pendientes de la transacción en curso
+_PENDING_KEY = "cache_bus_tags"
+
+# Handler de evicción: recibe las etiquetas a invalidar, o None para vaciar la caché
+EvictionHandler = Callable[[Optional[Set[str]]], None]
+
+
+def product_tag(product_id) -> str:
+    return f"product:{product_id}"
+
+
+def ad_sheet_tag(ad_sheet_id) -> str:
+    return f"ad_sheet:{ad_sheet_id}"
+
+
+class CacheBus:
+    """Reparte las invalidaciones entre los handlers registrados de este worker"""
+
+    def __init__(self):
+        self._handlers: List[EvictionHandler] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def add_handler(self, handler: EvictionHandler) -> None:
+        self._handlers.append(handler)
+
+    def apply(self, tags: Optional[Set[str]]) -> None:
+        for handler in self._handlers:
+            try:
+                handler(tags)
+            except Exception:
+                logger.exception("Error aplicando una invalidación de caché")
+
+    def start(self) -> None:
+        """Arrancar el listener (solo con PostgreSQL y CACHE_BUS_BACKEND=postgres)"""
+        if settings.CACHE_BUS_BACKEND != "postgres" or (self._thread is not None and self._thread.is_alive()):
+            return
+        if get_engine().dialect.name != "postgresql":
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-bus", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.CACHE_BUS_POLL_SECONDS + 1)
+            self._thread = None
+
+    def _run(self) -> None:
+        engine = get_engine()
+        connected_before = False
+        while not self._stop.is_set():
+            try:
+                self._listen(engine, resync=connected_before)
+            except Exception:
+                logger.exception("Error en el listener del bus de caché; reintentando")
+                self._stop.wait(1.0)
+            connected_before = True
+
+    def _listen(self, engine, resync: bool) -> None:
+        """Esperar NOTIFY con una conexión dedicada (psycopg2 o psycopg 3)"""
+        raw = engine.raw_connection()
+        # La conexión queda en modo autocommit, así que no se devuelve al pool
+        raw.detach()
+        connection = raw.driver_connection
+        timeout = settings.CACHE_BUS_POLL_SECONDS
+        try:
+            if hasattr(connection, "poll"):
+                # psycopg2
+                connection.set_isolation_level(0)
+                connection.cursor().execute(f'LISTEN "{settings.CACHE_BUS_CHANNEL}"')
+                if resync:
+                    self.apply(None)
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], timeout)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            self._receive(connection.notifies.pop(0).payload)
+            else:
+                # psycopg 3
+                connection.autocommit = True
+                connection.execute(f'LISTEN "{settings.CACHE_BUS_CHANNEL}"')
+                if resync:
+                    self.apply(None)
+                while not self._stop.is_set():
+                    for notify in connection.notifies(timeout=timeout):
+                        self._receive(notify.payload)
+        finally:
+            raw.close()
+
+    def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get("origin") == WORKER_ID:
+            # Ya aplicada al confirmar la transacción
+            return
+        CACHE_BUS_MESSAGES.inc(direction="received")
+        CACHE_BUS_LAG.observe(max(0.0, time.time() - message.get("at", time.time())))
+        self.apply(set(message.get("tags", [])))
+
+
+cache_bus = CacheBus()
+
+
+def invalidate(db: Session, tags: Iterable[str]) -> None:
+    """
+    Invalida las etiquetas en todos los workers cuando la transacción de `db`
+    haga commit; si se deshace, no se invalida nada
+    """
+    tags = set(tags)
+    db.info.setdefault(_PENDING_KEY, set()).update(tags)
+    if settings.CACHE_BUS_BACKEND == "postgres" and db.get_bind().dialect.name == "postgresql":
+        payload = json.dumps({"tags": sorted(tags), "origin": WORKER_ID, "at": time.time()})
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": settings.CACHE_BUS_CHANNEL, "payload": payload}
+        )
+        CACHE_BUS_MESSAGES.inc(direction="published")
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session) -> None:
+    tags = session.info.pop(_PENDING_KEY, None)
+    if tags:
+        cache_bus.apply(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,217 @@
+# app/utils/change_feed.py
+"""
+Feed de cambios de productos.
+
+Cada worker mantiene un único listener (un hilo con una conexión dedicada)
+que espera los NOTIFY emitidos por las escrituras en PostgreSQL, lee los
+eventos nuevos de la tabla product_events por número de secuencia y los
+reparte entre todos los suscriptores SSE/WebSocket del proceso. En otras
+bases de datos el listener sondea la tabla periódicamente.
+"""
+import asyncio
+import datetime
+import logging
+import select
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Set
+
+from app.config import settings
+from app.db import get_engine, SessionLocal
+from app.crud import product_event as product_event_crud
+from app.utils.metrics import CHANGE_FEED_SUBSCRIBERS, CHANGE_FEED_EVENTS, CHANGE_FEED_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Marca enviada a un suscriptor cuando debe resincronizarse (cola llena o eventos ya purgados)
+RESET = {"type": "reset"}
+
+# Cada cuánto se purgan los eventos antiguos (segundos)
+PRUNE_INTERVAL = 600
+
+
+class ChangeFeed:
+    """Listener por worker que reparte los eventos de productos a los suscriptores"""
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_lock = asyncio.Lock()
+        self._last_seq = 0
+        self._last_prune = 0.0
+
+    async def subscribe(self) -> asyncio.Queue:
+        """Registrar un suscriptor; arranca el listener con el primero"""
+        await self._ensure_started()
+        queue = asyncio.Queue(maxsize=settings.CHANGE_FEED_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        CHANGE_FEED_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        if queue in self._subscribers:
+            self._subscribers.discard(queue)
+            CHANGE_FEED_SUBSCRIBERS.dec()
+
+    def stop(self) -> None:
+        """Detener el listener (al apagar la aplicación)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.CHANGE_FEED_POLL_SECONDS + 1)
+            self._thread = None
+
+    async def _ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        async with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.get_running_loop()
+            self._stop.clear()
+
+            # Empezar desde el último evento existente: el historial se sirve con `since`
+            self._last_seq = await asyncio.to_thread(self._latest_seq)
+
+            self._thread = threading.Thread(target=self._run, name="product-change-feed", daemon=True)
+            self._thread.start()
+
+    @staticmethod
+    def _latest_seq() -> int:
+        with SessionLocal(bind=get_engine()) as db:
+            return product_event_crud.get_sequence_bounds(db)["latest"] or 0
+
+    def _run(self) -> None:
+        engine = get_engine()
+        while not self._stop.is_set():
+            try:
+                if engine.dialect.name == "postgresql":
+                    self._listen(engine)
+                else:
+                    self._fetch_new()
+                    self._stop.wait(settings.CHANGE_FEED_POLL_SECONDS)
+            except Exception:
+                logger.exception("Error en el listener del feed de cambios; reintentando")
+                self._stop.wait(1.0)
+
+    def _listen(self, engine) -> None:
+        """Esperar NOTIFY con una conexión dedicada (psycopg2 o psycopg 3)"""
+        raw = engine.raw_connection()
+        # La conexión queda en modo autocommit, así que no se devuelve al pool
+        raw.detach()
+        connection = raw.driver_connection
+        timeout = settings.CHANGE_FEED_POLL_SECONDS
+        try:
+            if hasattr(connection, "poll"):
+                # psycopg2
+                connection.set_isolation_level(0)
+                connection.cursor().execute(f'LISTEN "{settings.CHANGE_FEED_CHANNEL}"')
+                # Recuperar lo escrito mientras no se escuchaba
+                self._fetch_new()
+                while not self._stop.is_set():
+                    select.select([connection], [], [], timeout)
+                    connection.poll()
+                    connection.notifies.clear()
+                    self._fetch_new()
+            else:
+                # psycopg 3
+                connection.autocommit = True
+                connection.execute(f'LISTEN "{settings.CHANGE_FEED_CHANNEL}"')
+                self._fetch_new()
+                while not self._stop.is_set():
+                    for _ in connection.notifies(timeout=timeout, stop_after=1):
+                        pass
+                    self._fetch_new()
+        finally:
+            raw.close()
+
+    def _fetch_new(self) -> None:
+        """Leer los eventos posteriores al último repartido y enviarlos al event loop"""
+        with SessionLocal(bind=get_engine()) as db:
+            while True:
+                events = product_event_crud.get_product_events(db, self._last_seq)
+                if not events:
+                    break
+                payload = [product_event_crud.serialize_event(event) for event in events]
+                self._last_seq = payload[-1]["seq"]
+                CHANGE_FEED_EVENTS.inc(len(payload))
+                self._loop.call_soon_threadsafe(self._fan_out, payload)
+
+            if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.CHANGE_FEED_RETENTION_HOURS)
+                product_event_crud.prune_product_events(db, cutoff)
+
+    def _fan_out(self, events: List[Dict[str, Any]]) -> None:
+        # Se ejecuta en el event loop
+        for queue in list(self._subscribers):
+            try:
+                for event in events:
+                    queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Suscriptor demasiado lento: vaciar su cola y pedirle que se resincronice
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESET)
+                self.unsubscribe(queue)
+                CHANGE_FEED_DROPPED.inc()
+
+
+change_feed = ChangeFeed()
+
+
+def _load_backlog(since: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Eventos posteriores a `since`, o None si parte de ellos ya se purgó
+    y el cliente debe resincronizarse
+    """
+    with SessionLocal(bind=get_engine()) as db:
+        oldest = product_event_crud.get_sequence_bounds(db)["oldest"]
+        if oldest is not None and oldest > since + 1:
+            return None
+
+        backlog = []
+        while True:
+            events = product_event_crud.get_product_events(db, since)
+            if not events:
+                return backlog
+            backlog.extend(product_event_crud.serialize_event(event) for event in events)
+            since = backlog[-1]["seq"]
+
+
+async def iter_changes(since: Optional[int] = None) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """
+    Itera los cambios de productos a partir de `since` (exclusivo) y después
+    en vivo. Produce None cuando pasa el intervalo de heartbeat sin eventos y
+    RESET (terminando) cuando el cliente debe recargar el catálogo completo.
+    """
+    # Suscribirse antes de leer el historial para no perder eventos intermedios
+    queue = await change_feed.subscribe()
+    try:
+        last_seq = since
+        if since is not None:
+            backlog = await asyncio.to_thread(_load_backlog, since)
+            if backlog is None:
+                yield RESET
+                return
+            for event in backlog:
+                last_seq = event["seq"]
+                yield event
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+
+            if event is RESET:
+                yield RESET
+                return
+            if last_seq is not None and event["seq"] <= last_seq:
+                continue
+            last_seq = event["seq"]
+            yield event
+    finally:
+        change_feed.unsubscribe(queue)
@@ -0,0 +1,236 @@
+# app/utils/compression.py
+"""
+Compresión de respuestas negociada con Accept-Encoding (zstd, br o gzip).
+
+gzip está siempre disponible; br y zstd solo si están instalados los paquetes
+brotli y zstandard. No se comprimen las respuestas menores que
+COMPRESSION_MIN_SIZE, las ya codificadas, las de tipos binarios ni las que se
+envían en streaming (SSE, archivos). Las GET del catálogo pasan además por la
+caché de respuestas, que guarda las variantes comprimidas junto al cuerpo.
+"""
+import asyncio
+import gzip
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.db import REPLICA_READ_SCOPE_KEY
+from app.utils.metrics import (
+    RESPONSE_COMPRESSION, COMPRESSION_INPUT_BYTES, COMPRESSION_OUTPUT_BYTES, RESPONSE_CACHE,
+)
+from app.utils.response_cache import CachedResponse, response_cache, cache_key, cache_tags
+
+# Niveles rápidos para comprimir en cada petición y altos para las variantes guardadas en caché
+FAST_LEVELS = {"gzip": 6, "br": 4, "zstd": 3}
+CACHED_LEVELS = {"gzip": 9, "br": 9, "zstd": 12}
+
+# Por encima de este tamaño se comprime en el threadpool para no bloquear el event loop
+THREAD_THRESHOLD = 64 * 1024
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml", "image/svg+xml")
+
+# Cabeceras que se recalculan al enviar (Vary se combina con la original)
+_SKIPPED_HEADERS = {b"content-length", b"content-encoding", b"vary"}
+
+# Cabeceras que no se guardan en la caché; Vary se conserva (p. ej. Vary: Origin de CORS)
+_UNCACHED_HEADERS = {b"content-length", b"content-encoding"}
+
+_codecs: Optional[Dict[str, Callable[[bytes, int], bytes]]] = None
+
+
+def available_encodings() -> Dict[str, Callable[[bytes, int], bytes]]:
+    """Codificaciones soportadas, en el orden de preferencia de COMPRESSION_ENCODINGS"""
+    global _codecs
+    if _codecs is None:
+        codecs = {"gzip": lambda data, level: gzip.compress(data, compresslevel=level, mtime=0)}
+        try:
+            import brotli
+            codecs["br"] = lambda data, level: brotli.compress(data, quality=level)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+            codecs["zstd"] = lambda data, level: zstandard.ZstdCompressor(level=level).compress(data)
+        except ImportError:
+            pass
+        preferred = [name.strip() for name in settings.COMPRESSION_ENCODINGS.split(",") if name.strip()]
+        _codecs = {name: codecs[name] for name in preferred if name in codecs}
+    return _codecs
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Elige la codificación con mayor q aceptada por el cliente (a igualdad, la preferida)"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for name in available_encodings():
+        q = accepted.get(name, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    level = (CACHED_LEVELS if cached else FAST_LEVELS)[encoding]
+    return available_encodings()[encoding](body, level)
+
+
+def is_compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"content-encoding":
+            return False
+        if name == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+def _response_headers(headers: List[Tuple[bytes, bytes]], length: int, encoding: Optional[str]) -> List[Tuple[bytes, bytes]]:
+    """Cabeceras de la respuesta con Content-Length, Content-Encoding y Vary actualizados"""
+    result = [(name, value) for name, value in headers if name.lower() not in _SKIPPED_HEADERS]
+    vary = [value for name, value in headers if name.lower() == b"vary"]
+    if not any(b"accept-encoding" in value.lower() for value in vary):
+        vary.append(b"Accept-Encoding")
+    result.append((b"vary", b", ".join(vary)))
+    result.append((b"content-length", str(length).encode()))
+    if encoding:
+        result.append((b"content-encoding", encoding.encode()))
+    return result
+
+
+async def _encode(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if len(body) > THREAD_THRESHOLD:
+        return await asyncio.to_thread(compress, body, encoding, cached)
+    return compress(body, encoding, cached)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión y caché de respuestas del catálogo"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = negotiate(accept_encoding) if accept_encoding else None
+
+        key = cache_key(scope)
+        if key is not None:
+            await self._cached(scope, receive, send, key, encoding)
+            return
+
+        started = None
+
+        async def compressing_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                # Esperar al cuerpo para decidir si se comprime
+                started = message
+                return
+            if message["type"] != "http.response.body" or started is None:
+                await send(message)
+                return
+
+            start, started = started, None
+            body = message.get("body", b"")
+            headers = list(start.get("headers", []))
+            if message.get("more_body", False) or not is_compressible(headers):
+                # Streaming o tipo no comprimible: se envía tal cual
+                await send(start)
+                await send(message)
+                return
+
+            chosen = encoding if len(body) >= settings.COMPRESSION_MIN_SIZE else None
+            payload = await self._encoded(body, chosen)
+            await send({**start, "headers": _response_headers(headers, len(payload), chosen)})
+            await send({"type": "http.response.body", "body": payload})
+
+        await self.app(scope, receive, compressing_send)
+
+    async def _cached(self, scope, receive, send, key: str, encoding: Optional[str]) -> None:
+        entry = response_cache.get(key)
+        if entry is not None:
+            RESPONSE_CACHE.inc(result="hit")
+            await self._send_entry(send, entry, encoding)
+            return
+
+        RESPONSE_CACHE.inc(result="miss")
+        # Sellar con las versiones de las etiquetas antes de leer
+        versions = response_cache.snapshot(cache_tags(scope["path"]))
+        start = None
+        chunks = []
+
+        async def capture_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture_send)
+        if start is None:
+            return
+
+        headers = list(start.get("headers", []))
+        entry = CachedResponse(
+            start["status"], [(name, value) for name, value in headers if name.lower() not in _UNCACHED_HEADERS],
+            b"".join(chunks),
+        )
+        cacheable = (
+            entry.status == 200
+            and is_compressible(headers)
+            and len(entry.body) <= settings.RESPONSE_CACHE_MAX_BODY
+            and not any(name.lower() == b"set-cookie" for name, _ in headers)
+            # Solo lo leído del primario: la invalidación llega al confirmar en el
+            # primario y una réplica con retraso guardaría el contenido anterior
+            and not scope.get(REPLICA_READ_SCOPE_KEY)
+        )
+        if cacheable:
+            response_cache.put(key, entry, versions)
+        await self._send_entry(send, entry, encoding if is_compressible(headers) else None)
+
+    async def _send_entry(self, send, entry: CachedResponse, encoding: Optional[str]) -> None:
+        """Envía una respuesta guardada, comprimiéndola una sola vez por codificación"""
+        if encoding is None or len(entry.body) < settings.COMPRESSION_MIN_SIZE:
+            payload, encoding = entry.body, None
+        else:
+            payload = entry.encoded.get(encoding)
+            if payload is None:
+                payload = entry.encoded[encoding] = await _encode(entry.body, encoding, cached=True)
+        self._record(len(entry.body), len(payload), encoding)
+        await send({
+            "type": "http.response.start",
+            "status": entry.status,
+            "headers": _response_headers(entry.headers, len(payload), encoding),
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _encoded(self, body: bytes, encoding: Optional[str]) -> bytes:
+        payload = await _encode(body, encoding) if encoding else body
+        self._record(len(body), len(payload), encoding)
+        return payload
+
+    @staticmethod
+    def _record(size: int, compressed: int, encoding: Optional[str]) -> None:
+        label = encoding or "identity"
+        RESPONSE_COMPRESSION.inc(encoding=label)
+        if encoding:
+            COMPRESSION_INPUT_BYTES.inc(size, encoding=label)
+            COMPRESSION_OUTPUT_BYTES.inc(compressed, encoding=label)
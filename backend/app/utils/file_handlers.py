@@ -1,55 +1,449 @@
+import asyncio
+import hashlib
+import hmac
+import io
+import logging
+import mimetypes
 import os
+import re
+import secrets
 import shutil
+import tempfile
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, NamedTuple, Optional
+from urllib.parse import urlencode
 from fastapi import UploadFile, HTTPException
-from PIL import Image
 from app.config import settings
+from app.utils.metrics import (
+    UPLOAD_BYTES, UPLOAD_SIZE, IMAGE_PROCESSING, UPLOAD_TICKETS, UPLOAD_CONFIRMATIONS,
+    THUMBNAILS, THUMBNAIL_PROCESSING,
+)
 
-async def save_upload_file(file: UploadFile) -> str:
+logger = logging.getLogger(__name__)
+
+# Prefijo de las miniaturas dentro del almacenamiento
+THUMBNAIL_PREFIX = "thumbs/"
+
+# Margen antes del fin de la retención en el que ya no se aceptan subidas directas,
+# para que el barrido no borre una foto mientras se asigna a un producto
+ATTACH_MARGIN_SECONDS = 300
+
+# Claves de las imágenes originales: <uuid>.<extensión>
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}\.[a-z0-9]+$")
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    modified: float  # Marca de tiempo Unix
+
+class Storage:
     """
-    Guarda un archivo subido y devuelve el nombre del archivo guardado
+    Interfaz común de los backends de almacenamiento de imágenes.
+    Las claves son rutas relativas con "/" como separador.
     """
-    # Validar que sea una imagen
-    if not is_valid_image(file):
-        raise HTTPException(status_code=400, detail="Formato de archivo no válido. Acepta solo JPG, JPEG, PNG o WEBP")
+    name = ""
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        """Guarda el contenido de `fileobj` y devuelve su tamaño en bytes"""
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        """Tamaño y fecha del objeto, o None si no existe"""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def list_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        """Recorre los objetos sin cargar el listado completo en memoria"""
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int) -> Dict:
+        """URL (y cabeceras obligatorias) para que el cliente suba el objeto directamente"""
+        raise NotImplementedError
+
+class LocalStorage(Storage):
+    """
+    Sistema de archivos local (UPLOAD_DIR), servido por el montaje /uploads.
+    Las subidas directas se hacen con PUT a /api/uploads/{key} firmado con HMAC.
+    """
+    name = "local"
+
+    def __init__(self, root: str, public_url: str, signing_secret: str):
+        self.root = root
+        self.base_url = public_url.rstrip("/")
+        if not signing_secret:
+            logger.warning("STORAGE_SIGNING_SECRET no definido: las URLs de subida solo valen en este worker")
+            signing_secret = secrets.token_hex(32)
+        self._secret = signing_secret.encode()
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Clave de almacenamiento no válida: {key}")
+        return path
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escribir en un temporal y renombrar para no servir archivos a medias
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temporary, "wb") as buffer:
+                shutil.copyfileobj(fileobj, buffer)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return os.path.getsize(path)
+
+    def read(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as buffer:
+            return buffer.read()
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            result = os.stat(self._path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(key, result.st_size, result.st_mtime)
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def list_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        if not os.path.isdir(self.root):
+            return
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+            relative = os.path.relpath(directory, self.root)
+            for filename in filenames:
+                if filename.startswith(".") or filename.endswith(".tmp"):
+                    continue
+                key = filename if relative == "." else f"{relative.replace(os.sep, '/')}/{filename}"
+                if not key.startswith(prefix):
+                    continue
+                try:
+                    result = os.stat(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    continue
+                yield StoredObject(key, result.st_size, result.st_mtime)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def _signature(self, key: str, expires: int) -> str:
+        return hmac.new(self._secret, f"{key}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int) -> Dict:
+        expires = int(time.time()) + expires_in
+        query = urlencode({"expires": expires, "signature": self._signature(key, expires)})
+        return {"url": f"/api/uploads/{key}?{query}", "headers": {"Content-Type": content_type}}
+
+    def verify_signature(self, key: str, expires: int, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(key, expires), signature)
+
+class S3Storage(Storage):
+    """
+    Bucket de S3 o de un servicio compatible (MinIO, o moto en modo servidor
+    para pruebas locales). Necesita el paquete boto3.
+    """
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: str, region: str, access_key_id: str,
+                 secret_access_key: str, public_url: str):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 necesita el paquete boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 necesita S3_BUCKET")
+
+        self.bucket = bucket
+        self._client_error = ClientError
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+        )
+        if public_url:
+            self.base_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.base_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.base_url = f"https://{bucket}.s3.{region}.amazonaws.com"
+
+    def save(self, key: str, fileobj: BinaryIO, content_type: Optional[str] = None) -> int:
+        start = fileobj.tell()
+        size = fileobj.seek(0, os.SEEK_END) - start
+        fileobj.seek(start)
+        extra = {"ContentType": content_type} if content_type else {}
+        self._client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra)
+        return size
+
+    def read(self, key: str) -> bytes:
+        return self._client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            result = self._client.head_object(Bucket=self.bucket, Key=key)
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return StoredObject(key, result["ContentLength"], result["LastModified"].timestamp())
+
+    def delete(self, key: str) -> bool:
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def list_objects(self, prefix: str = "") -> Iterator[StoredObject]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []):
+                yield StoredObject(item["Key"], item["Size"], item["LastModified"].timestamp())
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def presigned_put(self, key: str, content_type: str, expires_in: int) -> Dict:
+        url = self._client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+        return {"url": url, "headers": {"Content-Type": content_type}}
+
+_storage: Optional[Storage] = None
+
+def get_storage() -> Storage:
+    """Devuelve el backend configurado en STORAGE_BACKEND, creándolo en el primer uso"""
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage(
+                settings.S3_BUCKET, settings.S3_ENDPOINT_URL, settings.S3_REGION,
+                settings.S3_ACCESS_KEY_ID, settings.S3_SECRET_ACCESS_KEY, settings.STORAGE_PUBLIC_URL,
+            )
+        elif settings.STORAGE_BACKEND == "local":
+            _storage = LocalStorage(
+                settings.UPLOAD_DIR, settings.STORAGE_PUBLIC_URL or "/uploads", settings.STORAGE_SIGNING_SECRET
+            )
+        else:
+            raise RuntimeError(f"STORAGE_BACKEND no soportado: {settings.STORAGE_BACKEND}")
+    return _storage
 
-    # Generar nombre único
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    
-    # Ruta de destino
-    destination = os.path.join(settings.UPLOAD_DIR, unique_filename)
-    
-    # Crear archivo
-    with open(destination, "wb") as buffer:
-        # Copiar contenido
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Opcionalmente, se podría redimensionar o comprimir la imagen aquí
+def is_upload_key(key: str) -> bool:
+    """Indica si la clave tiene la forma de una imagen original generada por la API"""
+    return bool(key) and _KEY_PATTERN.match(key) is not None
+
+def upload_retention_seconds() -> float:
+    """
+    Antigüedad mínima de una subida sin referenciar para que el barrido la
+    borre: la validez del ticket (la subida puede llegar al final) más
+    UPLOAD_GC_GRACE_SECONDS
+    """
+    return settings.STORAGE_PRESIGN_EXPIRES_SECONDS + settings.UPLOAD_GC_GRACE_SECONDS
+
+def thumbnail_key(key: str) -> str:
+    return f"{THUMBNAIL_PREFIX}{os.path.splitext(key)[0]}.jpg"
+
+def file_url(filename: Optional[str]) -> Optional[str]:
+    return get_storage().public_url(filename) if filename else None
+
+def thumbnail_url(thumbnail: Optional[str]) -> Optional[str]:
+    """URL de la miniatura a partir de su clave (Product.thumbnail)"""
+    return get_storage().public_url(thumbnail) if thumbnail else None
+
+def _validate_image(fileobj: BinaryIO) -> None:
+    # Pillow se importa aquí para no cargarlo en el arranque
+    from PIL import Image
+
+    start = time.perf_counter()
     try:
         # Abrir la imagen para verificar que es válida
-        Image.open(destination)
+        with Image.open(fileobj):
+            pass
     except Exception:
-        # Si la imagen no es válida, eliminar el archivo y lanzar excepción
-        os.remove(destination)
         raise HTTPException(status_code=400, detail="Archivo no es una imagen válida")
-        
+    finally:
+        IMAGE_PROCESSING.observe(time.perf_counter() - start)
+
+def _new_key(filename: str) -> str:
+    """Genera una clave única conservando la extensión del archivo"""
+    file_ext = os.path.splitext(filename)[1].lower()
+    return f"{uuid.uuid4()}{file_ext}"
+
+async def save_upload_file(file: UploadFile) -> str:
+    """
+    Guarda un archivo subido a través de la API y devuelve su clave
+    """
+    # Validar que sea una imagen
+    if not is_valid_image(file):
+        raise HTTPException(status_code=400, detail="Formato de archivo no válido. Acepta solo JPG, JPEG, PNG o WEBP")
+
+    await asyncio.to_thread(_validate_image, file.file)
+    file.file.seek(0)
+
+    # Generar nombre único y guardar en el almacenamiento configurado
+    unique_filename = _new_key(file.filename)
+    content_type = file.content_type or mimetypes.guess_type(file.filename)[0]
+    size = await asyncio.to_thread(get_storage().save, unique_filename, file.file, content_type)
+
+    # Registrar el tamaño recibido
+    UPLOAD_BYTES.inc(size)
+    UPLOAD_SIZE.observe(size)
+
+    schedule_thumbnail(unique_filename)
     return unique_filename
 
-def delete_file(filename: str) -> bool:
+def create_upload_ticket(filename: str, content_type: Optional[str] = None) -> Dict:
     """
-    Elimina un archivo del sistema de archivos
+    Reserva una clave y devuelve la URL para subir la imagen directamente al
+    almacenamiento; después hay que confirmarla con confirm_upload
     """
-    if not filename:
-        return False
-        
-    file_path = os.path.join(settings.UPLOAD_DIR, filename)
-    
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        return True
-    
-    return False
+    ext = os.path.splitext(filename or "")[1].lower().replace(".", "")
+    if ext not in settings.ALLOWED_IMAGE_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Formato de archivo no válido. Acepta solo JPG, JPEG, PNG o WEBP")
+
+    storage = get_storage()
+    key = _new_key(filename)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    expires_in = settings.STORAGE_PRESIGN_EXPIRES_SECONDS
+    upload = storage.presigned_put(key, content_type, expires_in)
+    UPLOAD_TICKETS.inc(backend=storage.name)
+    return {
+        "key": key,
+        "method": "PUT",
+        "upload_url": upload["url"],
+        "headers": upload["headers"],
+        "expires_in": expires_in,
+        "max_size": settings.MAX_IMAGE_SIZE,
+    }
+
+def confirm_upload(key: str) -> Dict:
+    """
+    Comprueba una subida directa (tamaño e imagen válida) y encola su miniatura.
+    Es idempotente: confirmar dos veces la misma clave no repite la miniatura.
+    Las subidas que el barrido ya puede borrar (upload_retention_seconds) se
+    rechazan.
+    """
+    if not is_upload_key(key):
+        UPLOAD_CONFIRMATIONS.inc(result="invalid")
+        raise HTTPException(status_code=400, detail="Clave de subida no válida")
+
+    storage = get_storage()
+    stored = storage.stat(key)
+    if stored is None:
+        UPLOAD_CONFIRMATIONS.inc(result="missing")
+        raise HTTPException(status_code=404, detail="No se encontró el archivo subido")
+
+    if stored.modified < time.time() - upload_retention_seconds() + ATTACH_MARGIN_SECONDS:
+        UPLOAD_CONFIRMATIONS.inc(result="expired")
+        raise HTTPException(status_code=410, detail="La subida ha caducado; solicita un nuevo ticket")
+
+    if stored.size > settings.MAX_IMAGE_SIZE:
+        storage.delete(key)
+        UPLOAD_CONFIRMATIONS.inc(result="invalid")
+        raise HTTPException(status_code=400, detail="La imagen supera el tamaño máximo permitido")
+
+    try:
+        _validate_image(io.BytesIO(storage.read(key)))
+    except HTTPException:
+        storage.delete(key)
+        UPLOAD_CONFIRMATIONS.inc(result="invalid")
+        raise
+
+    UPLOAD_CONFIRMATIONS.inc(result="ok")
+    UPLOAD_BYTES.inc(stored.size)
+    UPLOAD_SIZE.observe(stored.size)
+    if storage.stat(thumbnail_key(key)) is None:
+        schedule_thumbnail(key)
+    return {
+        "key": key,
+        "size": stored.size,
+        "url": storage.public_url(key),
+        "thumbnail_url": storage.public_url(thumbnail_key(key)),
+    }
+
+def check_local_upload(key: str, expires: int, signature: str) -> "LocalStorage":
+    """Verifica la firma de una URL de subida directa al backend local"""
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=404, detail="Las subidas directas van al almacenamiento externo")
+    if not is_upload_key(key) or not storage.verify_signature(key, expires, signature):
+        raise HTTPException(status_code=403, detail="URL de subida no válida o caducada")
+    return storage
+
+def spool_body(max_size: int) -> BinaryIO:
+    """Archivo temporal (en memoria hasta 1 MB) para recibir cuerpos de subida"""
+    return tempfile.SpooledTemporaryFile(max_size=min(max_size, 1024 * 1024))
+
+_thumbnail_executor: Optional[ThreadPoolExecutor] = None
+
+def generate_thumbnail(key: str) -> None:
+    """Genera la miniatura JPEG de una imagen y la guarda junto al original"""
+    from PIL import Image
+
+    start = time.perf_counter()
+    storage = get_storage()
+    try:
+        with Image.open(io.BytesIO(storage.read(key))) as image:
+            image.thumbnail((settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE))
+            buffer = io.BytesIO()
+            image.convert("RGB").save(buffer, "JPEG", quality=85, optimize=True)
+        buffer.seek(0)
+        storage.save(thumbnail_key(key), buffer, "image/jpeg")
+        _record_thumbnail(key)
+    except Exception:
+        THUMBNAILS.inc(result="error")
+        logger.exception("No se pudo generar la miniatura de %s", key)
+        return
+    finally:
+        THUMBNAIL_PROCESSING.observe(time.perf_counter() - start)
+    THUMBNAILS.inc(result="ok")
+
+def _record_thumbnail(key: str) -> None:
+    """Anota la miniatura en los productos que ya usan la foto"""
+    # Importación diferida: el CRUD de productos importa este módulo
+    from app.db import get_engine, SessionLocal
+    from app.crud import product as product_crud
+
+    with SessionLocal(bind=get_engine()) as db:
+        product_crud.set_thumbnail(db, key, thumbnail_key(key))
+
+def schedule_thumbnail(key: str) -> None:
+    """Encola la generación de la miniatura fuera de la petición"""
+    global _thumbnail_executor
+    if _thumbnail_executor is None:
+        _thumbnail_executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix="thumbnails"
+        )
+    _thumbnail_executor.submit(generate_thumbnail, key)
+
+def shutdown_thumbnails() -> None:
+    """Espera a las miniaturas en curso y descarta las pendientes (al apagar la aplicación)"""
+    global _thumbnail_executor
+    if _thumbnail_executor is not None:
+        _thumbnail_executor.shutdown(wait=True, cancel_futures=True)
+        _thumbnail_executor = None
 
 def is_valid_image(file: UploadFile) -> bool:
     """
@@ -57,8 +451,8 @@ def is_valid_image(file: UploadFile) -> bool:
     """
     if not file.filename:
         return False
-        
+
     # Obtener extensión y convertir a minúsculas
     ext = os.path.splitext(file.filename)[1].lower().replace(".", "")
-    
-    return ext in settings.ALLOWED_IMAGE_EXTENSIONS
\ No newline at end of file
+
+    return ext in settings.ALLOWED_IMAGE_EXTENSIONS
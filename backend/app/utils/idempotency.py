@@ -0,0 +1,277 @@
+# app/utils/idempotency.py
+"""
+Soporte de la cabecera Idempotency-Key para las rutas de creación.
+
+La primera petición con una clave la reserva en la tabla idempotency_keys,
+se procesa normalmente y su respuesta se guarda con un TTL. Las repeticiones
+con el mismo cuerpo reciben la respuesta original sin volver a subir la
+imagen ni a generar la ficha; los duplicados concurrentes esperan a que la
+petición en curso termine. Reutilizar la clave con otro cuerpo devuelve 422.
+
+La huella de los formularios multipart se calcula sobre los campos y el
+contenido de cada parte, no sobre el cuerpo tal cual, para que un reintento
+con otro boundary se reconozca como la misma petición. Mientras la petición
+original se procesa, su reserva se renueva periódicamente.
+
+Las repeticiones vuelven a emitir la cookie read-your-writes de get_write_db
+con un plazo nuevo, como haría la petición original.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from fastapi import Response
+
+from app.db import get_engine, pin_to_primary, SessionLocal
+from app.crud import idempotency as idempotency_crud
+from app.utils.metrics import IDEMPOTENCY_REQUESTS
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+# Rutas (método, ruta) que aceptan Idempotency-Key
+IDEMPOTENT_ROUTES: Set[Tuple[str, str]] = {
+    ("POST", "/api/products"),
+    ("POST", "/api/ad-sheets"),
+}
+
+# Cabeceras de la respuesta original que se guardan para las repeticiones
+STORED_HEADERS = {"content-type", "location"}
+
+# Intervalo de sondeo cuando la petición original está en otro worker
+POLL_INTERVAL = 0.25
+
+# Cada cuánto se purgan las claves caducadas (segundos)
+PURGE_INTERVAL = 600
+
+# Tamaño máximo del cuerpo: la imagen más los demás campos del formulario
+MAX_BODY_SIZE = settings.MAX_IMAGE_SIZE + 1024 * 1024
+
+_BOUNDARY = re.compile(rb'boundary="?([^";]+)"?', re.IGNORECASE)
+_FIELD_NAME = re.compile(rb'\bname="([^"]*)"', re.IGNORECASE)
+
+
+def _run_db(function, *args):
+    """Ejecuta una operación de la base de datos en el threadpool con su propia sesión"""
+    def run():
+        with SessionLocal(bind=get_engine()) as db:
+            return function(db, *args)
+    return asyncio.to_thread(run)
+
+
+def _multipart_parts(body: bytes, boundary: bytes) -> List[Tuple[bytes, str]]:
+    """Nombre y SHA-256 del contenido de cada parte, ordenados"""
+    parts = []
+    for raw in body.split(b"--" + boundary):
+        headers, separator, content = raw.partition(b"\r\n\r\n")
+        if not separator:
+            continue
+        name = _FIELD_NAME.search(headers)
+        if content.endswith(b"\r\n"):
+            content = content[:-2]
+        parts.append((name.group(1) if name else b"", hashlib.sha256(content).hexdigest()))
+    return sorted(parts)
+
+
+def fingerprint(method: str, path: str, content_type: Optional[bytes], body: bytes) -> str:
+    """
+    Huella de la petición: método, ruta y cuerpo. Los formularios multipart se
+    reducen a sus campos (sin el boundary aleatorio del cliente) y el JSON se
+    normaliza, así que un reintento reconstruido produce la misma huella.
+    """
+    content_type = content_type or b""
+    media_type = content_type.split(b";", 1)[0].strip().lower()
+    normalized = body
+    boundary = _BOUNDARY.search(content_type) if media_type == b"multipart/form-data" else None
+    if boundary:
+        normalized = json.dumps([
+            [name.decode("latin-1"), digest] for name, digest in _multipart_parts(body, boundary.group(1))
+        ]).encode()
+    elif media_type == b"application/json":
+        try:
+            normalized = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    return hashlib.sha256(method.encode() + b"\0" + path.encode() + b"\0" + normalized).hexdigest()
+
+
+def _primary_pin_headers() -> Dict[str, str]:
+    """Cabecera Set-Cookie que fija al cliente en el primario, si procede"""
+    response = Response()
+    pin_to_primary(response)
+    return {
+        name.decode("latin-1"): value.decode("latin-1")
+        for name, value in response.raw_headers if name == b"set-cookie"
+    }
+
+
+def _json_response(status: int, detail: str) -> Tuple[int, Dict[str, str], bytes]:
+    return status, {"content-type": "application/json"}, json.dumps({"detail": detail}).encode()
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI que aplica Idempotency-Key a IDEMPOTENT_ROUTES"""
+
+    def __init__(self, app):
+        self.app = app
+        # Peticiones en curso en este worker, para despertar a los duplicados sin sondear
+        self._in_flight: Dict[str, asyncio.Event] = {}
+        self._last_purge = 0.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        key = dict(scope["headers"]).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > 255:
+            await self._send(send, *_json_response(400, "Idempotency-Key no válida (1-255 caracteres)"))
+            return
+
+        # Leer el cuerpo completo (acotado) para calcular la huella de la petición
+        headers = dict(scope["headers"])
+        try:
+            declared = int(headers.get(b"content-length", 0))
+        except ValueError:
+            declared = 0
+        if declared > MAX_BODY_SIZE:
+            await self._send(send, *_json_response(413, "El cuerpo de la petición es demasiado grande"))
+            return
+
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_SIZE:
+                await self._send(send, *_json_response(413, "El cuerpo de la petición es demasiado grande"))
+                return
+            chunks.append(chunk)
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+        request_fingerprint = fingerprint(scope["method"], scope["path"], headers.get(b"content-type"), body)
+
+        await self._maybe_purge()
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        waited = False
+        while True:
+            record = await _run_db(idempotency_crud.claim_idempotency_key, key, request_fingerprint)
+            if record is None:
+                break
+
+            if record.fingerprint != request_fingerprint:
+                IDEMPOTENCY_REQUESTS.inc(outcome="mismatch")
+                await self._send(send, *_json_response(
+                    422, "La Idempotency-Key ya se usó con una petición diferente"
+                ))
+                return
+
+            if record.status == "completed":
+                IDEMPOTENCY_REQUESTS.inc(outcome="replayed")
+                headers = dict(record.response_headers or {})
+                headers["idempotent-replayed"] = "true"
+                headers.update(_primary_pin_headers())
+                await self._send(send, record.response_status, headers, record.response_body or b"")
+                return
+
+            # Duplicado concurrente: esperar a la petición original
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                IDEMPOTENCY_REQUESTS.inc(outcome="conflict")
+                await self._send(send, *_json_response(
+                    409, "Hay una petición con la misma Idempotency-Key en curso"
+                ))
+                return
+            if not waited:
+                waited = True
+                IDEMPOTENCY_REQUESTS.inc(outcome="waited")
+            event = self._in_flight.get(key)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+        IDEMPOTENCY_REQUESTS.inc(outcome="processed")
+        event = self._in_flight[key] = asyncio.Event()
+        renewal = asyncio.ensure_future(self._renew(key))
+        try:
+            await self._process(scope, body, send, key)
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            self._in_flight.pop(key, None)
+            event.set()
+
+    @staticmethod
+    async def _renew(key: str) -> None:
+        """Renueva la reserva mientras la petición sigue en curso (p. ej. generaciones largas)"""
+        while True:
+            await asyncio.sleep(settings.IDEMPOTENCY_LOCK_SECONDS / 3)
+            await _run_db(idempotency_crud.renew_idempotency_key, key)
+
+    async def _process(self, scope, body: bytes, send, key: str) -> None:
+        """Ejecuta la petición original y guarda su respuesta (salvo errores 5xx)"""
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        status = 500
+        headers: Dict[str, str] = {}
+        chunks = []
+
+        async def capture_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    name = name.decode("latin-1").lower()
+                    if name in STORED_HEADERS:
+                        headers[name] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        completed = False
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            if status < 500:
+                await _run_db(idempotency_crud.complete_idempotency_key, key, status, headers, b"".join(chunks))
+                completed = True
+        finally:
+            if not completed:
+                # Los errores del servidor no se guardan: el cliente puede reintentar
+                await _run_db(idempotency_crud.release_idempotency_key, key)
+
+    async def _maybe_purge(self) -> None:
+        if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            await _run_db(idempotency_crud.purge_expired_idempotency_keys)
+
+    @staticmethod
+    async def _send(send, status: int, headers: Dict[str, str], body: bytes) -> None:
+        raw_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
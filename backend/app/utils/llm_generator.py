@@ -1,49 +1,53 @@
 # app/utils/llm_generator.py
+import asyncio
+import json
+import math
 import os
+import time
 from typing import List, Dict, Any, Optional
 import httpx
 from app.models.product import Product
 from app.config import settings
+from app.utils.metrics import LLM_LATENCY, LLM_ERRORS, LLM_RETRIES, LLM_TOKENS, LLM_PROMPT_PARTS
+from app.utils.llm_resilience import call_with_resilience, record_latency, timeout_for
 
-async def generate_ad_sheet_content(products: List[Product], platform: str, template: str) -> str:
-    """
-    Genera el contenido de una ficha publicitaria utilizando un LLM (OpenAI o Anthropic)
-    
-    Args:
-        products: Lista de productos para incluir en la ficha
-        platform: Plataforma destino (facebook, whatsapp, revolico)
-        template: Plantilla a utilizar
-        
-    Returns:
-        Contenido en markdown de la ficha publicitaria
-    """
-    # Preparar la información de los productos
-    products_data = []
-    for product in products:
-        product_data = {
-            "id": str(product.id),
-            "nombre": product.nombre,
-            "precio": float(product.precio),
-            "color": product.color,
-            "talla": product.talla,
-            "caracteristicas": product.caracteristicas,
-            "disponible": product.disponible,
-            "foto": product.foto
-        }
-        products_data.append(product_data)
-    
-    # Definir los templates según la plataforma
-    templates = {
-        "facebook": {
-            "basic": """
+# Caracteres por token para estimar el tamaño de los prompts
+CHARS_PER_TOKEN = 4.0
+
+# Las generaciones se cobran y no son idempotentes: solo se reintentan las
+# peticiones que no llegaron al proveedor (errores de conexión) y los 429 con
+# Retry-After
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Cliente HTTP compartido; se abre en el arranque de la aplicación (lifespan)
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Devuelve el cliente HTTP compartido, creándolo si todavía no existe"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=settings.LLM_TIMEOUT)
+    return _http_client
+
+async def close_http_client() -> None:
+    """Cierra el cliente HTTP compartido y sus conexiones"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Templates de referencia según la plataforma
+TEMPLATES = {
+    "facebook": {
+        "basic": """
 # 🛍️ {product_name}
 
 📌 **Precio**: ${product_price}
 {product_details}
 
 ✨ *¡Disponible ahora! Contáctanos para más información.*
-            """,
-            "detailed": """
+        """,
+        "detailed": """
 # 🔥 OFERTA ESPECIAL 🔥
 
 ## {product_name}
@@ -58,18 +62,18 @@ async def generate_ad_sheet_content(products: List[Product], platform: str, temp
 {product_benefits}
 
 📞 *¡Contáctanos ahora y no pierdas esta oportunidad!*
-            """
-        },
-        "whatsapp": {
-            "basic": """
+        """
+    },
+    "whatsapp": {
+        "basic": """
 *{product_name}*
 💰 Precio: ${product_price}
 {product_details}
 
 ✅ ¡Disponible para entrega inmediata!
 🔄 Responde a este mensaje para más información
-            """,
-            "detailed": """
+        """,
+        "detailed": """
 *🌟 NUEVO PRODUCTO 🌟*
 
 *{product_name}*
@@ -84,18 +88,18 @@ async def generate_ad_sheet_content(products: List[Product], platform: str, temp
 💳 Múltiples métodos de pago
 
 _¡Pregunta por disponibilidad y más detalles!_
-            """
-        },
-        "revolico": {
-            "basic": """
+        """
+    },
+    "revolico": {
+        "basic": """
 # {product_name}
 
 Precio: ${product_price}
 {product_details}
 
 Contacto: [NÚMERO]
-            """,
-            "detailed": """
+        """,
+        "detailed": """
 # {product_name} - ${product_price}
 
 ![Imagen]({product_image_url})
@@ -112,115 +116,311 @@ Contacto: [NÚMERO]
 - Ubicación: [LOCALIDAD]
 
 _Se aceptan pagos en efectivo y transferencia._
-            """
-        }
+        """
     }
+}
+
+async def generate_ad_sheet_content(products: List[Product], platform: str, template: str) -> str:
+    """
+    Genera el contenido de una ficha publicitaria utilizando un LLM (OpenAI o Anthropic)
+    
+    Si los datos de los productos no caben en el presupuesto de tokens del prompt,
+    se reparten en varias sub-generaciones en paralelo que se unen en una sola ficha.
+    
+    Args:
+        products: Lista de productos para incluir en la ficha
+        platform: Plataforma destino (facebook, whatsapp, revolico)
+        template: Plantilla a utilizar
+        
+    Returns:
+        Contenido en markdown de la ficha publicitaria
+    """
+    # Preparar la información de los productos
+    products_data = [prepare_product_data(product) for product in products]
     
     # Seleccionar el template adecuado
-    selected_template = templates.get(platform, {}).get(template, templates["facebook"]["basic"])
+    selected_template = TEMPLATES.get(platform, {}).get(template, TEMPLATES["facebook"]["basic"])
     
-    # Construir el prompt para el LLM
-    if settings.LLM_PROVIDER.lower() == "openai":
-        return await generate_with_openai(products_data, platform, selected_template)
-    else:
-        return await generate_with_anthropic(products_data, platform, selected_template)
-
-async def generate_with_openai(products_data: List[Dict[str, Any]], platform: str, template: str) -> str:
-    """Genera contenido usando la API de OpenAI"""
+    # Construir los prompts (uno por parte si hay que dividir)
+    chunks = split_products(products_data, platform, selected_template)
+    LLM_PROMPT_PARTS.observe(len(chunks))
     
-    prompt = f"""
-    Eres un experto en marketing digital y ventas. Necesito que crees una ficha publicitaria en formato markdown para los siguientes productos:
+    if len(chunks) == 1:
+        return await generate_with_provider(build_prompt(chunks[0], platform, selected_template))
     
-    ```json
-    {products_data}
-    ```
+    semaphore = asyncio.Semaphore(settings.LLM_MAX_PARALLEL_PARTS)
     
-    La ficha publicitaria será publicada en {platform}.
-    Usa el siguiente template como guía, pero puedes mejorarlo según las mejores prácticas de {platform}:
+    async def generate_part(index: int, chunk: List[Dict[str, Any]]) -> str:
+        prompt = build_prompt(chunk, platform, selected_template, part=index + 1, total_parts=len(chunks))
+        async with semaphore:
+            return await generate_with_provider(prompt)
     
-    ```
-    {template}
-    ```
+    parts = await asyncio.gather(*(generate_part(index, chunk) for index, chunk in enumerate(chunks)))
+    return "\n\n".join(part.strip() for part in parts)
+
+def provider_order() -> List[str]:
+    """Proveedores en orden de preferencia: LLM_PROVIDER y, si lo hay, el de respaldo"""
+    primary = "openai" if settings.LLM_PROVIDER.lower() == "openai" else "anthropic"
+    fallback = settings.LLM_FALLBACK_PROVIDER.lower()
+    if not fallback:
+        other = "anthropic" if primary == "openai" else "openai"
+        api_keys = {"openai": settings.OPENAI_API_KEY, "anthropic": settings.ANTHROPIC_API_KEY}
+        fallback = other if api_keys[other] else ""
+    return [primary] + ([fallback] if fallback in PROVIDERS and fallback != primary else [])
+
+async def generate_with_provider(prompt: str) -> str:
+    """
+    Genera contenido con el proveedor configurado en LLM_PROVIDER, con circuit
+    breaker, cobertura y conmutación al proveedor de respaldo
+    """
+    return await call_with_resilience([
+        (provider, lambda generate=PROVIDERS[provider]: generate(prompt))
+        for provider in provider_order()
+    ])
+
+def prune_empty(value: Any) -> Any:
+    """Elimina recursivamente los valores nulos y las cadenas, listas y diccionarios vacíos"""
+    if isinstance(value, dict):
+        pruned = {key: prune_empty(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        pruned = [prune_empty(item) for item in value]
+        return [item for item in pruned if item not in (None, "", [], {})]
+    return value
+
+def prepare_product_data(product: Product) -> Dict[str, Any]:
+    """Datos de un producto para el prompt, sin campos vacíos"""
+    return prune_empty({
+        "nombre": product.nombre,
+        "precio": float(product.precio),
+        "color": product.color,
+        "talla": product.talla,
+        "caracteristicas": product.caracteristicas,
+        "disponible": product.disponible,
+        "foto": product.foto
+    })
+
+def to_compact_json(data: Any) -> str:
+    """JSON canónico y compacto (claves ordenadas, sin espacios, UTF-8)"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+def estimate_tokens(text: str) -> int:
+    """Estimación aproximada de tokens (~4 caracteres por token)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def build_prompt(
+    products_data: List[Dict[str, Any]],
+    platform: str,
+    template: str,
+    part: int = 1,
+    total_parts: int = 1
+) -> str:
+    """Construye el prompt común a todos los proveedores"""
+    prompt = f"""Eres un experto en marketing digital y ventas. Necesito que crees una ficha publicitaria en formato markdown para los siguientes productos:
+
+```json
+{to_compact_json(products_data)}
+```
+
+La ficha publicitaria será publicada en {platform}.
+Usa el siguiente template como guía, pero puedes mejorarlo según las mejores prácticas de {platform}:
+
+```
+{template.strip()}
+```
+
+Por favor, crea una ficha atractiva, persuasiva y optimizada para la plataforma {platform}.
+Si la ficha es para varios productos, agrúpalos de forma coherente.
+Incluye emoji adecuados para hacerla atractiva.
+No incluyas URLs de imágenes falsas, solo referencias a las fotos mencionadas en los datos.
+Recuerda que el formato final debe ser markdown plano."""
+    
+    if total_parts > 1:
+        if part == 1:
+            scope = "Incluye el encabezado de la ficha, pero no el cierre ni los datos de contacto."
+        elif part == total_parts:
+            scope = "No incluyas encabezado general; termina con el cierre y los datos de contacto."
+        else:
+            scope = "No incluyas encabezado general ni cierre; solo las secciones de estos productos."
+        prompt += f"\nEsta es la parte {part} de {total_parts} de una misma ficha. {scope}"
     
-    Por favor, crea una ficha atractiva, persuasiva y optimizada para la plataforma {platform}.
-    Si la ficha es para varios productos, agrúpalos de forma coherente.
-    Incluye emoji adecuados para hacerla atractiva.
-    No incluyas URLs de imágenes falsas, solo referencias a las fotos mencionadas en los datos.
-    Recuerda que el formato final debe ser markdown plano.
+    return prompt
+
+def fit_product(product_data: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    Recorta las características de un producto hasta que su JSON quepa en
+    `max_tokens` (quitando primero las más largas); si ni sin ellas cabe,
+    lanza ValueError
     """
+    if estimate_tokens(to_compact_json(product_data)) <= max_tokens:
+        return product_data
     
-    # Configurar la API de OpenAI
-    api_key = settings.OPENAI_API_KEY
+    data = dict(product_data)
+    features = data.get("caracteristicas")
+    if isinstance(features, dict):
+        features = dict(features)
+    elif isinstance(features, list):
+        features = list(features)
     
-    # Llamar a la API
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "gpt-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.7,
-                "max_tokens": 1000
-            },
-            timeout=30.0
+    while features and estimate_tokens(to_compact_json(data)) > max_tokens:
+        if isinstance(features, str):
+            excess = (estimate_tokens(to_compact_json(data)) - max_tokens) * CHARS_PER_TOKEN
+            features = features[:max(0, len(features) - int(excess) - 1)].rstrip()
+            features = features + "…" if features else None
+        elif isinstance(features, dict):
+            largest = max(features, key=lambda key: len(to_compact_json(features[key])))
+            del features[largest]
+        else:
+            features.pop(max(range(len(features)), key=lambda index: len(to_compact_json(features[index]))))
+        data["caracteristicas"] = features
+        if not features:
+            data.pop("caracteristicas")
+    
+    if estimate_tokens(to_compact_json(data)) > max_tokens:
+        raise ValueError(
+            f"Los datos del producto '{data.get('nombre', '')}' no caben en el prompt "
+            f"(LLM_PROMPT_TOKEN_BUDGET={settings.LLM_PROMPT_TOKEN_BUDGET})"
         )
-        
-        if response.status_code != 200:
-            raise Exception(f"Error en la API de OpenAI: {response.text}")
-        
-        data = response.json()
-        return data["choices"][0]["message"]["content"].strip()
+    return data
 
-async def generate_with_anthropic(products_data: List[Dict[str, Any]], platform: str, template: str) -> str:
-    """Genera contenido usando la API de Anthropic"""
+def split_products(
+    products_data: List[Dict[str, Any]],
+    platform: str,
+    template: str
+) -> List[List[Dict[str, Any]]]:
+    """
+    Reparte los productos en grupos cuyo prompt no supere LLM_PROMPT_TOKEN_BUDGET.
+    Un producto que por sí solo supera el presupuesto va en su propio grupo con
+    las características recortadas (fit_product).
+    """
+    budget = settings.LLM_PROMPT_TOKEN_BUDGET
+    # Coste fijo del prompt (con la instrucción de parte más larga) sin productos
+    base_tokens = estimate_tokens(build_prompt([], platform, template, part=2, total_parts=3))
+    
+    chunks: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = base_tokens
+    for product_data in products_data:
+        product_data = fit_product(product_data, budget - base_tokens - 1)
+        # +1 por la coma que separa los elementos del array
+        product_tokens = estimate_tokens(to_compact_json(product_data)) + 1
+        if current and current_tokens + product_tokens > budget:
+            chunks.append(current)
+            current = []
+            current_tokens = base_tokens
+        current.append(product_data)
+        current_tokens += product_tokens
     
-    prompt = f"""
-    Eres un experto en marketing digital y ventas. Necesito que crees una ficha publicitaria en formato markdown para los siguientes productos:
+    chunks.append(current)
+    return chunks
+
+async def generate_with_openai(prompt: str) -> str:
+    """Genera contenido usando la API de OpenAI"""
     
-    ```json
-    {products_data}
-    ```
+    # Configurar la API de OpenAI
+    api_key = settings.OPENAI_API_KEY
     
-    La ficha publicitaria será publicada en {platform}.
-    Usa el siguiente template como guía, pero puedes mejorarlo según las mejores prácticas de {platform}:
+    # Llamar a la API
+    data = await post_to_llm(
+        "openai",
+        "https://api.openai.com/v1/chat/completions",
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        },
+        payload={
+            "model": "gpt-4",
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0.7,
+            "max_tokens": 1000
+        }
+    )
     
-    ```
-    {template}
-    ```
+    usage = data.get("usage") or {}
+    LLM_TOKENS.inc(usage.get("prompt_tokens", 0), provider="openai", type="input")
+    LLM_TOKENS.inc(usage.get("completion_tokens", 0), provider="openai", type="output")
     
-    Por favor, crea una ficha atractiva, persuasiva y optimizada para la plataforma {platform}.
-    Si la ficha es para varios productos, agrúpalos de forma coherente.
-    Incluye emoji adecuados para hacerla atractiva.
-    No incluyas URLs de imágenes falsas, solo referencias a las fotos mencionadas en los datos.
-    Recuerda que el formato final debe ser markdown plano.
-    """
+    return data["choices"][0]["message"]["content"].strip()
+
+async def generate_with_anthropic(prompt: str) -> str:
+    """Genera contenido usando la API de Anthropic"""
     
     # Configurar la API de Anthropic
     api_key = settings.ANTHROPIC_API_KEY
     
     # Llamar a la API
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "claude-3-opus-20240229",
-                "max_tokens": 1000,
-                "messages": [{"role": "user", "content": prompt}]
-            },
-            timeout=30.0
-        )
+    data = await post_to_llm(
+        "anthropic",
+        "https://api.anthropic.com/v1/messages",
+        headers={
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "Content-Type": "application/json"
+        },
+        payload={
+            "model": "claude-3-opus-20240229",
+            "max_tokens": 1000,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+    )
+    
+    usage = data.get("usage") or {}
+    LLM_TOKENS.inc(usage.get("input_tokens", 0), provider="anthropic", type="input")
+    LLM_TOKENS.inc(usage.get("output_tokens", 0), provider="anthropic", type="output")
+    
+    return data["content"][0]["text"].strip()
+
+async def post_to_llm(provider: str, url: str, headers: Dict[str, str], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Envía la petición al proveedor y registra latencia, errores y reintentos
+    por proveedor. Hasta LLM_MAX_RETRIES reintentos (0 por defecto), solo si la
+    petición no llegó al proveedor o si este respondió 429 con Retry-After.
+    """
+    attempts = settings.LLM_MAX_RETRIES + 1
+    client = get_http_client()
+    delay = 0.0
+    
+    for attempt in range(attempts):
+        if attempt > 0:
+            LLM_RETRIES.inc(provider=provider)
+            await asyncio.sleep(delay)
+        
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, headers=headers, json=payload, timeout=timeout_for(provider))
+        except httpx.TransportError as e:
+            LLM_LATENCY.observe(time.perf_counter() - start, provider=provider)
+            LLM_ERRORS.inc(provider=provider)
+            if isinstance(e, RETRYABLE_TRANSPORT_ERRORS) and attempt + 1 < attempts:
+                # Espera exponencial entre reintentos
+                delay = 0.5 * 2 ** attempt
+                continue
+            raise Exception(f"Error de conexión con la API de {provider}: {str(e)}")
+        elapsed = time.perf_counter() - start
+        LLM_LATENCY.observe(elapsed, provider=provider)
         
         if response.status_code != 200:
-            raise Exception(f"Error en la API de Anthropic: {response.text}")
+            LLM_ERRORS.inc(provider=provider)
+            retry_after = _retry_after(response) if response.status_code == 429 else None
+            if retry_after is not None and attempt + 1 < attempts:
+                delay = retry_after
+                continue
+            raise Exception(f"Error en la API de {provider}: {response.text}")
         
-        data = response.json()
-        return data["content"][0]["text"].strip()
\ No newline at end of file
+        # Solo las respuestas correctas alimentan el timeout adaptativo y el umbral de cobertura
+        record_latency(provider, elapsed)
+        return response.json()
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Segundos de la cabecera Retry-After; None si falta o supera LLM_TIMEOUT"""
+    try:
+        seconds = float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+    return seconds if 0 <= seconds <= settings.LLM_TIMEOUT else None
+
+# Funciones de generación por proveedor
+PROVIDERS = {
+    "openai": generate_with_openai,
+    "anthropic": generate_with_anthropic
+}
@@ -0,0 +1,212 @@
+# app/utils/llm_resilience.py
+"""
+Capa de resiliencia para las llamadas al LLM: circuit breaker por proveedor,
+timeouts adaptativos según los percentiles de latencia observados y
+peticiones de cobertura (hedging) al proveedor secundario cuando el primario
+supera su p95.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.metrics import LLM_BREAKER_STATE, LLM_HEDGES, LLM_HEDGE_WINS, LLM_FAILOVERS
+
+# Muestras mínimas antes de fiarse de los percentiles observados
+MIN_SAMPLES = 20
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ProviderUnavailable(Exception):
+    """El circuit breaker del proveedor está abierto"""
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias de las llamadas correctas"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_SAMPLES:
+                return None
+            values = sorted(self._samples)
+        return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+
+class CircuitBreaker:
+    """
+    Abre el circuito tras LLM_BREAKER_FAILURES fallos consecutivos; pasado
+    LLM_BREAKER_RESET_SECONDS deja pasar una única llamada de prueba
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        LLM_BREAKER_STATE.set(_STATE_VALUES[CLOSED], provider=provider)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        LLM_BREAKER_STATE.set(_STATE_VALUES[state], provider=self.provider)
+
+    def available(self) -> bool:
+        """Indica si se podría llamar al proveedor ahora, sin reservar la llamada"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self._opened_at >= settings.LLM_BREAKER_RESET_SECONDS
+            return not (self.state == HALF_OPEN and self._probe_in_flight)
+
+    def acquire(self) -> None:
+        """Reserva una llamada; lanza ProviderUnavailable si el circuito no lo permite"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < settings.LLM_BREAKER_RESET_SECONDS:
+                    raise ProviderUnavailable(f"Circuito abierto para {self.provider}")
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probe_in_flight:
+                    raise ProviderUnavailable(f"Circuito a prueba para {self.provider}")
+                self._probe_in_flight = True
+
+    def release(self) -> None:
+        """Libera la reserva de una llamada cancelada sin resultado"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self._failures >= settings.LLM_BREAKER_FAILURES:
+                self._opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_trackers: Dict[str, LatencyTracker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(provider)
+    return _breakers[provider]
+
+
+def get_tracker(provider: str) -> LatencyTracker:
+    if provider not in _trackers:
+        _trackers[provider] = LatencyTracker()
+    return _trackers[provider]
+
+
+def record_latency(provider: str, seconds: float) -> None:
+    get_tracker(provider).record(seconds)
+
+
+def timeout_for(provider: str) -> float:
+    """
+    Timeout por intento: LLM_TIMEOUT_P99_FACTOR veces el p99 observado, acotado
+    entre LLM_MIN_TIMEOUT y LLM_TIMEOUT; sin muestras suficientes, LLM_TIMEOUT
+    """
+    p99 = get_tracker(provider).percentile(99)
+    if p99 is None:
+        return settings.LLM_TIMEOUT
+    return max(settings.LLM_MIN_TIMEOUT, min(settings.LLM_TIMEOUT, p99 * settings.LLM_TIMEOUT_P99_FACTOR))
+
+
+def hedge_delay_for(provider: str) -> float:
+    """Espera antes de lanzar la petición de cobertura: el p95 observado del proveedor"""
+    p95 = get_tracker(provider).percentile(95)
+    return p95 if p95 is not None else settings.LLM_HEDGE_DELAY
+
+
+async def _guarded(provider: str, call: Callable[[], Awaitable[str]]) -> str:
+    """Ejecuta la llamada a un proveedor registrando el resultado en su circuit breaker"""
+    breaker = get_breaker(provider)
+    breaker.acquire()
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+async def call_with_resilience(calls: List[Tuple[str, Callable[[], Awaitable[str]]]]) -> str:
+    """
+    Llama al primer proveedor disponible de la lista (en orden de preferencia).
+    Si tarda más que su p95, lanza la misma petición al siguiente y se queda con
+    la primera respuesta correcta; si falla, pasa al siguiente proveedor.
+    """
+    candidates = [(provider, call) for provider, call in calls if get_breaker(provider).available()]
+    if not candidates:
+        raise Exception("No hay proveedores de LLM disponibles (circuitos abiertos)")
+
+    errors: List[str] = []
+    pending: Dict[asyncio.Task, str] = {}
+    next_index = 0
+
+    def launch() -> None:
+        nonlocal next_index
+        provider, call = candidates[next_index]
+        next_index += 1
+        pending[asyncio.ensure_future(_guarded(provider, call))] = provider
+
+    launch()
+    try:
+        while pending:
+            can_hedge = settings.LLM_HEDGING and next_index < len(candidates) and len(pending) == 1
+            timeout = hedge_delay_for(next(iter(pending.values()))) if can_hedge else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # El primario supera su p95: petición de cobertura al siguiente proveedor
+                LLM_HEDGES.inc(provider=candidates[next_index][0])
+                launch()
+                continue
+
+            for task in done:
+                provider = pending.pop(task)
+                if task.exception() is None:
+                    if len(calls) > 1 and provider != calls[0][0]:
+                        LLM_HEDGE_WINS.inc(provider=provider)
+                    return task.result()
+                errors.append(f"{provider}: {task.exception()}")
+
+            # Falló sin que haya otra petición en curso: conmutar al siguiente proveedor
+            if not pending and next_index < len(candidates):
+                LLM_FAILOVERS.inc(provider=candidates[next_index][0])
+                launch()
+    finally:
+        # Cancelar las peticiones que siguen en curso y esperar a que terminen
+        # para que cierren sus conexiones
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    raise Exception("Error en todos los proveedores de LLM: " + "; ".join(errors))
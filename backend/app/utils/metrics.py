@@ -0,0 +1,479 @@
+# app/utils/metrics.py
+"""
+Métricas en formato de exposición de Prometheus, sin dependencias externas.
+
+Incluye un registro en proceso (contadores, gauges e histogramas con etiquetas),
+el middleware ASGI que mide cada petición y los eventos del engine de SQLAlchemy
+que cuentan las consultas ejecutadas durante una petición.
+"""
+import bisect
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Cabecera con el identificador de la petición (se respeta el del cliente o el proxy)
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Buckets por defecto (segundos), iguales a los del cliente oficial de Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Contador monótono creciente"""
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Valor que puede subir y bajar"""
+    type_name = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con buckets fijos"""
+    type_name = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Por cada combinación de etiquetas: [conteos por bucket..., suma, total]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[-1] if state else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        lines = []
+        for key, state in items:
+            cumulative = 0.0
+            for bound, hits in zip(self.buckets, state):
+                cumulative += hits
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """Colección de métricas que se exponen en /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Métricas HTTP
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status")
+)
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta", ("method", "route")
+)
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "Peticiones HTTP en curso", ("method",)
+)
+
+# Métricas de base de datos
+DB_QUERIES = registry.counter(
+    "db_queries_total", "Consultas SQL ejecutadas", ("route",)
+)
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "Número de consultas SQL por petición", ("route",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_TIME_PER_REQUEST = registry.histogram(
+    "db_query_seconds_per_request", "Tiempo total en consultas SQL por petición", ("route",)
+)
+DB_READ_ROUTING = registry.counter(
+    "db_read_routing_total", "Sesiones de lectura por destino", ("target",)
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections", "Conexiones del pool de la base de datos por estado", ("state",)
+)
+
+# Métricas de subida y procesamiento de imágenes
+UPLOAD_BYTES = registry.counter(
+    "upload_bytes_total", "Bytes recibidos en archivos subidos"
+)
+UPLOAD_SIZE = registry.histogram(
+    "upload_size_bytes", "Tamaño de los archivos subidos",
+    buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 2 * 1024 * 1024, 5 * 1024 * 1024),
+)
+IMAGE_PROCESSING = registry.histogram(
+    "image_processing_seconds", "Tiempo de validación y procesamiento de imágenes"
+)
+UPLOAD_TICKETS = registry.counter(
+    "upload_tickets_total", "URLs de subida directa emitidas", ("backend",)
+)
+UPLOAD_CONFIRMATIONS = registry.counter(
+    "upload_confirmations_total", "Confirmaciones de subidas directas", ("result",)
+)
+THUMBNAILS = registry.counter(
+    "thumbnails_total", "Miniaturas generadas en segundo plano", ("result",)
+)
+THUMBNAIL_PROCESSING = registry.histogram(
+    "thumbnail_processing_seconds", "Tiempo de generación de miniaturas"
+)
+
+# Métricas de consultas lentas
+SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total", "Consultas que superan SLOW_QUERY_THRESHOLD_MS", ("route",)
+)
+SLOW_QUERY_SEQ_SCANS = registry.counter(
+    "db_slow_query_seq_scans_total", "Recorridos secuenciales en los planes de consultas lentas", ("table",)
+)
+
+# Métricas del control de admisión
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight", "Peticiones en curso por grupo de rutas", ("group",)
+)
+ADMISSION_QUEUED = registry.gauge(
+    "admission_queued", "Peticiones esperando turno por grupo de rutas", ("group",)
+)
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total", "Peticiones rechazadas con 503 por sobrecarga", ("group", "reason")
+)
+ADMISSION_WAIT = registry.histogram(
+    "admission_wait_seconds", "Tiempo de espera en la cola de admisión", ("group",)
+)
+
+# Métricas de compresión y caché de respuestas
+RESPONSE_COMPRESSION = registry.counter(
+    "http_response_compression_total", "Respuestas por codificación aplicada", ("encoding",)
+)
+COMPRESSION_INPUT_BYTES = registry.counter(
+    "http_compression_input_bytes_total", "Bytes de las respuestas antes de comprimir", ("encoding",)
+)
+COMPRESSION_OUTPUT_BYTES = registry.counter(
+    "http_compression_output_bytes_total", "Bytes de las respuestas comprimidas enviadas", ("encoding",)
+)
+RESPONSE_CACHE = registry.counter(
+    "http_response_cache_total", "Consultas a la caché de respuestas", ("result",)
+)
+RESPONSE_CACHE_ENTRIES = registry.gauge(
+    "http_response_cache_entries", "Respuestas guardadas en la caché del worker"
+)
+RESPONSE_CACHE_EVICTIONS = registry.counter(
+    "http_response_cache_evictions_total", "Invalidaciones aplicadas a la caché de respuestas", ("tag",)
+)
+CACHE_BUS_MESSAGES = registry.counter(
+    "cache_bus_messages_total", "Mensajes del bus de invalidación de cachés", ("direction",)
+)
+CACHE_BUS_LAG = registry.histogram(
+    "cache_bus_lag_seconds", "Tiempo desde la escritura hasta que otro worker aplica la invalidación",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# Métricas de la limpieza de uploads huérfanos
+UPLOAD_GC_RUNS = registry.counter(
+    "upload_gc_runs_total", "Barridos del directorio de uploads", ("result",)
+)
+UPLOAD_GC_DELETED_FILES = registry.counter(
+    "upload_gc_deleted_files_total", "Archivos huérfanos eliminados"
+)
+UPLOAD_GC_RECLAIMED_BYTES = registry.counter(
+    "upload_gc_reclaimed_bytes_total", "Bytes liberados al eliminar archivos huérfanos"
+)
+UPLOAD_GC_DURATION = registry.histogram(
+    "upload_gc_duration_seconds", "Duración de cada barrido del directorio de uploads",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+# Métricas del feed de cambios
+CHANGE_FEED_SUBSCRIBERS = registry.gauge(
+    "change_feed_subscribers", "Suscriptores conectados al feed de cambios"
+)
+CHANGE_FEED_EVENTS = registry.counter(
+    "change_feed_events_total", "Eventos leídos por el listener del feed de cambios"
+)
+CHANGE_FEED_DROPPED = registry.counter(
+    "change_feed_dropped_subscribers_total", "Suscriptores desconectados por no consumir a tiempo"
+)
+
+# Métricas de idempotencia
+IDEMPOTENCY_REQUESTS = registry.counter(
+    "idempotency_requests_total", "Peticiones con Idempotency-Key por resultado", ("outcome",)
+)
+
+# Métricas del LLM
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "Latencia de las llamadas al LLM", ("provider",),
+    buckets=(0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 60.0),
+)
+LLM_ERRORS = registry.counter(
+    "llm_errors_total", "Llamadas al LLM fallidas", ("provider",)
+)
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "Reintentos de llamadas al LLM", ("provider",)
+)
+LLM_BREAKER_STATE = registry.gauge(
+    "llm_circuit_breaker_state", "Estado del circuit breaker (0 cerrado, 1 a prueba, 2 abierto)", ("provider",)
+)
+LLM_HEDGES = registry.counter(
+    "llm_hedged_requests_total", "Peticiones de cobertura lanzadas al proveedor secundario", ("provider",)
+)
+LLM_HEDGE_WINS = registry.counter(
+    "llm_secondary_wins_total", "Respuestas servidas por un proveedor distinto del primario", ("provider",)
+)
+LLM_FAILOVERS = registry.counter(
+    "llm_failovers_total", "Conmutaciones a otro proveedor tras un fallo", ("provider",)
+)
+LLM_PROMPT_PARTS = registry.histogram(
+    "llm_prompt_parts", "Sub-generaciones por ficha publicitaria",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens consumidos por proveedor", ("provider", "type")
+)
+
+
+class RequestStats:
+    """Estadísticas acumuladas durante una petición"""
+    __slots__ = ("route", "db_queries", "db_time", "request_id", "scope")
+
+    def __init__(self, request_id: str = "", scope=None):
+        self.route = "unmatched"
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.request_id = request_id
+        self.scope = scope
+
+    def current_route(self) -> str:
+        """Ruta atendida; durante la petición se obtiene del scope, ya enrutado"""
+        if self.scope is not None and self.route == "unmatched":
+            return route_template(self.scope)
+        return self.route
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Devuelve las estadísticas de la petición en curso, si la hay"""
+    return _request_stats.get()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Registra los eventos del engine que cuentan consultas y tiempo por petición"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_time += elapsed
+
+
+def route_template(scope) -> str:
+    """
+    Devuelve la plantilla de la ruta atendida (p.ej. /api/products/{product_id})
+    para acotar la cardinalidad de las etiquetas
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    values = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    segments = [f"{{{values[segment]}}}" if segment in values else segment for segment in scope["path"].split("/")]
+    return "/".join(segments)
+
+
+def update_pool_metrics(engine: Engine) -> None:
+    """Actualiza los gauges del pool de conexiones (solo para pools con tamaño fijo)"""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL_CONNECTIONS.set(pool.checkedout(), state="checked_out")
+    DB_POOL_CONNECTIONS.set(pool.checkedin(), state="checked_in")
+    DB_POOL_CONNECTIONS.set(pool.overflow(), state="overflow")
+    DB_POOL_CONNECTIONS.set(pool.size(), state="size")
+
+
+def _request_id(scope) -> str:
+    """Identificador de la petición: el de X-Request-ID si es razonable o uno nuevo"""
+    value = dict(scope["headers"]).get(REQUEST_ID_HEADER, b"").decode("latin-1")
+    if value and len(value) <= 128 and value.isprintable():
+        return value
+    return uuid.uuid4().hex
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide latencia, peticiones en curso y uso de la base de datos por ruta"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(_request_id(scope), scope)
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [(REQUEST_ID_HEADER, stats.request_id.encode())],
+                }
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec(method=method)
+            _request_stats.reset(token)
+
+            stats.route = route_template(scope)
+
+            HTTP_REQUESTS.inc(method=method, route=stats.route, status=str(status_code))
+            HTTP_LATENCY.observe(elapsed, method=method, route=stats.route)
+            DB_QUERIES_PER_REQUEST.observe(stats.db_queries, route=stats.route)
+            DB_TIME_PER_REQUEST.observe(stats.db_time, route=stats.route)
+            if stats.db_queries:
+                DB_QUERIES.inc(stats.db_queries, route=stats.route)
@@ -0,0 +1,37 @@
+# app/utils/projection.py
+from typing import Dict, List, Optional, Sequence
+
+def resolve_fields(
+    fields: Optional[str],
+    view: Optional[str],
+    allowed: Sequence[str],
+    summary: Sequence[str]
+) -> Optional[List[str]]:
+    """
+    Resuelve los parámetros `fields` y `view` de un listado a la lista de
+    columnas a seleccionar. Devuelve None si se pide la vista completa.
+    El campo `id` se incluye siempre.
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in allowed]
+        if unknown:
+            raise ValueError(f"Campos no válidos: {unknown}. Opciones disponibles: {list(allowed)}")
+    elif view is None or view == "full":
+        return None
+    elif view == "summary":
+        requested = list(summary)
+    else:
+        raise ValueError("Vista no válida. Opciones disponibles: ['full', 'summary']")
+    
+    # Mantener el orden de las columnas del modelo y sin duplicados
+    return [field for field in allowed if field == "id" or field in requested]
+
+def column_fields(fields: List[str], computed: Dict[str, str]) -> List[str]:
+    """Columnas a leer para los campos pedidos: los calculados se sustituyen por su columna"""
+    columns = []
+    for field in fields:
+        column = computed.get(field, field)
+        if column not in columns:
+            columns.append(column)
+    return columns
\ No newline at end of file
@@ -0,0 +1,163 @@
+# app/utils/response_cache.py
+"""
+Caché en proceso de las respuestas GET del catálogo (productos y fichas).
+
+Cada entrada guarda el cuerpo sin comprimir y, junto a él, las variantes
+comprimidas que se van pidiendo, de modo que una colección muy consultada
+se comprime una sola vez por codificación. Las entradas caducan pasados
+RESPONSE_CACHE_TTL_SECONDS y se invalidan por etiquetas desde el bus de caché
+(app/utils/cache_bus.py) cuando cualquier worker escribe.
+
+Cada etiqueta tiene un número de versión que sube con cada invalidación; una
+entrada guarda las versiones de sus etiquetas del momento en que empezó a
+leerse y solo es válida mientras coincidan, así que una respuesta leída antes
+de una invalidación nunca se sirve después de ella. Las respuestas leídas de
+una réplica no se guardan: la invalidación llega en cuanto el primario
+confirma, antes de que la réplica tenga el cambio.
+"""
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.db import PRIMARY_PIN_COOKIE, READ_CONSISTENCY_HEADER
+from app.utils.cache_bus import PRODUCTS, AD_SHEETS, product_tag, ad_sheet_tag, cache_bus
+from app.utils.metrics import RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_EVICTIONS
+
+# Rutas cacheables: listados y detalle de productos y fichas
+CACHEABLE_PATH = re.compile(r"^/api/(products|ad-sheets)(?:/([^/]+))?$")
+
+# Rutas que encajan en el patrón pero no se cachean (streaming)
+UNCACHEABLE_PATHS = {"/api/products/changes"}
+
+
+class CachedResponse:
+    """Respuesta guardada: estado, cabeceras, cuerpo y variantes comprimidas"""
+
+    __slots__ = ("status", "headers", "body", "expires_at", "encoded", "versions")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = time.monotonic() + settings.RESPONSE_CACHE_TTL_SECONDS
+        self.encoded: Dict[str, bytes] = {}
+        self.versions: Dict[str, int] = {}
+
+
+class ResponseCache:
+    """LRU de respuestas por ruta y query string con versiones por etiqueta"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._epoch = 0  # Sube al vaciar la caché completa
+        self._lock = threading.Lock()
+
+    def snapshot(self, tags: FrozenSet[str]) -> Dict[str, int]:
+        """Versiones actuales de las etiquetas, para sellar una respuesta antes de leerla"""
+        with self._lock:
+            versions = {tag: self._versions.get(tag, 0) for tag in tags}
+            # La clave vacía guarda la época, que invalida todo al vaciar la caché
+            versions[""] = self._epoch
+            return versions
+
+    def _is_current(self, versions: Dict[str, int]) -> bool:
+        return all(
+            (self._epoch if tag == "" else self._versions.get(tag, 0)) == version
+            for tag, version in versions.items()
+        )
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic() or not self._is_current(entry.versions):
+                del self._entries[key]
+                RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse, versions: Dict[str, int]) -> None:
+        """Guarda la respuesta si sus etiquetas no se invalidaron desde `snapshot`"""
+        with self._lock:
+            if not self._is_current(versions):
+                return
+            entry.versions = versions
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+            RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+    def evict(self, tags: Optional[Set[str]]) -> None:
+        """Invalida las entradas con alguna de las etiquetas (None: todas)"""
+        with self._lock:
+            if tags is None:
+                self._entries.clear()
+                self._epoch += 1
+                RESPONSE_CACHE_EVICTIONS.inc(tag="*")
+            else:
+                for tag in tags:
+                    self._versions[tag] = self._versions.get(tag, 0) + 1
+                    RESPONSE_CACHE_EVICTIONS.inc(tag=tag.split(":", 1)[0])
+                # Liberar ya la memoria de las entradas afectadas
+                stale = [key for key, entry in self._entries.items() if not self._is_current(entry.versions)]
+                for key in stale:
+                    del self._entries[key]
+            RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+    def clear(self) -> None:
+        self.evict(None)
+
+
+response_cache = ResponseCache()
+cache_bus.add_handler(response_cache.evict)
+
+
+def cache_tags(path: str) -> FrozenSet[str]:
+    """
+    Etiquetas de las que depende la respuesta de una ruta cacheable. Las fichas
+    incluyen sus productos, así que también dependen de "products".
+    """
+    match = CACHEABLE_PATH.match(path)
+    collection, item_id = match.group(1), match.group(2)
+    if item_id:
+        # Normalizar el ID para que coincida con las etiquetas que emite el CRUD
+        try:
+            item_id = str(uuid.UUID(item_id))
+        except ValueError:
+            pass
+    if collection == "products":
+        return frozenset({product_tag(item_id)} if item_id else {PRODUCTS})
+    if item_id:
+        return frozenset({ad_sheet_tag(item_id), PRODUCTS})
+    return frozenset({AD_SHEETS, PRODUCTS})
+
+
+def cache_key(scope) -> Optional[str]:
+    """
+    Clave de caché de la petición, o None si no es cacheable. Las peticiones
+    fijadas al primario (read-your-writes o lectura fuerte) no usan la caché.
+    Las cabeceras CORS las añade el middleware exterior en cada respuesta, así
+    que no forman parte de la entrada.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED or scope["method"] != "GET":
+        return None
+    path = scope["path"]
+    if path in UNCACHEABLE_PATHS or not CACHEABLE_PATH.match(path):
+        return None
+
+    headers = dict(scope["headers"])
+    if headers.get(READ_CONSISTENCY_HEADER.encode(), b"").lower() == b"strong":
+        return None
+    if PRIMARY_PIN_COOKIE.encode() + b"=" in headers.get(b"cookie", b""):
+        return None
+
+    query = scope.get("query_string", b"").decode("latin-1")
+    return f"{path}?{query}" if query else path
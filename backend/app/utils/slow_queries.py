@@ -0,0 +1,236 @@
+# app/utils/slow_queries.py
+"""
+Registro de consultas lentas.
+
+Los eventos del engine miden cada sentencia; las que superan
+SLOW_QUERY_THRESHOLD_MS se guardan con la ruta y el identificador de la
+petición que las originó en un búfer circular (expuesto en
+/api/admin/slow-queries) y, si se configura SLOW_QUERY_LOG_FILE, en un log
+rotativo en formato JSON por línea.
+
+Una fracción SLOW_QUERY_EXPLAIN_SAMPLE_RATE de las consultas SELECT lentas se
+explica en segundo plano sobre una conexión aparte: EXPLAIN (ANALYZE, BUFFERS)
+en PostgreSQL solo para las lecturas simples, EXPLAIN sin ejecutar para las que
+llaman a funciones o bloquean filas (EXPLAIN QUERY PLAN en SQLite); los
+recorridos secuenciales del plan se cuentan por tabla.
+"""
+import datetime
+import json
+import logging
+import logging.handlers
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.utils.metrics import current_request_stats, SLOW_QUERIES, SLOW_QUERY_SEQ_SCANS
+
+logger = logging.getLogger(__name__)
+
+# Longitud máxima de la sentencia guardada
+MAX_STATEMENT_LENGTH = 2000
+
+# EXPLAIN pendientes como máximo; por encima se descartan para no acumular carga
+MAX_PENDING_EXPLAINS = 2
+
+# Cláusulas de bloqueo: ANALYZE tomaría los bloqueos de filas
+_LOCKING_CLAUSE = re.compile(r"\bFOR\s+(UPDATE|SHARE|NO\s+KEY\s+UPDATE|KEY\s+SHARE)\b", re.IGNORECASE)
+
+# Llamadas a funciones (nombre seguido de paréntesis)
+_FUNCTION_CALL = re.compile(r"\b([a-z_][\w.]*)\s*\(", re.IGNORECASE)
+
+# Funciones del sistema (pg_advisory_lock, pg_notify...): no se explican nunca
+_SYSTEM_FUNCTION = re.compile(r"\bpg_\w+\s*\(", re.IGNORECASE)
+
+# Palabras clave seguidas de paréntesis y funciones sin efectos secundarios
+_PURE_CALLS = {
+    "select", "from", "join", "on", "in", "exists", "any", "all", "as", "and", "or", "not",
+    "where", "values", "over", "filter", "cast", "count", "sum", "min", "max", "avg",
+    "coalesce", "nullif", "lower", "upper", "length", "abs", "round", "greatest", "least",
+}
+
+# Modos de EXPLAIN según la sentencia
+EXPLAIN_ANALYZE, EXPLAIN_PLAN = "analyze", "plan"
+
+_SEQ_SCAN_PATTERNS = (
+    re.compile(r"Seq Scan on (\w+)"),  # PostgreSQL
+    re.compile(r"^SCAN (?:TABLE )?(\w+)", re.MULTILINE),  # SQLite
+)
+
+
+class SlowQueryLog:
+    """Búfer circular de consultas lentas, con log rotativo opcional"""
+
+    def __init__(self):
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        self._lock = threading.Lock()
+        self._explainer: Optional[ThreadPoolExecutor] = None
+        self._pending_explains = 0
+        self._file_logger: Optional[logging.Logger] = None
+        if settings.SLOW_QUERY_LOG_FILE:
+            handler = logging.handlers.RotatingFileHandler(
+                settings.SLOW_QUERY_LOG_FILE,
+                maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger("slow_queries")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.addHandler(handler)
+
+    def record(self, engine: Engine, statement: str, parameters, elapsed: float, explainable: bool) -> None:
+        stats = current_request_stats()
+        route = stats.current_route() if stats is not None else "background"
+        entry = {
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "duration_ms": round(elapsed * 1000, 2),
+            "route": route,
+            "request_id": stats.request_id if stats is not None else None,
+            "statement": statement[:MAX_STATEMENT_LENGTH],
+            "plan": None,
+            "seq_scans": [],
+        }
+        SLOW_QUERIES.inc(route=route)
+        with self._lock:
+            self._records.append(entry)
+
+        if explainable and self._should_explain(statement):
+            self._schedule_explain(engine, statement, parameters, entry)
+        else:
+            self._write(entry)
+
+    def records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Consultas lentas guardadas, de la más reciente a la más antigua"""
+        with self._lock:
+            records = [dict(entry) for entry in self._records]
+        records.reverse()
+        return records[:limit] if limit else records
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    @staticmethod
+    def _should_explain(statement: str) -> bool:
+        if explain_mode(statement) is None:
+            return False
+        return random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE
+
+    def _schedule_explain(self, engine: Engine, statement: str, parameters, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._pending_explains >= MAX_PENDING_EXPLAINS:
+                skip = True
+            else:
+                skip = False
+                self._pending_explains += 1
+                if self._explainer is None:
+                    self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+        if skip:
+            self._write(entry)
+            return
+        self._explainer.submit(self._explain, engine, statement, parameters, entry)
+
+    def _explain(self, engine: Engine, statement: str, parameters, entry: Dict[str, Any]) -> None:
+        try:
+            plan = explain(engine, statement, parameters, analyze=explain_mode(statement) == EXPLAIN_ANALYZE)
+            seq_scans = sorted({table for pattern in _SEQ_SCAN_PATTERNS for table in pattern.findall(plan)})
+            for table in seq_scans:
+                SLOW_QUERY_SEQ_SCANS.inc(table=table)
+            with self._lock:
+                entry["plan"] = plan
+                entry["seq_scans"] = seq_scans
+        except Exception as e:
+            with self._lock:
+                entry["plan"] = f"EXPLAIN falló: {e}"
+        finally:
+            with self._lock:
+                self._pending_explains -= 1
+            self._write(entry)
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(entry, default=str))
+        else:
+            logger.warning(
+                "Consulta lenta (%.1f ms) en %s [%s]: %s",
+                entry["duration_ms"], entry["route"], entry["request_id"], entry["statement"][:200],
+            )
+
+    def shutdown(self) -> None:
+        if self._explainer is not None:
+            self._explainer.shutdown(wait=False, cancel_futures=True)
+            self._explainer = None
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain_mode(statement: str) -> Optional[str]:
+    """
+    Cómo se puede explicar una sentencia: EXPLAIN ANALYZE la vuelve a ejecutar,
+    así que solo se usa con los SELECT sin llamadas a funciones ni bloqueos;
+    el resto de SELECT se explican sin ejecutarse. None: no se explica.
+    """
+    if not statement.lstrip().upper().startswith("SELECT") or _SYSTEM_FUNCTION.search(statement):
+        return None
+    if _LOCKING_CLAUSE.search(statement):
+        return EXPLAIN_PLAN
+    if any(name.lower() not in _PURE_CALLS for name in _FUNCTION_CALL.findall(statement)):
+        return EXPLAIN_PLAN
+    return EXPLAIN_ANALYZE
+
+
+def explain(engine: Engine, statement: str, parameters, analyze: bool = False) -> str:
+    """
+    Plan de ejecución de la sentencia en una conexión DBAPI aparte (sin pasar
+    por los eventos del engine). En PostgreSQL, con `analyze` se ejecuta con
+    ANALYZE dentro de una transacción que se deshace y con statement_timeout
+    acotado.
+    """
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        try:
+            if engine.dialect.name == "postgresql":
+                cursor.execute(f"SET LOCAL statement_timeout = {int(settings.SLOW_QUERY_EXPLAIN_TIMEOUT_MS)}")
+                cursor.execute(("EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN ") + statement, parameters)
+            elif engine.dialect.name == "sqlite":
+                cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            else:
+                return "EXPLAIN no soportado para " + engine.dialect.name
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            raw.rollback()
+    finally:
+        raw.close()
+
+    if engine.dialect.name == "sqlite":
+        # Filas (id, parent, notused, detail)
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+
+def instrument_slow_queries(engine: Engine) -> None:
+    """Registra los eventos del engine que detectan las consultas lentas"""
+    if settings.SLOW_QUERY_THRESHOLD_MS < 0:
+        return
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000.0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["slow_query_start"].pop()
+        if elapsed >= threshold:
+            slow_query_log.record(engine, statement, parameters, elapsed, explainable=not executemany)
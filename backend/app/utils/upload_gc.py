@@ -0,0 +1,174 @@
+# app/utils/upload_gc.py
+"""
+Limpieza de archivos subidos que ya no referencia ningún producto.
+
+Las rutas de escritura ya no borran fotos dentro de la transacción: la foto
+sustituida o la de un producto eliminado queda huérfana y este barrido la
+elimina después (con su miniatura), en un hilo de fondo. El almacenamiento se
+recorre en lotes de UPLOAD_GC_BATCH_SIZE objetos, comprobando cada lote contra
+Product.foto, y solo se borran objetos con más antigüedad que la validez del
+ticket de subida más UPLOAD_GC_GRACE_SECONDS, para no tocar subidas cuyo
+producto todavía no se ha confirmado (confirm_upload rechaza las que ya se
+acercan a ese plazo).
+Solo se consideran las claves con el formato que genera la API, así que otros
+objetos de un bucket compartido no se tocan nunca, y cada objeto se vuelve a
+comprobar contra la base de datos justo antes de borrarlo.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import get_engine, SessionLocal
+from app.crud import product as product_crud
+from app.utils.file_handlers import (
+    Storage, StoredObject, get_storage, is_upload_key, thumbnail_key, upload_retention_seconds,
+)
+from app.utils.metrics import (
+    UPLOAD_GC_RUNS, UPLOAD_GC_DELETED_FILES, UPLOAD_GC_RECLAIMED_BYTES, UPLOAD_GC_DURATION,
+)
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que evita barridos simultáneos de varios workers
+ADVISORY_LOCK_KEY = 0x75706C6F6164  # "upload"
+
+
+def _iter_candidates(storage: Storage, cutoff: float) -> Iterator[List[StoredObject]]:
+    """Lotes de imágenes originales subidas por la API y modificadas antes de `cutoff`"""
+    batch: List[StoredObject] = []
+    for stored in storage.list_objects():
+        # Las miniaturas y los objetos ajenos a la API no tienen el formato de clave
+        if not is_upload_key(stored.key) or stored.modified >= cutoff:
+            continue
+        batch.append(stored)
+        if len(batch) >= settings.UPLOAD_GC_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _remove(db: Session, storage: Storage, stored: StoredObject, cutoff: float) -> Optional[int]:
+    """Elimina el objeto y su miniatura; devuelve los bytes liberados o None si se conserva"""
+    # Volver a comprobar la fecha: el objeto pudo reemplazarse durante el barrido
+    current = storage.stat(stored.key)
+    if current is None or current.modified >= cutoff:
+        return None
+    # Y la referencia: la foto pudo asignarse a un producto después de leer el lote
+    referenced = product_crud.get_referenced_photos(db, [stored.key])
+    db.rollback()
+    if referenced:
+        return None
+    reclaimed = current.size
+    storage.delete(stored.key)
+    thumbnail = storage.stat(thumbnail_key(stored.key))
+    if thumbnail is not None:
+        storage.delete(thumbnail.key)
+        reclaimed += thumbnail.size
+    UPLOAD_GC_DELETED_FILES.inc()
+    UPLOAD_GC_RECLAIMED_BYTES.inc(reclaimed)
+    return reclaimed
+
+
+def sweep_uploads() -> Dict[str, int]:
+    """Elimina las imágenes huérfanas del almacenamiento y devuelve un resumen del barrido"""
+    summary = {"scanned": 0, "deleted": 0, "reclaimed_bytes": 0}
+    storage = get_storage()
+    cutoff = time.time() - upload_retention_seconds()
+    with SessionLocal(bind=get_engine()) as db:
+        for batch in _iter_candidates(storage, cutoff):
+            summary["scanned"] += len(batch)
+            referenced = product_crud.get_referenced_photos(db, (stored.key for stored in batch))
+            # No mantener abierta la transacción mientras se borra
+            db.rollback()
+            for stored in batch:
+                if stored.key in referenced:
+                    continue
+                reclaimed = _remove(db, storage, stored, cutoff)
+                if reclaimed is not None:
+                    summary["deleted"] += 1
+                    summary["reclaimed_bytes"] += reclaimed
+    return summary
+
+
+class UploadSweeper:
+    """Hilo de fondo que ejecuta sweep_uploads cada UPLOAD_GC_INTERVAL_SECONDS"""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if not settings.UPLOAD_GC_ENABLED or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="upload-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        # El primer barrido espera un intervalo para no cargar el arranque
+        while not self._stop.wait(settings.UPLOAD_GC_INTERVAL_SECONDS):
+            self.run_once()
+
+    def run_once(self) -> None:
+        start = time.perf_counter()
+        try:
+            with _AdvisoryLock(get_engine()) as acquired:
+                if not acquired:
+                    UPLOAD_GC_RUNS.inc(result="skipped")
+                    return
+                summary = sweep_uploads()
+        except Exception:
+            UPLOAD_GC_RUNS.inc(result="error")
+            logger.exception("Error en la limpieza de uploads huérfanos")
+            return
+        UPLOAD_GC_RUNS.inc(result="ok")
+        UPLOAD_GC_DURATION.observe(time.perf_counter() - start)
+        if summary["deleted"]:
+            logger.info(
+                "Limpieza de uploads: %d archivos eliminados (%d bytes) de %d revisados",
+                summary["deleted"], summary["reclaimed_bytes"], summary["scanned"],
+            )
+
+
+class _AdvisoryLock:
+    """En PostgreSQL, solo un worker barre a la vez (advisory lock de sesión)"""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self._connection = None
+        self._acquired = False
+
+    def __enter__(self) -> bool:
+        if self._engine.dialect.name != "postgresql":
+            return True
+        self._connection = self._engine.connect()
+        self._acquired = bool(self._connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+        ).scalar())
+        self._connection.commit()
+        return self._acquired
+
+    def __exit__(self, *exc_info) -> None:
+        if self._connection is not None:
+            try:
+                if self._acquired:
+                    self._connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                    self._connection.commit()
+            finally:
+                self._connection.close()
+                self._connection = None
+
+
+upload_sweeper = UploadSweeper()
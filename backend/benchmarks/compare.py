@@ -0,0 +1,67 @@
+# benchmarks/compare.py
+"""
+Compara dos reportes de benchmarks/run.py y marca regresiones.
+
+Uso (desde backend/):
+    python -m benchmarks.compare base.json nuevo.json --threshold 10
+
+Sale con código 1 si algún escenario empeora su p95 o su rendimiento por
+encima del umbral (en porcentaje).
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+METRICS = [("p50_ms", "lower"), ("p95_ms", "lower"), ("p99_ms", "lower"), ("throughput_rps", "higher")]
+GATED = {"p95_ms", "throughput_rps"}
+
+
+def load(path: str) -> Dict:
+    with open(path) as buffer:
+        return json.load(buffer)
+
+
+def change_pct(base: float, new: float) -> float:
+    if base == 0:
+        return 0.0
+    return (new - base) / base * 100.0
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> List[str]:
+    """Imprime la tabla comparativa y devuelve la lista de regresiones"""
+    regressions = []
+    print(f"base:  {base['meta'].get('commit')}  ({base['meta'].get('timestamp')})")
+    print(f"nuevo: {new['meta'].get('commit')}  ({new['meta'].get('timestamp')})")
+    print(f"{'escenario':>20} {'métrica':>15} {'base':>12} {'nuevo':>12} {'cambio':>9}")
+
+    for scenario, base_result in base["results"].items():
+        new_result = new["results"].get(scenario)
+        if new_result is None:
+            continue
+        for metric, better in METRICS:
+            delta = change_pct(base_result[metric], new_result[metric])
+            worse = delta > threshold if better == "lower" else delta < -threshold
+            flag = " !" if worse and metric in GATED else ""
+            print(f"{scenario:>20} {metric:>15} {base_result[metric]:>12} {new_result[metric]:>12} {delta:>+8.1f}%{flag}")
+            if flag:
+                regressions.append(f"{scenario}.{metric} {delta:+.1f}%")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Comparar resultados de benchmarks")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Umbral de regresión en porcentaje")
+    args = parser.parse_args(argv)
+
+    regressions = compare(load(args.base), load(args.new), args.threshold)
+    if regressions:
+        print("\nRegresiones: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
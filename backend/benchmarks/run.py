@@ -0,0 +1,324 @@
+# benchmarks/run.py
+"""
+Benchmark y prueba de carga de la API.
+
+Siembra un catálogo sintético en una base de datos local (SQLite temporal por
+defecto, o PostgreSQL con --database-url), ejecuta la aplicación en proceso o
+sobre HTTP y reporta rendimiento y percentiles p50/p95/p99 por escenario en JSON.
+
+Uso (desde backend/):
+    python -m benchmarks.run --products 2000 --requests 500 --concurrency 16 --output results.json
+    python -m benchmarks.run --mode http
+    python -m benchmarks.run --mode http --base-url http://localhost:8000 --skip-seed
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+SCENARIOS = [
+    "list", "list_summary", "get", "search", "list_ad_sheets", "list_ad_sheets_summary",
+    "get_ad_sheet", "create_with_upload", "create_ad_sheet",
+]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de la API de productos")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess",
+                        help="Ejecutar la app en proceso (ASGI) o sobre HTTP con uvicorn")
+    parser.add_argument("--base-url", default=None,
+                        help="URL de un servidor ya levantado (solo en modo http)")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de datos a usar; por defecto un SQLite temporal")
+    parser.add_argument("--products", type=int, default=1000, help="Productos sintéticos a sembrar")
+    parser.add_argument("--ad-sheets", type=int, default=100, help="Fichas sintéticas a sembrar")
+    parser.add_argument("--extra-fields", type=int, default=10, help="Campos extra en caracteristicas")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Peticiones concurrentes")
+    parser.add_argument("--warmup", type=int, default=10, help="Peticiones de calentamiento por escenario")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Latencia simulada (s) del LLM stub en la creación de fichas")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Escenarios a ejecutar, separados por comas")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del generador")
+    parser.add_argument("--skip-seed", action="store_true", help="No sembrar datos (usar los existentes)")
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    total = len(values) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    make_request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    warmup: int,
+) -> Dict[str, Any]:
+    """Ejecuta un escenario con concurrencia fija y devuelve su resumen"""
+    for index in range(warmup):
+        await make_request(client, index)
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            start = time.perf_counter()
+            try:
+                response = await make_request(client, index)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def build_scenarios(product_ids: List[str], ad_sheet_ids: List[str], seed: int) -> Dict[str, Callable]:
+    from benchmarks.seed import make_image_bytes
+
+    rng = random.Random(seed)
+    image_bytes = make_image_bytes()
+    platforms = {"facebook": "basic", "whatsapp": "detailed", "revolico": "basic"}
+
+    async def list_products(client, index):
+        return await client.get("/api/products")
+
+    async def list_products_summary(client, index):
+        return await client.get("/api/products", params={"view": "summary"})
+
+    async def get_product(client, index):
+        return await client.get(f"/api/products/{rng.choice(product_ids)}")
+
+    async def search_products(client, index):
+        # No hay búsqueda de texto; el filtro por disponibilidad es la consulta filtrada disponible
+        return await client.get("/api/products", params={"disponible": "true"})
+
+    async def list_ad_sheets(client, index):
+        return await client.get("/api/ad-sheets", params={"platform": rng.choice(list(platforms))})
+
+    async def list_ad_sheets_summary(client, index):
+        return await client.get("/api/ad-sheets", params={"platform": rng.choice(list(platforms)), "view": "summary"})
+
+    async def get_ad_sheet(client, index):
+        return await client.get(f"/api/ad-sheets/{rng.choice(ad_sheet_ids)}")
+
+    async def create_with_upload(client, index):
+        return await client.post(
+            "/api/products",
+            data={
+                "nombre": f"Producto benchmark {index}",
+                "precio": "19.99",
+                "color": "azul",
+                "talla": "M",
+                "caracteristicas": json.dumps({"material": "algodón", "indice": index}),
+            },
+            files={"foto": (f"bench-{index}.png", image_bytes, "image/png")},
+        )
+
+    async def create_ad_sheet(client, index):
+        platform_name = rng.choice(list(platforms))
+        return await client.post("/api/ad-sheets", json={
+            "title": f"Ficha benchmark {index}",
+            "platform": platform_name,
+            "template": platforms[platform_name],
+            "product_ids": rng.sample(product_ids, min(3, len(product_ids))),
+        })
+
+    scenarios = {
+        "list": list_products,
+        "list_summary": list_products_summary,
+        "get": get_product,
+        "search": search_products,
+        "list_ad_sheets": list_ad_sheets,
+        "list_ad_sheets_summary": list_ad_sheets_summary,
+        "get_ad_sheet": get_ad_sheet,
+        "create_with_upload": create_with_upload,
+        "create_ad_sheet": create_ad_sheet,
+    }
+    if not product_ids:
+        for name in ("get", "create_ad_sheet"):
+            scenarios.pop(name)
+    if not ad_sheet_ids:
+        scenarios.pop("get_ad_sheet")
+    return scenarios
+
+
+def install_llm_stub(latency: float) -> None:
+    """Sustituye la generación con LLM por un stub determinista"""
+    from app.crud import ad_sheet as ad_sheet_crud
+
+    async def fake_generate(products, platform_name, template):
+        if latency:
+            await asyncio.sleep(latency)
+        lines = [f"# Ficha para {platform_name} ({template})", ""]
+        lines.extend(f"- **{product.nombre}**: ${float(product.precio):.2f}" for product in products)
+        return "\n".join(lines)
+
+    ad_sheet_crud.generate_ad_sheet_content = fake_generate
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(app) -> tuple:
+    """Levanta uvicorn en un hilo aparte y devuelve (servidor, hilo, url)"""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+async def collect_ids(client: httpx.AsyncClient) -> tuple:
+    products = (await client.get("/api/products")).json()
+    ad_sheets = (await client.get("/api/ad-sheets")).json()
+    return [item["id"] for item in products], [item["id"] for item in ad_sheets]
+
+
+async def run_all(args: argparse.Namespace, client: httpx.AsyncClient) -> Dict[str, Any]:
+    product_ids, ad_sheet_ids = await collect_ids(client)
+    scenarios = build_scenarios(product_ids, ad_sheet_ids, args.seed)
+    selected = [name for name in args.scenarios.split(",") if name in scenarios]
+
+    results = {}
+    for name in selected:
+        results[name] = await run_scenario(client, scenarios[name], args.requests, args.concurrency, args.warmup)
+        print(f"{name:>20}: {results[name]['throughput_rps']:>9} req/s  "
+              f"p50 {results[name]['p50_ms']:>8} ms  p95 {results[name]['p95_ms']:>8} ms  "
+              f"p99 {results[name]['p99_ms']:>8} ms  errores {results[name]['errors']}", file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    external = args.mode == "http" and args.base_url
+
+    if not external:
+        # Configurar la base de datos y el directorio de uploads antes de importar la app
+        workdir = tempfile.mkdtemp(prefix="products-bench-")
+        os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ.setdefault("UPLOAD_DIR", os.path.join(workdir, "uploads"))
+
+        from app.db import Base, get_engine, SessionLocal
+        from benchmarks.seed import seed_catalog
+        import main as app_main
+
+        # Base temporal del benchmark: se crea el esquema directamente, sin Alembic
+        Base.metadata.create_all(bind=get_engine())
+        install_llm_stub(args.llm_latency)
+
+        if not args.skip_seed:
+            with SessionLocal() as db:
+                seed_catalog(db, products=args.products, ad_sheets=args.ad_sheets,
+                             extra_fields=args.extra_fields, seed=args.seed)
+
+    async def execute():
+        if args.mode == "inprocess":
+            transport = httpx.ASGITransport(app=app_main.app)
+            async with app_main.app.router.lifespan_context(app_main.app):
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    return await run_all(args, client)
+
+        server = None
+        base_url = args.base_url
+        if not external:
+            server, thread, base_url = start_uvicorn(app_main.app)
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=60.0) as client:
+                return await run_all(args, client)
+        finally:
+            if server is not None:
+                server.should_exit = True
+                thread.join()
+
+    results = asyncio.run(execute())
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "database": "external" if external else os.environ["DATABASE_URL"].split(":", 1)[0],
+            "params": {
+                "products": args.products,
+                "ad_sheets": args.ad_sheets,
+                "extra_fields": args.extra_fields,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "llm_latency": args.llm_latency,
+                "seed": args.seed,
+            },
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as buffer:
+            buffer.write(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# benchmarks/seed.py
+"""
+Genera un catálogo sintético reproducible (productos con características,
+fotos y fichas publicitarias) para los benchmarks.
+"""
+import io
+import os
+import random
+import uuid
+from decimal import Decimal
+from typing import List, Optional
+
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.product import Product
+from app.models.ad_sheet import AdSheet
+
+NOMBRES = ["Camisa", "Pantalón", "Vestido", "Zapatos", "Bolso", "Gorra", "Chaqueta", "Falda", "Blusa", "Short"]
+COLORES = ["rojo", "azul", "negro", "blanco", "verde", "amarillo", "gris", None]
+TALLAS = ["XS", "S", "M", "L", "XL", None]
+MATERIALES = ["algodón", "poliéster", "cuero", "lino", "seda", "mezclilla"]
+
+
+def make_image_bytes(size: int = 64, color=(200, 80, 80), fmt: str = "PNG") -> bytes:
+    """Genera una imagen pequeña en memoria"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_caracteristicas(rng: random.Random, extra_fields: int) -> dict:
+    """Genera un diccionario de características con tamaño configurable"""
+    caracteristicas = {
+        "material": rng.choice(MATERIALES),
+        "temporada": rng.choice(["verano", "invierno", "todo el año"]),
+        "descripcion": " ".join(rng.choice(NOMBRES).lower() for _ in range(rng.randint(5, 20))),
+    }
+    for index in range(extra_fields):
+        caracteristicas[f"atributo_{index}"] = rng.randint(0, 1000)
+    return caracteristicas
+
+
+def seed_catalog(
+    db: Session,
+    products: int = 1000,
+    ad_sheets: int = 100,
+    products_per_sheet: int = 3,
+    photo_ratio: float = 0.5,
+    extra_fields: int = 10,
+    seed: int = 42,
+    upload_dir: Optional[str] = None,
+) -> List[uuid.UUID]:
+    """
+    Inserta el catálogo sintético y devuelve los IDs de los productos creados
+
+    Las fotos se escriben en el directorio de uploads para que también se
+    puedan medir las rutas estáticas.
+    """
+    rng = random.Random(seed)
+    upload_dir = upload_dir or settings.UPLOAD_DIR
+    os.makedirs(upload_dir, exist_ok=True)
+    image_bytes = make_image_bytes()
+
+    product_ids = []
+    batch = []
+    for _ in range(products):
+        foto = None
+        if rng.random() < photo_ratio:
+            foto = f"{uuid.UUID(int=rng.getrandbits(128))}.png"
+            with open(os.path.join(upload_dir, foto), "wb") as buffer:
+                buffer.write(image_bytes)
+
+        product = Product(
+            id=uuid.UUID(int=rng.getrandbits(128)),
+            nombre=f"{rng.choice(NOMBRES)} {rng.randint(1, 9999)}",
+            precio=Decimal(rng.randint(100, 100000)) / 100,
+            color=rng.choice(COLORES),
+            talla=rng.choice(TALLAS),
+            caracteristicas=make_caracteristicas(rng, extra_fields),
+            foto=foto,
+            disponible=rng.random() < 0.8,
+        )
+        product_ids.append(product.id)
+        batch.append(product)
+
+        if len(batch) >= 500:
+            db.add_all(batch)
+            db.flush()
+            batch = []
+
+    db.add_all(batch)
+    db.flush()
+
+    platforms = list(settings.AD_TEMPLATES.keys())
+    for index in range(ad_sheets):
+        platform = rng.choice(platforms)
+        linked = rng.sample(product_ids, min(products_per_sheet, len(product_ids)))
+        db.add(AdSheet(
+            title=f"Ficha {index}",
+            platform=platform,
+            template=rng.choice(settings.AD_TEMPLATES[platform]),
+            content="# Ficha sintética\n\n" + "Texto de ejemplo. " * rng.randint(20, 200),
+            meta_info={"seed": seed},
+            products=db.query(Product).filter(Product.id.in_(linked)).all(),
+        ))
+
+    db.commit()
+    return product_ids
@@ -1,25 +1,73 @@
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import text
+from contextlib import asynccontextmanager
+import logging
 import os
 from app.config import settings
-from app.routes import product_router, ad_sheet_router
-from app.db import Base, engine  # Importamos Base y engine para crear las tablas
+from app.routes import product_router, ad_sheet_router, change_feed_router, upload_router, admin_router
+from app.db import get_engine, dispose_engine
+from app.utils.llm_generator import get_http_client, close_http_client
+from app.utils.change_feed import change_feed
+from app.utils.upload_gc import upload_sweeper
+from app.utils.cache_bus import cache_bus
+from app.utils.slow_queries import slow_query_log
+from app.utils.file_handlers import shutdown_thumbnails
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.compression import CompressionMiddleware
+from app.utils.admission import AdmissionMiddleware
+from app.utils.metrics import MetricsMiddleware, registry, update_pool_metrics, CONTENT_TYPE_LATEST
 
-# Crear las tablas en la base de datos
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-# Crear directorios si no existen
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+# El esquema de la base de datos se gestiona con Alembic (alembic upgrade head);
+# importar este módulo no debe tener efectos secundarios.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crear los recursos compartidos al arrancar y liberarlos al apagar"""
+    # Crear directorios si no existen
+    if settings.STORAGE_BACKEND == "local":
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    
+    get_engine()
+    get_http_client()
+    upload_sweeper.start()
+    cache_bus.start()
+    
+    yield
+    
+    upload_sweeper.stop()
+    shutdown_thumbnails()
+    cache_bus.stop()
+    slow_query_log.shutdown()
+    change_feed.stop()
+    await close_http_client()
+    dispose_engine()
 
 # Inicializar la aplicación FastAPI
 app = FastAPI(
     title="API de Gestión de Productos",
     description="API para gestionar productos con operaciones CRUD completas",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Configurar CORS
+# Idempotency-Key en las rutas de creación
+app.add_middleware(IdempotencyMiddleware)
+
+# Compresión negociada (gzip/br/zstd) y caché de las respuestas GET del catálogo
+app.add_middleware(CompressionMiddleware)
+
+# Control de admisión: límites de concurrencia por grupo de rutas (503 + Retry-After)
+app.add_middleware(AdmissionMiddleware)
+
+# Métricas por petición (latencia, peticiones en curso, consultas SQL)
+app.add_middleware(MetricsMiddleware)
+
+# Configurar CORS (se añade el último para envolver a los demás: los 503 de
+# admisión y las respuestas de idempotencia también llevan sus cabeceras)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # En producción, limita a los dominios permitidos
@@ -28,17 +76,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Montar archivos estáticos para las imágenes subidas
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+# Montar archivos estáticos para las imágenes subidas al almacenamiento local
+# (el directorio se crea en el arranque, por eso no se comprueba aquí)
+if settings.STORAGE_BACKEND == "local":
+    app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR, check_dir=False), name="uploads")
 
-# Incluir rutas
+# Incluir rutas (el feed de cambios va antes para que /products/changes no se tome como un ID)
+app.include_router(change_feed_router.router, prefix="/api")
 app.include_router(product_router.router, prefix="/api")
 app.include_router(ad_sheet_router.router, prefix="/api")
+app.include_router(upload_router.router, prefix="/api")
+app.include_router(admin_router.router, prefix="/api")
 # Ruta de health check
 @app.get("/health")
 async def health_check():
     return {"status": "OK"}
 
+# Ruta de readiness: comprueba que la base de datos responde
+@app.get("/ready")
+def readiness_check():
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except Exception:
+        # El detalle (host, usuario, base de datos) solo va al log del servidor
+        logger.exception("La base de datos no responde")
+        return JSONResponse(status_code=503, content={"status": "UNAVAILABLE"})
+    return {"status": "OK", "database": "OK"}
+
+# Métricas en formato Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    update_pool_metrics(get_engine())
+    return Response(content=registry.render(), media_type=CONTENT_TYPE_LATEST)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -16,8 +16,9 @@ from app.config import settings
 
 # Asegurarnos de importar todos los modelos para que Alembic los detecte
 from app.models import product  # Esto importará el modelo Product
-# Si tienes el archivo ad_sheet.py creado, descomenta la siguiente línea:
-# from app.models import ad_sheet  # Esto importará el modelo AdSheet
+from app.models import ad_sheet  # Esto importará el modelo AdSheet
+from app.models import product_event  # Esto importará el modelo ProductEvent
+from app.models import idempotency_key  # Esto importará el modelo IdempotencyKey
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,36 @@
+"""Replace the boolean partial index with a partial index of unavailable products
+
+Revision ID: a3d7e5c9b218
+Revises: f1c4b8d2a7e6
+Create Date: 2026-10-19 19:12:44.208153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d7e5c9b218'
+down_revision: Union[str, None] = 'f1c4b8d2a7e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_products_disponible', table_name='products')
+    op.create_index(
+        'ix_products_no_disponible_precio', 'products', ['precio'],
+        unique=False, postgresql_where=sa.text('NOT disponible'), sqlite_where=sa.text('disponible = 0')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_no_disponible_precio', table_name='products')
+    op.create_index(
+        'ix_products_disponible', 'products', ['disponible'],
+        unique=False, postgresql_where=sa.text('disponible'), sqlite_where=sa.text('disponible')
+    )
@@ -0,0 +1,30 @@
+"""Add the thumbnail key to products
+
+Revision ID: b4e9d2f6a1c3
+Revises: a3d7e5c9b218
+Create Date: 2026-10-19 21:05:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e9d2f6a1c3'
+down_revision: Union[str, None] = 'a3d7e5c9b218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las fotos existentes quedan sin miniatura (thumbnail_url nulo) hasta que se
+    # vuelvan a subir
+    op.add_column('products', sa.Column('thumbnail', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'thumbnail')
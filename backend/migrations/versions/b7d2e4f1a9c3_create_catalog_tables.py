@@ -0,0 +1,75 @@
+"""Create catalog tables
+
+Revision ID: b7d2e4f1a9c3
+Revises: 5c86a37ab91f
+Create Date: 2026-10-19 09:12:03.481220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4f1a9c3'
+down_revision: Union[str, None] = '5c86a37ab91f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las bases existentes se crearon con Base.metadata.create_all al importar main.py,
+    # así que solo se crea lo que falte.
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if 'products' not in tables:
+        op.create_table(
+            'products',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('nombre', sa.String(), nullable=False),
+            sa.Column('precio', sa.Numeric(10, 2), nullable=False),
+            sa.Column('color', sa.String(), nullable=True),
+            sa.Column('talla', sa.String(), nullable=True),
+            sa.Column('caracteristicas', sa.JSON(), nullable=True),
+            sa.Column('foto', sa.String(), nullable=True),
+            sa.Column('disponible', sa.Boolean(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'ad_sheets' not in tables:
+        op.create_table(
+            'ad_sheets',
+            sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('title', sa.String(), nullable=False),
+            sa.Column('platform', sa.String(), nullable=False),
+            sa.Column('template', sa.String(), nullable=False),
+            sa.Column('content', sa.String(), nullable=False),
+            sa.Column('meta_info', sa.JSON(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+    elif 'created_at' not in [column['name'] for column in inspector.get_columns('ad_sheets')]:
+        op.add_column(
+            'ad_sheets',
+            sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False)
+        )
+
+    if 'ad_sheet_product' not in tables:
+        op.create_table(
+            'ad_sheet_product',
+            sa.Column('ad_sheet_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['ad_sheet_id'], ['ad_sheets.id']),
+            sa.ForeignKeyConstraint(['product_id'], ['products.id'])
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ad_sheet_product')
+    op.drop_table('ad_sheets')
+    op.drop_table('products')
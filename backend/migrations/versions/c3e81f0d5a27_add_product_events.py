@@ -0,0 +1,39 @@
+"""Add product_events change feed table
+
+Revision ID: c3e81f0d5a27
+Revises: b7d2e4f1a9c3
+Create Date: 2026-10-19 11:40:27.915304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e81f0d5a27'
+down_revision: Union[str, None] = 'b7d2e4f1a9c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'product_events',
+        sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+        sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('disponible', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('seq')
+    )
+    op.create_index(op.f('ix_product_events_created_at'), 'product_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_product_events_created_at'), table_name='product_events')
+    op.drop_table('product_events')
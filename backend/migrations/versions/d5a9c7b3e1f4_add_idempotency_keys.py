@@ -0,0 +1,41 @@
+"""Add idempotency_keys table
+
+Revision ID: d5a9c7b3e1f4
+Revises: c3e81f0d5a27
+Create Date: 2026-10-19 14:05:51.230117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5a9c7b3e1f4'
+down_revision: Union[str, None] = 'c3e81f0d5a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(length=255), nullable=False),
+        sa.Column('fingerprint', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('response_status', sa.Integer(), nullable=True),
+        sa.Column('response_headers', sa.JSON(), nullable=True),
+        sa.Column('response_body', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_idempotency_keys_expires_at'), 'idempotency_keys', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_idempotency_keys_expires_at'), table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
@@ -0,0 +1,79 @@
+"""Harden ad_sheet_product and add catalog indexes
+
+Revision ID: e8f2a6c4b913
+Revises: d5a9c7b3e1f4
+Create Date: 2026-10-19 16:42:17.904531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8f2a6c4b913'
+down_revision: Union[str, None] = 'd5a9c7b3e1f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_association_table(name: str, hardened: bool) -> None:
+    if hardened:
+        op.create_table(
+            name,
+            sa.Column('ad_sheet_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=False),
+            sa.ForeignKeyConstraint(['ad_sheet_id'], ['ad_sheets.id'], name='fk_ad_sheet_product_ad_sheet_id', ondelete='CASCADE'),
+            sa.ForeignKeyConstraint(['product_id'], ['products.id'], name='fk_ad_sheet_product_product_id', ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('ad_sheet_id', 'product_id', name='pk_ad_sheet_product')
+        )
+    else:
+        op.create_table(
+            name,
+            sa.Column('ad_sheet_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.Column('product_id', postgresql.UUID(as_uuid=True), nullable=True),
+            sa.ForeignKeyConstraint(['ad_sheet_id'], ['ad_sheets.id']),
+            sa.ForeignKeyConstraint(['product_id'], ['products.id'])
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # La tabla de asociación no tenía clave primaria: se reconstruye sin filas
+    # duplicadas ni nulas, con PK compuesta y borrado en cascada
+    _create_association_table('ad_sheet_product_new', hardened=True)
+    op.execute(
+        "INSERT INTO ad_sheet_product_new (ad_sheet_id, product_id) "
+        "SELECT DISTINCT ad_sheet_id, product_id FROM ad_sheet_product "
+        "WHERE ad_sheet_id IS NOT NULL AND product_id IS NOT NULL"
+    )
+    op.drop_table('ad_sheet_product')
+    op.rename_table('ad_sheet_product_new', 'ad_sheet_product')
+
+    # La PK cubre las búsquedas por ficha; este índice, las fichas de un producto
+    op.create_index('ix_ad_sheet_product_product_id', 'ad_sheet_product', ['product_id'], unique=False)
+    op.create_index(op.f('ix_ad_sheets_platform'), 'ad_sheets', ['platform'], unique=False)
+    op.create_index(op.f('ix_products_precio'), 'products', ['precio'], unique=False)
+    # Índice parcial: solo los productos disponibles, que son los que se filtran
+    op.create_index(
+        'ix_products_disponible', 'products', ['disponible'], unique=False,
+        postgresql_where=sa.text('disponible'), sqlite_where=sa.text('disponible')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_disponible', table_name='products')
+    op.drop_index(op.f('ix_products_precio'), table_name='products')
+    op.drop_index(op.f('ix_ad_sheets_platform'), table_name='ad_sheets')
+    op.drop_index('ix_ad_sheet_product_product_id', table_name='ad_sheet_product')
+
+    _create_association_table('ad_sheet_product_old', hardened=False)
+    op.execute(
+        "INSERT INTO ad_sheet_product_old (ad_sheet_id, product_id) "
+        "SELECT ad_sheet_id, product_id FROM ad_sheet_product"
+    )
+    op.drop_table('ad_sheet_product')
+    op.rename_table('ad_sheet_product_old', 'ad_sheet_product')
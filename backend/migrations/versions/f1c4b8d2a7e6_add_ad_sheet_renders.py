@@ -0,0 +1,30 @@
+"""Add pre-rendered formats to ad_sheets
+
+Revision ID: f1c4b8d2a7e6
+Revises: e8f2a6c4b913
+Create Date: 2026-10-19 18:27:03.415862
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c4b8d2a7e6'
+down_revision: Union[str, None] = 'e8f2a6c4b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sin relleno: las fichas existentes se convierten en su primera lectura y se
+    # guardan en el primario (save_ad_sheet_renders)
+    op.add_column('ad_sheets', sa.Column('renders', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ad_sheets', 'renders')
@@ -0,0 +1,59 @@
+# tests/conftest.py
+import os
+import tempfile
+
+# La configuración se lee al importar app.config: usar una base SQLite temporal
+_DB_DIR = tempfile.mkdtemp(prefix="products-app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_DB_DIR, "uploads"))
+os.environ.setdefault("SLOW_QUERY_THRESHOLD_MS", "-1")
+
+import pytest
+
+from app import db as db_module
+from app.config import settings
+from app.db import Base, SessionLocal, get_engine
+import app.models  # noqa: F401  (registrar las tablas)
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre una base SQLite vacía"""
+    engine = get_engine()
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(db):
+    """Cliente HTTP de la aplicación (con su lifespan) sobre la base de `db`"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def replicas(monkeypatch, tmp_path):
+    """Configura réplicas SQLite; los nombres None son réplicas que no conectan"""
+    def configure(*names):
+        urls = [
+            f"sqlite:///{tmp_path / name}.db" if name else f"sqlite:///{tmp_path}/missing/replica.db"
+            for name in names
+        ]
+        monkeypatch.setattr(settings, "DATABASE_REPLICA_URLS", ",".join(urls))
+        monkeypatch.setattr(db_module, "_replica_engines", None)
+        monkeypatch.setattr(db_module, "_replica_cycle", None)
+        db_module._replica_down_until.clear()
+        return db_module.get_replica_engines()
+
+    yield configure
+    for engine in db_module._replica_engines or []:
+        engine.dispose()
+    db_module._replica_down_until.clear()
@@ -0,0 +1,99 @@
+# tests/test_ad_renderers.py
+import pytest
+
+from app.crud import ad_sheet as ad_sheet_crud
+from app.models.ad_sheet import AdSheet
+from app.utils.ad_renderers import RENDER_VERSION, render, render_ad_sheet
+
+
+@pytest.mark.parametrize("markdown, fmt, expected", [
+    # Asteriscos pegados a números o palabras: no son énfasis
+    ("2*3*4", "text", "2*3*4"),
+    ("2*3*4", "html", "<p>2*3*4</p>"),
+    ("snake_case_name", "text", "snake_case_name"),
+    ("a~~b~~c", "text", "a~~b~~c"),
+    # Énfasis anidado
+    ("**bold *em***", "html", "<p><strong>bold <em>em</em></strong></p>"),
+    ("*a **b** c*", "html", "<p><em>a <strong>b</strong> c</em></p>"),
+    ("**bold *em***", "text", "bold em"),
+    # URL con paréntesis
+    ("[link](javascript:alert(1))", "html", "<p>link</p>"),
+    ("[link](javascript:alert(1))", "text", "link (javascript:alert(1))"),
+    ("[wiki](https://es.wikipedia.org/wiki/Cuba_(isla)) fin", "html",
+     '<p><a href="https://es.wikipedia.org/wiki/Cuba_(isla)" rel="nofollow noopener noreferrer">wiki</a> fin</p>'),
+    ("![foto](https://x.org/a_(1).jpg)", "text", "foto: https://x.org/a_(1).jpg"),
+])
+def test_inline_markup(markdown, fmt, expected):
+    assert render(markdown, fmt) == expected
+
+
+@pytest.mark.parametrize("markdown, expected", [
+    ("# Oferta **hoy** ya", "*Oferta hoy ya*"),
+    ("**Precio:** 10 *USD*", "*Precio:* 10 *USD*"),
+    ("**bold *em***", "*bold em*"),
+    ("~~antes~~ y _ahora_", "~antes~ y _ahora_"),
+])
+def test_whatsapp_does_not_nest_bold(markdown, expected):
+    assert render(markdown, "whatsapp", "whatsapp") == expected
+
+
+def _ad_sheet(db, content, renders=None):
+    ad_sheet = AdSheet(title="Oferta", platform="whatsapp", template="basic", content=content, renders=renders)
+    db.add(ad_sheet)
+    db.commit()
+    return ad_sheet.id
+
+
+def test_explicit_format_returns_render(client, db):
+    ad_sheet_id = _ad_sheet(db, "# Oferta **hoy**")
+
+    full = client.get(f"/api/ad-sheets/{ad_sheet_id}").json()
+    assert full["content"] == "# Oferta **hoy**" and "format" not in full
+
+    markdown = client.get(f"/api/ad-sheets/{ad_sheet_id}", params={"format": "markdown"}).json()
+    assert markdown == {
+        "id": str(ad_sheet_id), "platform": "whatsapp", "format": "markdown",
+        "content": "# Oferta **hoy**", "characters": 16,
+    }
+
+    # Sin representaciones guardadas se convierte al leer
+    whatsapp = client.get(f"/api/ad-sheets/{ad_sheet_id}", params={"format": "whatsapp"}).json()
+    assert whatsapp["content"] == "*Oferta hoy*"
+
+    assert client.get(f"/api/ad-sheets/{ad_sheet_id}", params={"format": "pdf"}).status_code == 400
+
+
+def test_stored_render_is_used_only_for_current_version(client, db):
+    stored = render_ad_sheet("guardado", "whatsapp")
+    current = _ad_sheet(db, "*nuevo*", renders=stored)
+    stale = _ad_sheet(db, "*nuevo*", renders={**stored, "version": RENDER_VERSION - 1})
+
+    assert client.get(f"/api/ad-sheets/{current}", params={"format": "text"}).json()["content"] == "guardado"
+    assert client.get(f"/api/ad-sheets/{stale}", params={"format": "text"}).json()["content"] == "nuevo"
+
+
+def test_missing_or_stale_renders_are_saved_on_read(client, db):
+    stored = render_ad_sheet("*viejo*", "whatsapp")
+    missing = _ad_sheet(db, "*nuevo*")
+    stale = _ad_sheet(db, "*nuevo*", renders={**stored, "version": RENDER_VERSION - 1})
+
+    for ad_sheet_id in (missing, stale):
+        assert client.get(f"/api/ad-sheets/{ad_sheet_id}", params={"format": "text"}).json()["content"] == "nuevo"
+        db.expire_all()
+        assert db.get(AdSheet, ad_sheet_id).renders == render_ad_sheet("*nuevo*", "whatsapp")
+
+
+def test_renders_are_not_saved_over_newer_content(db):
+    ad_sheet_id = _ad_sheet(db, "*nuevo*")
+    saved = ad_sheet_crud.save_ad_sheet_renders(
+        db, ad_sheet_id, "*viejo*", "whatsapp", render_ad_sheet("*viejo*", "whatsapp")
+    )
+    db.expire_all()
+    assert not saved and db.get(AdSheet, ad_sheet_id).renders is None
+
+
+def test_openapi_documents_render_response(client):
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/ad-sheets/{ad_sheet_id}"]["get"]["responses"]["200"]
+    refs = str(response["content"]["application/json"]["schema"])
+    assert "AdSheetRender" in refs and "AdSheetResponse" in refs
@@ -0,0 +1,79 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from app.utils.admission import Overloaded, RouteGroupLimiter, parse_limits, route_group
+
+
+def test_parse_limits():
+    limiters = parse_limits("reads=64/256/2, generation=2/8/30,")
+    assert set(limiters) == {"reads", "generation"}
+    generation = limiters["generation"]
+    assert (generation.limit, generation.max_queue, generation.max_wait) == (2, 8, 30.0)
+
+
+@pytest.mark.parametrize("spec", ["reads=64/256", "reads", "reads=a/b/c", "generaton=2/8/30"])
+def test_parse_limits_rejects_invalid_spec(spec):
+    with pytest.raises(ValueError):
+        parse_limits(spec)
+
+
+@pytest.mark.parametrize("method, path, content_type, group", [
+    ("POST", "/api/ad-sheets", "application/json", "generation"),
+    ("PUT", "/api/ad-sheets/1", "application/json", "generation"),
+    ("POST", "/api/products", "multipart/form-data; boundary=x", "uploads"),
+    ("PUT", "/api/products/1", "multipart/form-data; boundary=x", "uploads"),
+    ("PUT", "/api/uploads/abc.jpg", "image/jpeg", "uploads"),
+    # Sin imagen: escrituras
+    ("PUT", "/api/products/1", "application/x-www-form-urlencoded", "writes"),
+    ("POST", "/api/uploads", "application/json", "writes"),
+    ("POST", "/api/uploads/abc.jpg/confirm", "", "writes"),
+    ("PATCH", "/api/products/1/availability", "application/json", "writes"),
+    ("DELETE", "/api/products/1", "", "writes"),
+    ("GET", "/api/products", "", "reads"),
+    ("GET", "/api/products/changes", "", None),
+    ("GET", "/health", "", None),
+])
+def test_route_group(method, path, content_type, group):
+    assert route_group(method, path, content_type) == group
+
+
+def test_limiter_queues_hands_off_and_sheds():
+    async def run():
+        limiter = RouteGroupLimiter("test", limit=1, max_queue=1, max_wait=0.05)
+        await limiter.acquire()
+
+        # Uno espera en la cola; el siguiente se rechaza por cola llena
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as full:
+            await limiter.acquire()
+        assert full.value.reason == "queue_full"
+
+        # Al liberar, el hueco pasa directamente al que esperaba
+        limiter.release(0.01)
+        await waiter
+        assert limiter.active == 1
+
+        # Sin liberar, el siguiente vence su espera
+        with pytest.raises(Overloaded) as deadline:
+            await limiter.acquire()
+        assert deadline.value.reason == "deadline"
+        assert deadline.value.retry_after >= 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        limiter = RouteGroupLimiter("test", limit=1, max_queue=4, max_wait=5)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release(0.0)
+        assert limiter.active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,73 @@
+# tests/test_compression.py
+import pytest
+
+from app.crud import product as product_crud
+from app.db import Base, PRIMARY_PIN_COOKIE, READ_CONSISTENCY_HEADER
+from app.schemas.product import ProductCreate
+from app.utils.compression import negotiate, available_encodings
+from app.utils.response_cache import cache_key, response_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def _scope(path="/api/products", query=b"", headers=(), method="GET"):
+    return {"type": "http", "method": method, "path": path, "query_string": query, "headers": list(headers)}
+
+
+def test_negotiate_prefers_highest_q_then_server_order():
+    assert negotiate("gzip") == "gzip"
+    assert negotiate("gzip;q=0.5, identity") == "gzip"
+    assert negotiate("identity") is None
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("*") == next(iter(available_encodings()))
+
+
+def test_cache_key_only_for_catalog_reads():
+    assert cache_key(_scope()) == "/api/products"
+    assert cache_key(_scope(query=b"view=summary")) == "/api/products?view=summary"
+    assert cache_key(_scope(method="POST")) is None
+    assert cache_key(_scope(path="/api/products/changes")) is None
+    assert cache_key(_scope(path="/api/uploads")) is None
+
+
+def test_cache_key_bypasses_pinned_and_strong_reads():
+    assert cache_key(_scope(headers=[(READ_CONSISTENCY_HEADER.encode(), b"strong")])) is None
+    assert cache_key(_scope(headers=[(b"cookie", PRIMARY_PIN_COOKIE.encode() + b"=1")])) is None
+
+
+def test_cache_key_is_shared_across_origins():
+    # CORS envuelve a la caché: sus cabeceras no se guardan en la entrada
+    first = cache_key(_scope(headers=[(b"origin", b"https://a.example")]))
+    credentialed = cache_key(_scope(headers=[(b"origin", b"https://b.example"), (b"cookie", b"session=1")]))
+    assert first == credentialed == cache_key(_scope())
+
+
+def test_cached_responses_keep_cors_headers_per_origin(client):
+    client.cookies.set("session", "1")
+    for _ in range(2):
+        for origin in ("https://a.example", "https://b.example"):
+            response = client.get("/api/products", headers={"Origin": origin})
+            assert response.status_code == 200
+            assert response.headers["access-control-allow-origin"] == origin
+            vary = response.headers["vary"].lower()
+            assert "origin" in vary and "accept-encoding" in vary
+
+
+def test_replica_reads_are_not_cached(client, db, replicas):
+    (replica,) = replicas("lagging")
+    # Réplica con el esquema pero sin la escritura recién confirmada en el primario
+    Base.metadata.create_all(replica)
+    product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10))
+
+    assert client.get("/api/products").json() == []
+    assert response_cache.get(cache_key(_scope())) is None
+
+    # Sin réplicas la lectura va al primario y sí se guarda
+    replicas()
+    assert len(client.get("/api/products").json()) == 1
+    assert response_cache.get(cache_key(_scope())) is not None
@@ -0,0 +1,32 @@
+# tests/test_health.py
+import main
+
+
+def test_ready(client):
+    assert client.get("/ready").json() == {"status": "OK", "database": "OK"}
+
+
+def test_ready_does_not_leak_database_errors(client, monkeypatch, caplog):
+    def broken_engine():
+        raise RuntimeError("could not connect to server at db.internal:5432 as user app")
+
+    monkeypatch.setattr(main, "get_engine", broken_engine)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "UNAVAILABLE"}
+    assert "db.internal" in caplog.text
+
+
+def test_cors_wraps_every_other_middleware():
+    from fastapi.middleware.cors import CORSMiddleware
+
+    # El primero de la lista es el más externo
+    assert main.app.user_middleware[0].cls is CORSMiddleware
+
+
+def test_idempotency_errors_carry_cors_headers(client):
+    headers = {"Idempotency-Key": "cors-mismatch", "Origin": "https://shop.example"}
+    client.post("/api/products", data={"nombre": "Camisa", "precio": "10"}, headers=headers)
+    response = client.post("/api/products", data={"nombre": "Otra", "precio": "10"}, headers=headers)
+    assert response.status_code == 422
+    assert response.headers["access-control-allow-origin"] == "https://shop.example"
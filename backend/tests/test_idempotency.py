@@ -0,0 +1,119 @@
+# tests/test_idempotency.py
+import asyncio
+import json
+
+from app.config import settings
+from app.crud import idempotency as idempotency_crud
+from app.db import PRIMARY_PIN_COOKIE
+from app.utils import idempotency
+from app.utils.idempotency import IdempotencyMiddleware, fingerprint
+
+
+def _multipart(boundary: str, fields) -> bytes:
+    body = b""
+    for name, value in fields:
+        body += (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+        ).encode() + value + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def _fingerprint(boundary: str, fields) -> str:
+    content_type = f"multipart/form-data; boundary={boundary}".encode()
+    return fingerprint("POST", "/api/products", content_type, _multipart(boundary, fields))
+
+
+def test_multipart_fingerprint_ignores_boundary_and_field_order():
+    fields = [("nombre", b"Camisa"), ("foto", b"\x89PNG...")]
+    assert _fingerprint("aaaa1111", fields) == _fingerprint("BbBb2222", list(reversed(fields)))
+
+
+def test_multipart_fingerprint_detects_different_file():
+    assert _fingerprint("x", [("foto", b"uno")]) != _fingerprint("x", [("foto", b"dos")])
+
+
+def test_json_fingerprint_ignores_key_order_and_spacing():
+    first = fingerprint("POST", "/api/ad-sheets", b"application/json", b'{"a": 1, "b": [2]}')
+    second = fingerprint("POST", "/api/ad-sheets", b"application/json", b'{"b":[2],"a":1}')
+    assert first == second
+
+
+def test_retry_with_new_boundary_is_replayed(client):
+    headers = {"Idempotency-Key": "retry-boundary"}
+    data = {"nombre": "Camisa", "precio": "10"}
+    first = client.post("/api/products", data=data, headers=headers, files={"x": ("a.txt", b"1")})
+    second = client.post("/api/products", data=data, headers=headers, files={"x": ("a.txt", b"1")})
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json()["id"] == first.json()["id"]
+    assert len(client.get("/api/products").json()) == 1
+
+
+def test_replay_renews_primary_pin_cookie(client, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_URLS", "sqlite://")
+    headers = {"Idempotency-Key": "replay-cookie"}
+    data = {"nombre": "Camisa", "precio": "10"}
+    first = client.post("/api/products", data=data, headers=headers)
+    second = client.post("/api/products", data=data, headers=headers)
+    assert second.headers["idempotent-replayed"] == "true"
+    for response in (first, second):
+        assert response.headers["set-cookie"].startswith(PRIMARY_PIN_COOKIE + "=")
+
+
+def test_oversized_body_is_rejected(monkeypatch):
+    monkeypatch.setattr(idempotency, "MAX_BODY_SIZE", 10)
+    called = []
+
+    async def app(scope, receive, send):
+        called.append(scope)
+
+    messages = [
+        {"type": "http.request", "body": b"123456", "more_body": True},
+        {"type": "http.request", "body": b"789012", "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/ad-sheets", "headers": [(b"idempotency-key", b"k")]}
+    asyncio.run(IdempotencyMiddleware(app)(scope, receive, send))
+    assert sent[0]["status"] == 413
+    assert not called
+
+
+def test_in_flight_key_is_renewed(db, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LOCK_SECONDS", 0.3)
+
+    async def slow_app(scope, receive, send):
+        await receive()
+        await asyncio.sleep(0.6)
+        await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps({"ok": True}).encode()})
+
+    async def run():
+        middleware = IdempotencyMiddleware(slow_app)
+        scope = {
+            "type": "http", "method": "POST", "path": "/api/ad-sheets",
+            "headers": [(b"idempotency-key", b"slow"), (b"content-type", b"application/json")],
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"{}", "more_body": False}
+
+        async def send(message):
+            pass
+
+        original = asyncio.ensure_future(middleware(scope, receive, send))
+        await asyncio.sleep(0.45)
+        # Pasada la reserva inicial, la clave sigue en curso: no se puede volver a reservar
+        record = await asyncio.to_thread(idempotency_crud.claim_idempotency_key, db, "slow", "otra")
+        await original
+        return record
+
+    record = asyncio.run(run())
+    assert record is not None and record.status == "in_progress"
@@ -0,0 +1,155 @@
+# tests/test_llm_generator.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.utils import llm_generator
+
+
+def _post(monkeypatch, handler, retries):
+    """Llama a post_to_llm con un transporte simulado; devuelve (resultado o excepción, peticiones)"""
+    calls = []
+
+    def record(request):
+        calls.append(request)
+        return handler(len(calls), request)
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        monkeypatch.setattr(llm_generator, "_http_client", client)
+        try:
+            return await llm_generator.post_to_llm("test", "https://llm.test/v1", {}, {"prompt": "x"})
+        except Exception as e:
+            return e
+        finally:
+            await client.aclose()
+
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", retries)
+    monkeypatch.setattr(llm_generator.asyncio, "sleep", _no_sleep)
+    return asyncio.run(run()), calls
+
+
+async def _no_sleep(seconds):
+    return None
+
+
+def test_no_retries_by_default():
+    assert settings.LLM_MAX_RETRIES == 0
+
+
+@pytest.mark.parametrize("failure", [
+    lambda request: httpx.Response(500, text="error"),
+    lambda request: httpx.Response(503, text="error"),
+    lambda request: httpx.Response(429, text="error"),  # sin Retry-After
+])
+def test_server_errors_are_not_retried(monkeypatch, failure):
+    result, calls = _post(monkeypatch, lambda n, request: failure(request), retries=2)
+    assert isinstance(result, Exception) and len(calls) == 1
+
+
+def test_read_timeout_is_not_retried(monkeypatch):
+    def handler(n, request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    result, calls = _post(monkeypatch, handler, retries=2)
+    assert isinstance(result, Exception) and len(calls) == 1
+
+
+def test_connect_errors_and_rate_limits_are_retried(monkeypatch):
+    def handler(n, request):
+        if n == 1:
+            raise httpx.ConnectError("refused", request=request)
+        if n == 2:
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        return httpx.Response(200, json={"ok": True})
+
+    result, calls = _post(monkeypatch, handler, retries=2)
+    assert result == {"ok": True} and len(calls) == 3
+
+
+TEMPLATE = llm_generator.TEMPLATES["facebook"]["basic"]
+
+
+def _base_tokens():
+    prompt = llm_generator.build_prompt([], "facebook", TEMPLATE, part=2, total_parts=3)
+    return llm_generator.estimate_tokens(prompt)
+
+
+def _product(name, size=0):
+    return {"nombre": name, "precio": 10.0, "caracteristicas": {"detalle": "x" * size}} if size else {"nombre": name, "precio": 10.0}
+
+
+def _tokens(product):
+    return llm_generator.estimate_tokens(llm_generator.to_compact_json(product)) + 1
+
+
+def test_prune_empty():
+    data = {"a": None, "b": "", "c": [], "d": {}, "e": {"f": None, "g": [None, "", 1]}, "h": 0, "i": False}
+    assert llm_generator.prune_empty(data) == {"e": {"g": [1]}, "h": 0, "i": False}
+
+
+def test_split_products_fills_parts_up_to_the_budget(monkeypatch):
+    products = [_product(f"p{index}", 40) for index in range(5)]
+    per_product = _tokens(products[0])
+    # Caben exactamente dos productos por parte
+    monkeypatch.setattr(settings, "LLM_PROMPT_TOKEN_BUDGET", _base_tokens() + 2 * per_product)
+    chunks = llm_generator.split_products(products, "facebook", TEMPLATE)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [product for chunk in chunks for product in chunk] == products
+
+    # Un token menos: uno por parte
+    monkeypatch.setattr(settings, "LLM_PROMPT_TOKEN_BUDGET", _base_tokens() + 2 * per_product - 1)
+    assert [len(chunk) for chunk in llm_generator.split_products(products, "facebook", TEMPLATE)] == [1] * 5
+
+
+def test_split_products_single_part_when_everything_fits():
+    products = [_product(f"p{index}") for index in range(3)]
+    assert llm_generator.split_products(products, "facebook", TEMPLATE) == [products]
+
+
+def test_oversized_product_features_are_trimmed(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROMPT_TOKEN_BUDGET", _base_tokens() + 60)
+    oversized = {
+        "nombre": "Vestido", "precio": 10.0,
+        "caracteristicas": {"material": "algodón", "descripcion": "x" * 2000},
+    }
+    (chunk,) = llm_generator.split_products([oversized], "facebook", TEMPLATE)
+    assert chunk == [{"nombre": "Vestido", "precio": 10.0, "caracteristicas": {"material": "algodón"}}]
+
+    text_features = dict(oversized, caracteristicas="y" * 2000)
+    (trimmed,) = llm_generator.split_products([text_features], "facebook", TEMPLATE)[0]
+    assert trimmed["caracteristicas"].endswith("…")
+    assert _tokens(trimmed) <= 60
+
+
+def test_product_that_cannot_fit_fails_clearly(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROMPT_TOKEN_BUDGET", _base_tokens() + 20)
+    with pytest.raises(ValueError, match="no caben"):
+        llm_generator.split_products([_product("n" * 500)], "facebook", TEMPLATE)
+
+
+def test_parts_are_generated_per_chunk_and_joined_in_order(monkeypatch):
+    products = [
+        SimpleNamespace(nombre=f"p{index}", precio=10, color=None, talla=None,
+                        caracteristicas={"detalle": "x" * 40}, disponible=True, foto=None)
+        for index in range(3)
+    ]
+    per_product = _tokens(llm_generator.prepare_product_data(products[0]))
+    monkeypatch.setattr(settings, "LLM_PROMPT_TOKEN_BUDGET", _base_tokens() + per_product)
+    prompts = []
+
+    async def fake_generate(prompt):
+        prompts.append(prompt)
+        # La primera parte tarda más: el orden del resultado no depende de cuál termina antes
+        await asyncio.sleep(0.01 if "parte 1 de 3" in prompt else 0)
+        part = prompt.split("Esta es la parte ")[1].split(" ")[0]
+        return f"  parte {part}  \n"
+
+    monkeypatch.setattr(llm_generator, "generate_with_provider", fake_generate)
+    content = asyncio.run(llm_generator.generate_ad_sheet_content(products, "facebook", "basic"))
+    assert content == "parte 1\n\nparte 2\n\nparte 3"
+    assert len(prompts) == 3
+    assert all('"nombre":"p' in prompt for prompt in prompts)
@@ -0,0 +1,93 @@
+# tests/test_llm_resilience.py
+import asyncio
+import uuid
+
+import pytest
+
+from app.config import settings
+from app.utils import llm_resilience
+from app.utils.llm_resilience import (
+    CircuitBreaker, ProviderUnavailable, CLOSED, HALF_OPEN, OPEN,
+    call_with_resilience, hedge_delay_for, record_latency, timeout_for,
+)
+
+
+def _provider() -> str:
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+def test_timeouts_fall_back_to_settings_without_samples():
+    provider = _provider()
+    assert timeout_for(provider) == settings.LLM_TIMEOUT
+    assert hedge_delay_for(provider) == settings.LLM_HEDGE_DELAY
+
+
+def test_timeout_follows_observed_p99_within_bounds(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_TIMEOUT", 30.0)
+    monkeypatch.setattr(settings, "LLM_MIN_TIMEOUT", 5.0)
+    monkeypatch.setattr(settings, "LLM_TIMEOUT_P99_FACTOR", 2.0)
+    provider = _provider()
+    for _ in range(llm_resilience.MIN_SAMPLES):
+        record_latency(provider, 4.0)
+    assert timeout_for(provider) == 8.0
+    assert hedge_delay_for(provider) == 4.0
+
+    fast = _provider()
+    for _ in range(llm_resilience.MIN_SAMPLES):
+        record_latency(fast, 0.1)
+    assert timeout_for(fast) == 5.0
+
+
+def test_breaker_opens_and_allows_a_single_probe(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "LLM_BREAKER_RESET_SECONDS", 0.0)
+    breaker = CircuitBreaker(_provider())
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(ProviderUnavailable):
+        breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_hedge_wins_and_cancelled_call_is_awaited(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.01)
+    primary, secondary = _provider(), _provider()
+    cleaned_up = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            await asyncio.sleep(0)
+            cleaned_up.append(primary)
+        return "lento"
+
+    async def fast():
+        return "rápido"
+
+    async def run():
+        result = await call_with_resilience([(primary, slow), (secondary, fast)])
+        # La petición cancelada ya terminó al volver
+        assert cleaned_up == [primary]
+        return result
+
+    assert asyncio.run(run()) == "rápido"
+
+
+def test_failover_after_error():
+    primary, secondary = _provider(), _provider()
+
+    async def failing():
+        raise RuntimeError("caído")
+
+    async def working():
+        return "ok"
+
+    assert asyncio.run(call_with_resilience([(primary, failing), (secondary, working)])) == "ok"
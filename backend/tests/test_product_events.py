@@ -0,0 +1,40 @@
+# tests/test_product_events.py
+import asyncio
+
+from app.crud import product as product_crud
+from app.crud import product_event as product_event_crud
+from app.models.product_event import ProductEvent
+from app.schemas.product import ProductCreate
+from app.utils.change_feed import ChangeFeed
+
+
+def test_events_are_inserted_at_commit(db):
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10))
+    events = db.query(ProductEvent).all()
+    assert [(event.event_type, event.product_id) for event in events] == [("create", product.id)]
+
+    product_crud.update_product(db, product.id, {"disponible": False})
+    assert [event.event_type for event in product_event_crud.get_product_events(db, 0)] == ["create", "availability"]
+
+
+def test_events_are_discarded_on_rollback(db):
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10))
+    product_event_crud.record_product_event(db, "update", product)
+    db.rollback()
+    db.commit()
+    assert [event.event_type for event in db.query(ProductEvent).all()] == ["create"]
+
+
+def test_subscribe_starts_listener_from_latest_seq(db):
+    product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10))
+    feed = ChangeFeed()
+
+    async def subscribe_twice():
+        return await asyncio.gather(feed.subscribe(), feed.subscribe())
+
+    try:
+        queues = asyncio.run(subscribe_twice())
+        assert len(queues) == 2
+        assert feed._last_seq == product_event_crud.get_sequence_bounds(db)["latest"]
+    finally:
+        feed.stop()
@@ -0,0 +1,43 @@
+# tests/test_product_indexes.py
+import tempfile
+
+from sqlalchemy import event, text
+
+from app.crud import product as product_crud
+from app.db import get_engine
+from app.schemas.product import PRODUCT_SUMMARY_FIELDS, PRODUCT_COMPUTED_FIELDS
+from app.utils.projection import column_fields
+from benchmarks.seed import seed_catalog
+
+
+def _plan(db, call) -> str:
+    """Plan de SQLite de la consulta que ejecuta `call`"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    engine = get_engine()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+def test_unavailable_products_are_read_from_the_partial_index(db):
+    seed_catalog(db, products=2000, ad_sheets=0, photo_ratio=0, upload_dir=tempfile.mkdtemp())
+    db.execute(text("ANALYZE"))
+    columns = column_fields(PRODUCT_SUMMARY_FIELDS, PRODUCT_COMPUTED_FIELDS)
+
+    plan = _plan(db, lambda: product_crud.get_products_fields(db, columns, disponible=False))
+    assert "ix_products_no_disponible_precio" in plan
+    plan = _plan(db, lambda: product_crud.get_products(db, disponible=False))
+    assert "ix_products_no_disponible_precio" in plan
+
+    # Los disponibles (la mayoría) se leen con un recorrido de la tabla
+    plan = _plan(db, lambda: product_crud.get_products_fields(db, columns, disponible=True))
+    assert plan.startswith("SCAN products")
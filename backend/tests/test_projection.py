@@ -0,0 +1,49 @@
+# tests/test_projection.py
+import pytest
+
+from app.crud import product as product_crud
+from app.schemas.product import ProductCreate, PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS, PRODUCT_COMPUTED_FIELDS
+from app.utils.file_handlers import file_url
+from app.utils.projection import resolve_fields, column_fields
+
+
+def test_full_view_returns_none():
+    assert resolve_fields(None, None, PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS) is None
+    assert resolve_fields(None, "full", PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS) is None
+
+
+def test_fields_keep_model_order_and_always_include_id():
+    assert resolve_fields("precio, nombre,precio", None, PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS) == ["id", "nombre", "precio"]
+
+
+def test_summary_view():
+    assert resolve_fields(None, "summary", PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS) == PRODUCT_SUMMARY_FIELDS
+
+
+@pytest.mark.parametrize("fields, view", [("nombre,secreto", None), (None, "compact")])
+def test_invalid_fields_or_view(fields, view):
+    with pytest.raises(ValueError):
+        resolve_fields(fields, view, PRODUCT_FIELDS, PRODUCT_SUMMARY_FIELDS)
+
+
+def test_computed_fields_read_their_column():
+    assert column_fields(["id", "foto_url", "thumbnail_url"], PRODUCT_COMPUTED_FIELDS) == ["id", "foto", "thumbnail"]
+
+
+def test_projected_products_include_public_urls(client, db):
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto="abc.jpg")
+
+    response = client.get("/api/products", params={"fields": "nombre,foto_url"})
+    assert response.status_code == 200
+    assert response.json() == [{"id": str(product.id), "nombre": "Camisa", "foto_url": file_url("abc.jpg")}]
+
+    summary = client.get("/api/products", params={"view": "summary"}).json()
+    assert set(summary[0]) == set(PRODUCT_SUMMARY_FIELDS)
+
+
+def test_projection_is_documented_in_openapi(client):
+    schema = client.get("/openapi.json").json()
+    for path in ("/api/products", "/api/ad-sheets"):
+        items = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]
+        refs = {option["$ref"].rsplit("/", 1)[-1] for option in items["anyOf"]}
+        assert any(ref.endswith("Partial") for ref in refs)
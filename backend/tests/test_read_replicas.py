@@ -0,0 +1,95 @@
+# tests/test_read_replicas.py
+import time
+
+from fastapi import Response
+from sqlalchemy import event
+from starlette.requests import Request
+
+from app import db as db_module
+from app.config import settings
+from app.db import Base, PRIMARY_PIN_COOKIE, get_engine, get_read_db, get_write_db
+
+
+def _read_target(headers=()):
+    """URL de la base a la que get_read_db envía una lectura"""
+    sessions = get_read_db(Request({"type": "http", "headers": list(headers)}))
+    session = next(sessions)
+    try:
+        return str(session.get_bind().engine.url)
+    finally:
+        sessions.close()
+
+
+def _count_connects(engine):
+    attempts = []
+    event.listen(engine, "do_connect", lambda *args: attempts.append(1))
+    return attempts
+
+
+def test_reads_rotate_between_replicas(replicas):
+    first, second = replicas("a", "b")
+    targets = [_read_target() for _ in range(4)]
+    assert targets == [str(first.url), str(second.url)] * 2
+
+
+def test_broken_replica_is_skipped_until_retry(replicas):
+    broken, healthy = replicas(None, "b")
+    attempts = _count_connects(broken)
+
+    assert {_read_target() for _ in range(4)} == {str(healthy.url)}
+    # Tras el primer fallo queda fuera de la rotación durante REPLICA_RETRY_SECONDS
+    assert len(attempts) == 1
+    assert db_module._replica_down_until[broken] > time.monotonic()
+
+
+def test_broken_replica_is_retried_after_backoff(replicas, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICA_RETRY_SECONDS", 0.05)
+    broken, healthy = replicas(None, "b")
+    attempts = _count_connects(broken)
+    for _ in range(3):
+        _read_target()
+    assert len(attempts) == 1
+    time.sleep(0.1)
+    assert _read_target() == str(healthy.url)
+    assert len(attempts) == 2
+
+
+def test_reads_fall_back_to_primary_without_replicas(replicas):
+    replicas(None)
+    assert _read_target() == str(get_engine().url)
+
+
+def test_pinned_reads_go_to_primary(replicas):
+    replicas("a")
+    primary = str(get_engine().url)
+    future = str(time.time() + 60).encode()
+    assert _read_target([(b"x-read-consistency", b"strong")]) == primary
+    assert _read_target([(b"cookie", PRIMARY_PIN_COOKIE.encode() + b"=" + future)]) == primary
+    # Cookie caducada o inválida: vuelve a la réplica
+    assert _read_target([(b"cookie", PRIMARY_PIN_COOKIE.encode() + b"=1")]) != primary
+    assert _read_target([(b"cookie", PRIMARY_PIN_COOKIE.encode() + b"=x")]) != primary
+
+
+def test_write_session_pins_client_to_primary(replicas):
+    replicas("a")
+    response = Response()
+    sessions = get_write_db(response)
+    next(sessions)
+    sessions.close()
+    assert response.headers["set-cookie"].startswith(PRIMARY_PIN_COOKIE + "=")
+
+
+def test_client_reads_its_own_writes(client, replicas, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    (replica,) = replicas("a")
+    # Réplica con el esquema pero sin los datos recién escritos (retraso)
+    Base.metadata.create_all(replica)
+
+    created = client.post("/api/products", data={"nombre": "Camisa", "precio": "10"})
+    assert created.status_code == 201
+    assert PRIMARY_PIN_COOKIE in client.cookies
+    product_url = f"/api/products/{created.json()['id']}"
+
+    assert client.get(product_url).status_code == 200
+    client.cookies.clear()
+    assert client.get(product_url).status_code == 404
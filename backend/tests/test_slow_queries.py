@@ -0,0 +1,100 @@
+# tests/test_slow_queries.py
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.db import get_engine
+from app.utils.slow_queries import EXPLAIN_ANALYZE, EXPLAIN_PLAN, SlowQueryLog, explain, explain_mode
+
+
+@pytest.mark.parametrize("statement, mode", [
+    ("SELECT products.id FROM products WHERE products.id IN (%(id_1)s)", EXPLAIN_ANALYZE),
+    ("SELECT count(*) AS count_1 FROM (SELECT products.id FROM products) AS anon_1", EXPLAIN_ANALYZE),
+    ("SELECT products.id FROM products WHERE products.id = %(id)s FOR UPDATE", EXPLAIN_PLAN),
+    ("SELECT products.id FROM products FOR NO KEY UPDATE SKIP LOCKED", EXPLAIN_PLAN),
+    ("SELECT nextval('products_id_seq')", EXPLAIN_PLAN),
+    ("SELECT pg_advisory_xact_lock(hashtext(%(channel)s))", None),
+    ("SELECT pg_notify(%(channel)s, %(payload)s)", None),
+    ("select pg_try_advisory_lock(42)", None),
+    ("UPDATE products SET precio = 1", None),
+    ("DELETE FROM products", None),
+])
+def test_explain_mode(statement, mode):
+    assert explain_mode(statement) == mode
+
+
+class _Cursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, statement, parameters=None):
+        self.executed.append(statement)
+
+    def fetchall(self):
+        return [("Seq Scan on products",)]
+
+    def close(self):
+        pass
+
+
+class _RawConnection:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def cursor(self):
+        return _Cursor(self.executed)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _postgres_engine(executed):
+    return SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        raw_connection=lambda: _RawConnection(executed),
+    )
+
+
+def test_explain_only_analyzes_when_asked():
+    executed = []
+    explain(_postgres_engine(executed), "SELECT 1 FOR UPDATE", {})
+    explain(_postgres_engine(executed), "SELECT 1", {}, analyze=True)
+    assert executed[1] == "EXPLAIN SELECT 1 FOR UPDATE"
+    assert executed[3] == "EXPLAIN (ANALYZE, BUFFERS) SELECT 1"
+
+
+def _wait_for_plan(log):
+    deadline = time.monotonic() + 5
+    while log.records()[0]["plan"] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return log.records()[0]
+
+
+def test_locking_select_is_explained_without_analyze(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 1.0)
+    executed = []
+    log = SlowQueryLog()
+    try:
+        log.record(_postgres_engine(executed), "SELECT id FROM products FOR UPDATE", {}, 1.0, explainable=True)
+        entry = _wait_for_plan(log)
+    finally:
+        log.shutdown()
+    assert entry["seq_scans"] == ["products"]
+    assert not any("ANALYZE" in statement for statement in executed)
+
+
+def test_slow_select_gets_sqlite_plan(db, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 1.0)
+    log = SlowQueryLog()
+    try:
+        log.record(get_engine(), "SELECT id FROM products WHERE nombre = ?", ("x",), 1.0, explainable=True)
+        entry = _wait_for_plan(log)
+    finally:
+        log.shutdown()
+    assert entry["route"] == "background"
+    assert entry["seq_scans"] == ["products"]
@@ -0,0 +1,61 @@
+# tests/test_thumbnails.py
+import io
+import uuid
+
+import pytest
+from PIL import Image
+
+from app.crud import product as product_crud
+from app.schemas.product import ProductCreate, ProductUpdate
+from app.utils import file_handlers
+from app.utils.file_handlers import LocalStorage, generate_thumbnail, thumbnail_key
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path), "/uploads", "secret")
+    monkeypatch.setattr(file_handlers, "_storage", storage)
+    return storage
+
+
+def _photo(storage: LocalStorage) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    buffer.seek(0)
+    key = f"{uuid.uuid4()}.png"
+    storage.save(key, buffer)
+    return key
+
+
+def _thumbnail_url(client, product_id):
+    return client.get(f"/api/products/{product_id}").json()["thumbnail_url"]
+
+
+def test_photo_without_thumbnail_has_no_thumbnail_url(client, db, storage):
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=_photo(storage))
+    assert _thumbnail_url(client, product.id) is None
+    summary = client.get("/api/products", params={"view": "summary"}).json()
+    assert summary[0]["foto_url"] and summary[0]["thumbnail_url"] is None
+
+
+def test_thumbnail_generated_after_the_product_is_recorded(client, db, storage):
+    key = _photo(storage)
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=key)
+    generate_thumbnail(key)
+    assert _thumbnail_url(client, product.id) == storage.public_url(thumbnail_key(key))
+
+
+def test_thumbnail_generated_before_the_product_is_recorded(client, db, storage):
+    key = _photo(storage)
+    # La miniatura termina antes de que exista el producto
+    generate_thumbnail(key)
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=key)
+    assert _thumbnail_url(client, product.id) == storage.public_url(thumbnail_key(key))
+
+
+def test_new_photo_resets_thumbnail(client, db, storage):
+    old = _photo(storage)
+    generate_thumbnail(old)
+    product = product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=old)
+    product_crud.update_product(db, product.id, ProductUpdate(), foto=_photo(storage))
+    assert _thumbnail_url(client, product.id) is None
@@ -0,0 +1,92 @@
+# tests/test_upload_gc.py
+import os
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.crud import product as product_crud
+from app.schemas.product import ProductCreate
+from app.utils import file_handlers, upload_gc
+from app.utils.file_handlers import LocalStorage, thumbnail_key
+from app.utils.upload_gc import sweep_uploads
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path), "/uploads", "secret")
+    monkeypatch.setattr(file_handlers, "_storage", storage)
+    return storage
+
+
+def _write(storage: LocalStorage, key: str, age: float = 7200) -> str:
+    path = os.path.join(storage.root, *key.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(b"data")
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return key
+
+
+def _exists(storage: LocalStorage, key: str) -> bool:
+    return storage.stat(key) is not None
+
+
+def test_sweep_deletes_only_orphaned_api_uploads(db, storage):
+    orphan = _write(storage, f"{uuid.uuid4()}.jpg")
+    orphan_thumbnail = _write(storage, thumbnail_key(orphan))
+    referenced = _write(storage, f"{uuid.uuid4()}.png")
+    recent = _write(storage, f"{uuid.uuid4()}.jpg", age=0)
+    foreign = [_write(storage, "backups/catalog.sql"), _write(storage, "logo.png")]
+    product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=referenced)
+
+    summary = sweep_uploads()
+
+    assert summary["deleted"] == 1
+    assert not _exists(storage, orphan) and not _exists(storage, orphan_thumbnail)
+    assert _exists(storage, referenced) and _exists(storage, recent)
+    assert all(_exists(storage, key) for key in foreign)
+
+
+def test_photo_attached_during_sweep_is_kept(db, storage, monkeypatch):
+    key = _write(storage, f"{uuid.uuid4()}.jpg")
+    real_lookup = product_crud.get_referenced_photos
+    calls = []
+
+    def lookup(session, filenames):
+        filenames = list(filenames)
+        calls.append(filenames)
+        if len(calls) == 1:
+            # El lote se leyó antes de que se confirmara la foto
+            referenced = real_lookup(session, filenames)
+            product_crud.create_product(db, ProductCreate(nombre="Camisa", precio=10), foto=key)
+            return referenced
+        return real_lookup(session, filenames)
+
+    monkeypatch.setattr(upload_gc.product_crud, "get_referenced_photos", lookup)
+    assert sweep_uploads()["deleted"] == 0
+    assert _exists(storage, key)
+
+
+def test_upload_is_kept_until_ticket_expiry_plus_grace(db, storage, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_PRESIGN_EXPIRES_SECONDS", 900)
+    monkeypatch.setattr(settings, "UPLOAD_GC_GRACE_SECONDS", 3600)
+    # Subida al final de la validez del ticket, todavía sin producto
+    pending = _write(storage, f"{uuid.uuid4()}.jpg", age=3600 + 60)
+    expired = _write(storage, f"{uuid.uuid4()}.jpg", age=900 + 3600 + 60)
+
+    assert sweep_uploads()["deleted"] == 1
+    assert _exists(storage, pending) and not _exists(storage, expired)
+
+
+def test_upload_close_to_sweep_cannot_be_attached(storage, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_PRESIGN_EXPIRES_SECONDS", 900)
+    monkeypatch.setattr(settings, "UPLOAD_GC_GRACE_SECONDS", 3600)
+    key = _write(storage, f"{uuid.uuid4()}.jpg", age=900 + 3600 - 60)
+    with pytest.raises(HTTPException) as error:
+        file_handlers.confirm_upload(key)
+    assert error.value.status_code == 410
+    assert _exists(storage, key)